@@ -0,0 +1,27 @@
+"""Настройки gunicorn: gunicorn -c gunicorn.conf.py
+
+Метрики prometheus_client в режиме нескольких процессов: каждый воркер
+пишет значения в файлы PROMETHEUS_MULTIPROC_DIR, /metrics складывает их
+(store.metrics.metrics_view).
+"""
+import os
+import shutil
+from pathlib import Path
+
+wsgi_app = 'marketplace.wsgi'
+
+# Задаётся до форка воркеров, то есть до импорта prometheus_client в них
+multiproc_dir = Path(os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', str(Path(__file__).resolve().parent / 'prometheus'),
+))
+
+
+def on_starting(server):
+    # Счётчики прошлого запуска не должны суммироваться с новыми
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    multiproc_dir.mkdir(parents=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -14,7 +15,9 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # Админка регистрируется из marketplace/urls.py (admin.autodiscover), чтобы
+    # management-команды и воркеры не импортировали store.admin при старте
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -24,11 +27,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'store.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'store.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -39,13 +45,19 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Скомпилированные шаблоны кэшируются в процессе
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -71,6 +83,168 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'marketplace',
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+    # Сессии (cached_db); в продакшене — общий для всех процессов кэш
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+    },
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ratelimit',
+    },
+}
+
+# Сессия читается из кэша, в БД — только при промахе и записи.
+# Без общего кэша подойдёт 'django.contrib.sessions.backends.signed_cookies'.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Пользователь (store.backends.CachedModelBackend) и id корзины (store.carts) в кэше.
+# Пользователя кэшируем только в общем для всех процессов кэше (Redis/Memcached):
+# сброс при смене пароля или блокировке должен дойти до всех воркеров.
+# None — читать пользователя из БД.
+AUTHENTICATION_BACKENDS = ['store.backends.CachedModelBackend']
+USER_CACHE_ALIAS = None
+USER_CACHE_TIMEOUT = 60 * 15
+CART_ID_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Token bucket для дорогих эндпоинтов (store.ratelimit): 'N/s|m|h'
+RATE_LIMIT_CACHE = 'ratelimit'
+RATE_LIMITS = {
+    'export': {'user': '30/m', 'ip': '60/m'},
+    'checkout': {'user': '10/m', 'ip': '30/m'},
+    'review': {'user': '5/m', 'ip': '20/m'},
+    # Неудачные входы: 'user' — по введённому логину, считаются только ошибки
+    'login': {'user': '5/m', 'ip': '20/m'},
+}
+
+# Сжатие ответов (store.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 5
+
+
+# Выборочное профилирование (store.profiling). При ENABLED = False
+# middleware исключается из цепочки целиком.
+PROFILING = {
+    'ENABLED': False,
+    'ENGINE': 'sampling',  # 'cprofile' или 'pyinstrument' (если пакет установлен)
+    'URL_NAMES': [],  # например ['product_list', 'checkout']
+    'SAMPLE_RATE': 0.01,
+    'HEADER': 'X-Profile',  # сотрудник может запросить профиль явно
+    'DIR': BASE_DIR / 'profiles',
+    'KEEP': 200,
+}
+
+
+# Метрики Prometheus (store.metrics): /metrics доступен с этих адресов и сотрудникам
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+# Бэкапы (manage.py backup_db): каталог дампов и файл состояния последнего
+# бэкапа для /metrics. На Яндекс.Диск выгружаются, если задан YADISK_TOKEN
+# (нужен пакет yadisk)
+BACKUP_DIR = BASE_DIR / 'backups'
+BACKUP_STATE_FILE = BACKUP_DIR / 'last_backup.json'
+BACKUP_YADISK = {
+    'TOKEN': os.environ.get('YADISK_TOKEN'),
+    'DIR': '/backups',
+}
+
+
+# Дельта-выгрузки (store.exports) не отдают строки новее этого числа секунд:
+# updated_at ставится до COMMIT, и более поздняя транзакция может закоммитить
+# строку с меньшим updated_at уже после выдачи курсора. Должно быть больше
+# самой долгой пишущей транзакции.
+EXPORT_DELTA_LAG = 60
+
+# Остаток, при котором товар попадает в «заканчивается» кабинета поставщика
+LOW_STOCK_THRESHOLD = 5
+
+# Массовые изменения цен и остатков (store.adjustments): строк в одном UPDATE
+BULK_ADJUST_CHUNK_SIZE = 5000
+# Больше товаров админка сама не меняет: запись журнала ждёт
+# `manage.py adjust_products --pending` (cron), чтобы не держать HTTP-запрос
+BULK_ADJUST_ADMIN_LIMIT = 20000
+
+
+# Outbox: приёмники событий для `manage.py relay_outbox` (store.outbox)
+OUTBOX = {
+    'SINKS': {
+        'ndjson': {'CLASS': 'store.outbox.NdjsonSink', 'PATH': BASE_DIR / 'outbox' / 'events.ndjson'},
+        'cache': {'CLASS': 'store.outbox.CacheInvalidationSink'},
+        'webhook': {'CLASS': 'store.outbox.WebhookSink', 'URL': None},
+    },
+    'BATCH_SIZE': 500,
+    'POLL_INTERVAL': 1.0,
+    # Сколько секунд ждать, пока «дыра» в id закоммитится, прежде чем считать её откатом
+    'GAP_TIMEOUT': 60,
+}
+
+
+# Перевозчики (store.carriers): трек-номера блоками, статусы пачками
+DEFAULT_CARRIER = 'local'
+CARRIERS = {
+    'local': {
+        'CLASS': 'store.carriers.LocalStubCarrier',
+        'PREFIX': 'LOC',
+        'BLOCK_SIZE': 1000,
+        # Без ключа вебхук отклоняется (403)
+        'WEBHOOK_SECRET': None,
+    },
+}
+
+
+# «С этим товаром покупают» (`manage.py build_recommendations`, store.recommendations)
+RECOMMENDATIONS = {
+    'TOP_K': 10,
+    'MIN_CO_COUNT': 2,
+    'BATCH_SIZE': 5000,
+    'STATE_DIR': BASE_DIR / 'recommendations',
+    # Как OUTBOX['GAP_TIMEOUT']: сколько ждать заказ с пропущенным id
+    'GAP_TIMEOUT': 60,
+}
+
+
+# Политики хранения для `manage.py purge` (store.purge); days=None — выключено
+PURGE_POLICIES = {
+    'carts': {'days': 30},
+    'sessions': {'days': 0},
+    'reviews': {'days': None},
+    'outbox': {'days': 7},
+}
+PURGE_BATCH_SIZE = 1000
+PURGE_SLEEP = 0.1
+PURGE_MAX_BATCH_SECONDS = 0.5
+
+
+# Хеширование паролей (store.hashers). Первый хешер — для новых паролей,
+# остальные читают старые хеши и пересчитываются при входе.
+# Argon2 требует argon2-cffi; тогда его можно поставить первым.
+PASSWORD_HASHERS = [
+    'store.hashers.ScryptPasswordHasher',
+    'store.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+# Подобраны по `manage.py bench_login`. У scrypt в Django по умолчанию
+# 16 МБ и parallelism=5 (~280 мс на хеш); здесь вдвое больше памяти и
+# один проход: 32 МБ и ~120 мс, ~8 входов/с на ядро против ~3.5 у
+# стандартного scrypt и ~2.5 у PBKDF2 с 1 000 000 итераций.
+PASSWORD_HASHER_PARAMS = {
+    'scrypt': {'work_factor': 2 ** 15, 'block_size': 8, 'parallelism': 1},
+    'argon2': {'time_cost': 2, 'memory_cost': 19456, 'parallelism': 1},
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
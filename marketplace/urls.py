@@ -1,9 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
+from store.metrics import metrics_view
+
+# SimpleAdminConfig не ищет admin.py сам — URLconf грузится только веб-процессом
+admin.autodiscover()
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('', include('store.urls')),
     path('logout/', auth_views.LogoutView.as_view(next_page='/'), name='logout'),
 ]
\ No newline at end of file
@@ -0,0 +1,219 @@
+"""Массовые изменения цен и остатков товаров.
+
+Товары обрабатываются пачками по BULK_ADJUST_CHUNK_SIZE (keyset по id).
+На пачку приходятся: блокировка строк, один
+UPDATE ... SET price = ROUND(price * k, 2) (или quantity) и работа, которую
+при save() делают сигналы Product, — в той же транзакции и тоже
+множествами: INSERT ... SELECT строк PriceHistory и событий outbox, один
+GROUP BY для счётчиков SupplierStats. Строки товаров в Python не читаются.
+Кэши карточек и страниц товаров зависят от updated_at и сбрасываются сами,
+версию каталога (CatalogVersion) пачка поднимает явно.
+
+Каждый запуск оставляет запись ProductAdjustment. Если запуск прервался,
+у записи не будет finished_at, а уже обработанные пачки сохранятся; last_id
+записи показывает, с какого товара продолжать. Большие выборки админка
+только заводит в журнале, применяет их `manage.py adjust_products --pending`.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import CharField, Count, DateTimeField, DecimalField, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Cast, Greatest, JSONObject, Round
+from django.utils import timezone
+
+from .metrics import STOCK_OUTS
+from .models import (
+    CatalogVersion, Category, OutboxEvent, PriceHistory, Product, ProductAdjustment, Supplier, SupplierStats,
+    Warehouse,
+)
+
+# Поля, которые Product.outbox_payload кладёт в событие
+OUTBOX_FIELDS = ('name', 'price', 'quantity', 'category_id', 'supplier_id')
+MIN_PRICE = Decimal('0.01')
+# Фильтры product_scope и модели их значений в scope журнала
+SCOPE_MODELS = {'category': Category, 'supplier': Supplier, 'warehouse': Warehouse}
+
+
+class AdjustmentError(ValueError):
+    pass
+
+
+def product_scope(category=None, supplier=None, warehouse=None):
+    """Товары категории (вместе с подкатегориями), поставщика и/или склада."""
+    products = Product.objects.all()
+    if category is not None:
+        products = products.filter(category__in=category.get_descendants())
+    if supplier is not None:
+        products = products.filter(supplier=supplier)
+    if warehouse is not None:
+        products = products.filter(warehouse=warehouse)
+    return products
+
+
+def _operation(kind, value):
+    """Поле, выражение нового значения и Q строк, которые не изменятся."""
+    value = Decimal(value)
+    if kind == ProductAdjustment.KIND_PRICE_PERCENT:
+        if not value:
+            raise AdjustmentError('Процент изменения цены не может быть нулевым.')
+        if value <= -100:
+            raise AdjustmentError('Цену нельзя снизить на 100% и больше.')
+        factor = Value(1 + value / 100, output_field=DecimalField(max_digits=12, decimal_places=6))
+        expression = Greatest(Round(F('price') * factor, precision=2), Value(MIN_PRICE))
+        return 'price', expression, None
+
+    if value != value.to_integral_value():
+        raise AdjustmentError('Остаток меняется на целое число.')
+    value = int(value)
+    if kind == ProductAdjustment.KIND_STOCK_ADD:
+        if not value:
+            raise AdjustmentError('Изменение остатка не может быть нулевым.')
+        # Остаток не уходит ниже нуля; пустые товары при списании не трогаем
+        return 'quantity', Greatest(F('quantity') + value, Value(0)), Q(quantity=0) if value < 0 else None
+    if kind == ProductAdjustment.KIND_STOCK_SET:
+        if value < 0:
+            raise AdjustmentError('Остаток не может быть отрицательным.')
+        return 'quantity', Value(value), Q(quantity=value)
+    raise AdjustmentError(f'Неизвестный вид изменения: {kind}')
+
+
+def preview(products, kind, value):
+    """Что изменится: число товаров и диапазон значений до и после (один запрос)."""
+    field, expression, unchanged = _operation(kind, value)
+    aggregates = {
+        'matched': Count('pk'),
+        'changed': Count('pk', filter=~unchanged) if unchanged else Count('pk'),
+        'before_min': Min(field),
+        'before_max': Max(field),
+        'after_min': Min(expression),
+        'after_max': Max(expression),
+    }
+    if field == 'quantity':
+        aggregates['before_total'] = Sum(field)
+        aggregates['after_total'] = Sum(expression)
+    return products.order_by().aggregate(**aggregates)
+
+
+def scoped_products(scope):
+    """Товары по scope записи журнала: явные id или фильтры команды."""
+    if scope.get('ids') is not None:
+        return Product.objects.filter(pk__in=scope['ids'])
+    if 'filters' in scope:
+        # Фильтры списка админки вне админки не повторить
+        raise AdjustmentError('В записи нет id товаров, её нельзя продолжить.')
+    filters = {}
+    for name, model in SCOPE_MODELS.items():
+        if name in scope:
+            try:
+                filters[name] = model.objects.get(pk=scope[name])
+            except model.DoesNotExist:
+                raise AdjustmentError(f'{model._meta.verbose_name} с id {scope[name]} не найден.')
+    return product_scope(**filters)
+
+
+def start(products, kind, value, *, scope=None, user=None):
+    """Завести запись журнала, ничего не меняя: товары меняет run()."""
+    _operation(kind, value)
+    return ProductAdjustment.objects.create(
+        kind=kind, value=value, scope=scope or {}, user=user, matched=products.count(),
+    )
+
+
+def run(record, products, *, chunk_size=None, log=None):
+    """Применить запись журнала к товарам пачками, начиная после record.last_id."""
+    field, expression, unchanged = _operation(record.kind, record.value)
+    chunk_size = chunk_size or settings.BULK_ADJUST_CHUNK_SIZE
+    targets = products.exclude(unchanged) if unchanged else products
+    locked = ProductAdjustment.objects.select_for_update()
+    while True:
+        with transaction.atomic():
+            # Запись блокируется на пачку: два запуска одной записи не применят её дважды
+            record.refresh_from_db(from_queryset=locked)
+            if record.finished_at:
+                return record
+            ids = list(
+                targets.filter(pk__gt=record.last_id)
+                .order_by('pk')
+                .select_for_update(of=('self',))
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not ids:
+                record.finished_at = timezone.now()
+                record.save(update_fields=['finished_at'])
+                return record
+            now = timezone.now()
+            # Сначала следы изменения (старое и новое значение видны до UPDATE)
+            record.changed += _record_changes(field, expression, ids, now)
+            Product.objects.filter(pk__in=ids).update(**{field: expression, 'updated_at': now})
+            record.last_id = ids[-1]
+            record.save(update_fields=['changed', 'last_id'])
+            CatalogVersion.bump()
+        if log:
+            log(f'до id {record.last_id}: изменено {record.changed}')
+
+
+def adjust(products, kind, value, *, scope=None, user=None, chunk_size=None, log=None):
+    """Применить изменение к товарам products пачками и вернуть запись журнала."""
+    record = start(products, kind, value, scope=scope, user=user)
+    return run(record, products, chunk_size=chunk_size, log=log)
+
+
+def pending():
+    """Записи журнала без finished_at: отложенные админкой и прерванные."""
+    return ProductAdjustment.objects.filter(finished_at__isnull=True).order_by('pk')
+
+
+def _insert_from_select(model, columns, queryset):
+    """INSERT INTO model (columns) SELECT ... — строки не проходят через Python."""
+    sql, params = queryset.query.sql_with_params()
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    names = ', '.join(quote(model._meta.get_field(name).column) for name in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({names}) {sql}', params)
+        return cursor.rowcount
+
+
+def _as_text(expression):
+    # Цена в событиях — строкой, как её пишет DjangoJSONEncoder в сигналах
+    return Cast(expression, CharField())
+
+
+def _record_changes(field, expression, ids, now):
+    """Сделать за пачку то, что сигналы Product делают при save(); вернуть число изменённых."""
+    changed = (
+        Product.objects.filter(pk__in=ids)
+        .annotate(new_value=expression)
+        .exclude(**{field: F('new_value')})
+        .order_by()
+    )
+    stamp = Value(now, output_field=DateTimeField())
+    payload = {name: F(name) for name in OUTBOX_FIELDS}
+    payload[field] = F('new_value')
+    previous = F(field)
+    if field == 'price':
+        previous = _as_text(previous)
+    payload['price'] = _as_text(payload['price'])
+    payload['previous'] = JSONObject(**{field: previous})
+    count = _insert_from_select(OutboxEvent, ['topic', 'object_id', 'payload', 'created_at'], changed.values_list(
+        Value('product.updated'), 'pk', JSONObject(**payload), stamp,
+    ))
+
+    if field == 'price':
+        _insert_from_select(PriceHistory, ['product', 'price', 'valid_from'], changed.values_list(
+            'pk', 'new_value', stamp,
+        ))
+        return count
+
+    threshold = settings.LOW_STOCK_THRESHOLD
+    rows = changed.values_list('supplier_id').annotate(
+        stock=Sum(F('new_value') - F('quantity')),
+        low=Count('pk', filter=Q(new_value__lte=threshold)) - Count('pk', filter=Q(quantity__lte=threshold)),
+        outs=Count('pk', filter=Q(new_value=0)),
+    )
+    for supplier_id, stock, low, outs in rows:
+        SupplierStats.adjust(supplier_id, total_stock=stock, low_stock_count=low)
+        if outs:
+            STOCK_OUTS.inc(outs)
+    return count
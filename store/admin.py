@@ -1,9 +1,14 @@
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin import helpers
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
+from django.template.response import TemplateResponse
+from .adjustments import AdjustmentError, adjust, preview, start
 from .models import (
     User, Category, Supplier, Warehouse, Product, Review, 
-    Cart, CartItem, Order, Payment, Delivery
+    Cart, CartItem, Order, Payment, Delivery, ProductAdjustment
 )
 
 @admin.register(User)
@@ -17,6 +22,18 @@ class CustomUserAdmin(UserAdmin):
         ('Дополнительно', {'fields': ('role', 'phone', 'address')}),
     )
 
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ('tree_label', 'product_count')
+    list_select_related = False
+    readonly_fields = ('path', 'depth', 'product_count')
+    search_fields = ('name',)
+    autocomplete_fields = ('parent',)
+
+    def tree_label(self, obj):
+        return obj.tree_label
+    tree_label.short_description = 'Категория'
+
 class CartItemInline(admin.TabularInline):
     model = CartItem
     extra = 0
@@ -66,10 +83,89 @@ class CartItemInline(admin.TabularInline):
     
     readonly_fields = ('get_total_price', 'cart_user_email')
 
-admin.site.register(Category)
+class ProductAdjustmentForm(forms.Form):
+    kind = forms.ChoiceField(label='Что изменить', choices=ProductAdjustment.KIND_CHOICES)
+    value = forms.DecimalField(
+        label='Значение', max_digits=12, decimal_places=2,
+        help_text='Процент для цены (-10 — скидка 10%), число штук для остатка',
+    )
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ('name', 'category', 'supplier', 'warehouse', 'price', 'quantity', 'updated_at')
+    list_filter = ('category', 'supplier', 'warehouse')
+    list_select_related = ('category', 'supplier', 'warehouse')
+    search_fields = ('name',)
+    actions = ['adjust_products']
+
+    @admin.action(description='Изменить цены или остатки', permissions=['change'])
+    def adjust_products(self, request, queryset):
+        """Промежуточная страница: форма, предпросмотр (dry-run) и применение пачками.
+
+        Больше BULK_ADJUST_ADMIN_LIMIT товаров только заносится в журнал.
+        """
+        # «Выбрать все N»: queryset — весь отфильтрованный список, id не передаются
+        select_across = request.POST.get('select_across') == '1'
+        form = ProductAdjustmentForm(request.POST if 'kind' in request.POST else None)
+        summary = None
+        if form.is_valid():
+            kind, value = form.cleaned_data['kind'], form.cleaned_data['value']
+            try:
+                if 'apply' in request.POST:
+                    selected = request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)
+                    scope = {
+                        'filters': request.GET.dict(),
+                        'ids': None if select_across else [int(pk) for pk in selected],
+                    }
+                    if queryset.count() > settings.BULK_ADJUST_ADMIN_LIMIT:
+                        # Фильтры списка вне админки не повторить — запоминаем id
+                        scope['ids'] = list(queryset.order_by('pk').values_list('pk', flat=True))
+                        record = start(queryset, kind, value, user=request.user, scope=scope)
+                        self.message_user(
+                            request,
+                            f'{record.get_kind_display()} {value}: {record.matched} товаров — запись #{record.pk} '
+                            f'применит manage.py adjust_products --pending.',
+                        )
+                        return None
+                    record = adjust(queryset, kind, value, user=request.user, scope=scope)
+                    self.message_user(
+                        request,
+                        f'{record.get_kind_display()} {value}: изменено {record.changed} из {record.matched} товаров.',
+                    )
+                    return None
+                summary = preview(queryset, kind, value)
+            except AdjustmentError as e:
+                form.add_error('value', str(e))
+        return TemplateResponse(request, 'admin/store/product/adjust.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Массовое изменение цен и остатков',
+            'opts': self.model._meta,
+            'form': form,
+            'summary': summary,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': select_across,
+            'count': queryset.count(),
+            'limit': settings.BULK_ADJUST_ADMIN_LIMIT,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+
+@admin.register(ProductAdjustment)
+class ProductAdjustmentAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'kind', 'value', 'matched', 'changed', 'user', 'finished_at')
+    list_filter = ('kind',)
+    readonly_fields = [f.name for f in ProductAdjustment._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Supplier)
 admin.site.register(Warehouse)
-admin.site.register(Product)
 admin.site.register(Review)
 admin.site.register(Order)
 admin.site.register(Payment)
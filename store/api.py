@@ -0,0 +1,342 @@
+"""JSON API v1: каталог, корзина и заказы.
+
+Общие параметры списков:
+    ?fields=id,name,price  — разреженный набор полей (превращается в .only())
+    ?include=category      — связанные объекты (select_related / prefetch_related)
+    ?cursor=...&limit=50   — keyset-пагинация по id
+"""
+import base64
+import json
+from decimal import Decimal
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET, require_http_methods
+
+from .facets import filter_products, parse_filters
+from .models import Cart, CartItem, Order, OrderItem, Product
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+PRODUCT_FIELDS = (
+    'id', 'name', 'description', 'price', 'quantity', 'rating', 'review_count',
+    'category_id', 'supplier_id', 'updated_at',
+)
+PRODUCT_INCLUDES = {
+    'category': ('id', 'name', 'path'),
+    'supplier': ('id', 'company_name'),
+}
+
+ORDER_FIELDS = ('id', 'status', 'total_price', 'created_at', 'updated_at')
+ORDER_INCLUDES = {
+    'payment': ('id', 'method', 'amount', 'status', 'transaction_date'),
+    'delivery': ('id', 'tracking_number', 'delivery_status', 'delivery_address', 'shipped_date', 'delivery_date'),
+    'items': None,
+}
+
+CART_ITEM_PRODUCT_FIELDS = ('id', 'name', 'price')
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        # Строкой, чтобы не терять точность цены
+        return str(value)
+    raise TypeError
+
+
+class ApiResponse(HttpResponse):
+    def __init__(self, data, status=200):
+        if orjson is not None:
+            content = orjson.dumps(data, default=_default)
+        else:
+            from django.core.serializers.json import DjangoJSONEncoder
+            content = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+        super().__init__(content, status=status, content_type='application/json')
+
+
+def api_view(view):
+    """Ошибки API и неавторизованный доступ — JSON, а не HTML-редирект."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as e:
+            return ApiResponse({'error': str(e)}, status=e.status)
+    return wrapper
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            raise ApiError('Требуется авторизация.', status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _parse_list(request, name, allowed, default):
+    raw = request.GET.get(name)
+    if not raw:
+        return list(default)
+    values = [v.strip() for v in raw.split(',') if v.strip()]
+    unknown = [v for v in values if v not in allowed]
+    if unknown:
+        raise ApiError(f'Неизвестные значения {name}: {", ".join(unknown)}')
+    return values
+
+
+def parse_fields(request, allowed):
+    fields = _parse_list(request, 'fields', allowed, allowed)
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def parse_include(request, allowed):
+    return _parse_list(request, 'include', allowed, ())
+
+
+def _body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError('Тело запроса должно быть JSON.')
+
+
+def _get_or_404(queryset, message, **lookup):
+    """get_object_or_404 с JSON-ответом вместо HTML-страницы."""
+    try:
+        return queryset.get(**lookup)
+    except queryset.model.DoesNotExist:
+        raise ApiError(message, status=404)
+
+
+def _encode_cursor(pk):
+    return base64.urlsafe_b64encode(str(pk).encode('ascii')).decode('ascii')
+
+
+def paginate(request, queryset, descending=False):
+    """Страница по id: возвращает (объекты, курсор следующей страницы)."""
+    limit = request.GET.get('limit') or DEFAULT_LIMIT
+    try:
+        limit = min(int(limit), MAX_LIMIT)
+    except ValueError:
+        raise ApiError('limit должен быть числом.')
+    if limit < 1:
+        raise ApiError('limit должен быть положительным.')
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            after = int(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (ValueError, UnicodeError):
+            raise ApiError('Некорректный курсор.')
+        queryset = queryset.filter(**{'pk__lt' if descending else 'pk__gt': after})
+
+    page = list(queryset.order_by('-pk' if descending else 'pk')[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = _encode_cursor(page[-1].pk)
+    return page, next_cursor
+
+
+def _related_dict(obj, fields):
+    if obj is None:
+        return None
+    return {f: getattr(obj, f) for f in fields}
+
+
+# Каталог
+
+def _product_queryset(fields, include):
+    only = list(fields)
+    for name in include:
+        only += [f'{name}__{f}' for f in PRODUCT_INCLUDES[name]]
+    return Product.objects.select_related(*include).only(*only)
+
+
+def _product_dict(product, fields, include):
+    data = {f: getattr(product, f) for f in fields}
+    for name in include:
+        data[name] = _related_dict(getattr(product, name), PRODUCT_INCLUDES[name])
+    return data
+
+
+@require_GET
+@api_view
+def product_list(request):
+    fields = parse_fields(request, PRODUCT_FIELDS)
+    include = parse_include(request, PRODUCT_INCLUDES)
+    products = filter_products(_product_queryset(fields, include), parse_filters(request.GET))
+    page, next_cursor = paginate(request, products)
+    return ApiResponse({
+        'data': [_product_dict(p, fields, include) for p in page],
+        'next_cursor': next_cursor,
+    })
+
+
+@require_GET
+@api_view
+def product_detail(request, pk):
+    fields = parse_fields(request, PRODUCT_FIELDS)
+    include = parse_include(request, PRODUCT_INCLUDES)
+    product = _get_or_404(_product_queryset(fields, include), 'Товар не найден.', pk=pk)
+    return ApiResponse({'data': _product_dict(product, fields, include)})
+
+
+# Корзина
+
+def _cart_items(cart):
+    return (
+        CartItem.objects.filter(cart=cart)
+        .select_related('product')
+        .only('id', 'quantity', 'cart_id', *[f'product__{f}' for f in CART_ITEM_PRODUCT_FIELDS])
+        .order_by('pk')
+    )
+
+
+def _cart_dict(cart, items):
+    return {
+        'id': cart.pk if cart else None,
+        'items': [
+            {
+                'id': item.pk,
+                'quantity': item.quantity,
+                'product': _related_dict(item.product, CART_ITEM_PRODUCT_FIELDS),
+                'total_price': item.product.price * item.quantity,
+            }
+            for item in items
+        ],
+        'total_price': sum((item.product.price * item.quantity for item in items), Decimal('0')),
+    }
+
+
+@require_GET
+@api_view
+@api_login_required
+def cart_detail(request):
+    cart = Cart.objects.filter(user=request.user).order_by('pk').first()
+    items = list(_cart_items(cart)) if cart else []
+    return ApiResponse({'data': _cart_dict(cart, items)})
+
+
+@require_http_methods(['POST'])
+@api_view
+@api_login_required
+def cart_item_create(request):
+    body = _body(request)
+    try:
+        product_id = int(body['product'])
+        quantity = int(body.get('quantity', 1))
+    except (KeyError, TypeError, ValueError):
+        raise ApiError('Нужны поля product и quantity (целые числа).')
+    if quantity < 1:
+        raise ApiError('quantity должен быть положительным.')
+    if not Product.objects.filter(pk=product_id).exists():
+        raise ApiError('Товар не найден.', status=404)
+
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user=request.user)
+        updated = CartItem.objects.filter(cart=cart, product_id=product_id).update(
+            quantity=F('quantity') + quantity
+        )
+        if not updated:
+            CartItem.objects.create(cart=cart, product_id=product_id, quantity=quantity)
+        cart.touch()
+    return ApiResponse({'data': _cart_dict(cart, list(_cart_items(cart)))}, status=201)
+
+
+@require_http_methods(['PATCH', 'DELETE'])
+@api_view
+@api_login_required
+def cart_item_detail(request, pk):
+    item = _get_or_404(
+        CartItem.objects.select_related('cart'), 'Позиция корзины не найдена.', pk=pk, cart__user=request.user
+    )
+    if request.method == 'DELETE':
+        item.delete()
+    else:
+        try:
+            quantity = int(_body(request)['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise ApiError('Нужно поле quantity (целое число).')
+        if quantity > 0:
+            item.quantity = quantity
+            item.save(update_fields=['quantity'])
+        else:
+            item.delete()
+    item.cart.touch()
+    return ApiResponse({'data': _cart_dict(item.cart, list(_cart_items(item.cart)))})
+
+
+# Заказы
+
+def _order_queryset(request, fields, include):
+    only = list(fields) + ['user_id']
+    related = [name for name in include if name != 'items']
+    for name in related:
+        only += [f'{name}__{f}' for f in ORDER_INCLUDES[name]]
+    orders = Order.objects.filter(user=request.user).select_related(*related)
+    if 'items' in include:
+        orders = orders.prefetch_related(Prefetch(
+            'items',
+            queryset=OrderItem.objects.only('id', 'order_id', 'product_id', 'name', 'price', 'quantity')
+            .order_by('pk'),
+        ))
+    return orders.only(*only)
+
+
+def _order_dict(order, fields, include):
+    data = {f: getattr(order, f) for f in fields}
+    for name in include:
+        if name == 'items':
+            data['items'] = [
+                {
+                    'id': item.pk,
+                    'quantity': item.quantity,
+                    # Название и цена — на момент оформления; товар мог быть удалён
+                    'product': {'id': item.product_id, 'name': item.name, 'price': item.price},
+                }
+                for item in order.items.all()
+            ]
+        else:
+            data[name] = _related_dict(getattr(order, name, None), ORDER_INCLUDES[name])
+    return data
+
+
+@require_GET
+@api_view
+@api_login_required
+def order_list(request):
+    fields = parse_fields(request, ORDER_FIELDS)
+    include = parse_include(request, ORDER_INCLUDES)
+    page, next_cursor = paginate(request, _order_queryset(request, fields, include), descending=True)
+    return ApiResponse({
+        'data': [_order_dict(o, fields, include) for o in page],
+        'next_cursor': next_cursor,
+    })
+
+
+@require_GET
+@api_view
+@api_login_required
+def order_detail(request, pk):
+    fields = parse_fields(request, ORDER_FIELDS)
+    include = parse_include(request, ORDER_INCLUDES)
+    order = _get_or_404(_order_queryset(request, fields, include), 'Заказ не найден.', pk=pk)
+    return ApiResponse({'data': _order_dict(order, fields, include)})
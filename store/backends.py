@@ -0,0 +1,44 @@
+"""Бэкенд аутентификации с кэшем пользователя.
+
+django.contrib.auth на каждом запросе читает строку User по id из
+сессии; здесь она берётся из кэша settings.USER_CACHE_ALIAS. Сохранение и
+удаление пользователя сбрасывают запись (signals) — но только в том кэше,
+который видит процесс, сделавший изменение. Поэтому кэш должен быть общим
+для всех процессов (Redis/Memcached): с LocMem другие воркеры до
+USER_CACHE_TIMEOUT принимали бы сессию заблокированного пользователя или
+старый пароль. Без алиаса (None) пользователь читается из БД, как в
+ModelBackend. QuerySet.update() по пользователям идёт мимо сигналов —
+после него нужно вызвать forget_user.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+
+def user_cache_key(user_id):
+    return f'user:{user_id}'
+
+
+def _user_cache():
+    alias = settings.USER_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def forget_user(user_id):
+    cache = _user_cache()
+    if cache is not None:
+        cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        cache = _user_cache()
+        if cache is None:
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user
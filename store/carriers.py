@@ -0,0 +1,187 @@
+"""Интеграция с перевозчиками.
+
+Трек-номера выдаются из блоков, заранее зарезервированных у
+перевозчика (TrackingBlock): процесс держит текущий блок в памяти и
+обращается к перевозчику раз в BLOCK_SIZE заказов. Номера,
+оставшиеся в блоке при перезапуске процесса, пропадают — это плата
+за отсутствие запроса на каждый заказ.
+
+Статусы приходят пачками (опрос `manage.py sync_deliveries` или
+вебхук) и применяются apply_status_updates: поиск по индексу
+tracking_number пачками по 1000 номеров, один UPDATE на статус и
+события outbox в той же транзакции. Статусы вне STATUS_FLOW отклоняются
+целиком (StatusError), шаги назад по STATUS_FLOW пропускаются.
+
+Перевозчики задаются в settings.CARRIERS: {'код': {'CLASS': путь, ...}}.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Delivery, OutboxEvent, TrackingBlock, TrackingCounter
+
+STATUS_PROCESSING = 'в обработке'
+STATUS_IN_TRANSIT = 'в пути'
+STATUS_PICKUP = 'в пункте выдачи'
+STATUS_DELIVERED = 'получен'
+STATUS_FLOW = [STATUS_PROCESSING, STATUS_IN_TRANSIT, STATUS_PICKUP, STATUS_DELIVERED]
+FINAL_STATUSES = {STATUS_DELIVERED}  # см. также Delivery.Meta.indexes
+
+UPDATE_BATCH_SIZE = 1000
+
+
+class StatusError(ValueError):
+    pass
+
+
+class Carrier:
+    def __init__(self, code, PREFIX, BLOCK_SIZE=1000, WEBHOOK_SECRET=None, **options):
+        self.code = code
+        self.prefix = PREFIX
+        self.block_size = BLOCK_SIZE
+        self.webhook_secret = WEBHOOK_SECRET
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+
+    def format_number(self, number):
+        return f'{self.prefix}{number:010d}'
+
+    def reserve_block(self, size):
+        """Получить у перевозчика диапазон [start, end)."""
+        raise NotImplementedError
+
+    def fetch_statuses(self, parcels):
+        """{трек-номер: текущий статус} → {трек-номер: новый статус} для изменившихся."""
+        raise NotImplementedError
+
+    def allocate(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self.reserve_block(self.block_size)
+            number = self._next
+            self._next += 1
+        return self.format_number(number)
+
+
+class LocalStubCarrier(Carrier):
+    """Перевозчик-заглушка: статусы продвигаются по STATUS_FLOW.
+
+    Блоки номеров выдаёт счётчик TrackingCounter, TrackingBlock — их журнал.
+    """
+
+    def reserve_block(self, size):
+        counters = TrackingCounter.objects.filter(carrier=self.code)
+        with transaction.atomic():
+            # UPDATE блокирует строку-счётчик: параллельные резервы ждут
+            # друг друга, а не конфликтуют на вставке блока
+            if not counters.update(next_number=F('next_number') + size):
+                first = TrackingBlock.objects.filter(carrier=self.code).aggregate(end=Max('end'))['end'] or 1
+                TrackingCounter.objects.get_or_create(carrier=self.code, defaults={'next_number': first})
+                counters.update(next_number=F('next_number') + size)
+            end = counters.values_list('next_number', flat=True).get()
+            TrackingBlock.objects.create(carrier=self.code, start=end - size, end=end)
+        return end - size, end
+
+    def fetch_statuses(self, parcels):
+        # Детерминированно: примерно треть посылок за опрос переходит дальше
+        updates = {}
+        for number, status in parcels.items():
+            if status in FINAL_STATUSES or status not in STATUS_FLOW:
+                continue
+            step = hashlib.md5(f'{number}:{timezone.now():%Y%m%d%H%M}'.encode()).digest()[0] % 3
+            if step == 0:
+                updates[number] = STATUS_FLOW[STATUS_FLOW.index(status) + 1]
+        return updates
+
+
+_carriers = {}
+_carriers_lock = threading.Lock()
+
+
+def get_carrier(code=None):
+    code = code or settings.DEFAULT_CARRIER
+    with _carriers_lock:
+        if code not in _carriers:
+            options = dict(settings.CARRIERS[code])
+            _carriers[code] = import_string(options.pop('CLASS'))(code, **options)
+    return _carriers[code]
+
+
+def apply_status_updates(updates):
+    """Применить {трек-номер: статус}; вернуть (изменено, пропущено шагов назад)."""
+    unknown = {status for status in updates.values() if status not in STATUS_FLOW}
+    if unknown:
+        raise StatusError(f'Неизвестные статусы: {", ".join(sorted(map(str, unknown)))}')
+    numbers = list(updates)
+    changed = skipped = 0
+    now = timezone.now()
+    today = timezone.localdate(now)
+    for i in range(0, len(numbers), UPDATE_BATCH_SIZE):
+        chunk = numbers[i:i + UPDATE_BATCH_SIZE]
+        deliveries = list(
+            Delivery.objects.filter(tracking_number__in=chunk).only(
+                'id', 'order_id', 'tracking_number', 'delivery_status', 'shipped_date', 'delivery_date'
+            )
+        )
+        to_update = []
+        by_status = {}
+        for delivery in deliveries:
+            status = updates[delivery.tracking_number]
+            if status == delivery.delivery_status:
+                continue
+            # Запоздавший статус не откатывает доставку назад
+            if delivery.delivery_status in STATUS_FLOW and (
+                STATUS_FLOW.index(status) < STATUS_FLOW.index(delivery.delivery_status)
+            ):
+                skipped += 1
+                continue
+            delivery.delivery_status = status
+            delivery.status_updated_at = now
+            if status == STATUS_IN_TRANSIT and not delivery.shipped_date:
+                delivery.shipped_date = today
+            if status in FINAL_STATUSES:
+                delivery.delivery_date = today
+            to_update.append(delivery)
+            by_status.setdefault(status, []).append(delivery.pk)
+        if not to_update:
+            continue
+        with transaction.atomic():
+            # Статусов немного: один UPDATE ... WHERE id IN (...) на статус
+            # вместо CASE на каждую строку, как делает bulk_update
+            for status, ids in by_status.items():
+                fields = {'delivery_status': status, 'status_updated_at': now}
+                if status == STATUS_IN_TRANSIT:
+                    fields['shipped_date'] = Coalesce(F('shipped_date'), Value(today))
+                if status in FINAL_STATUSES:
+                    fields['delivery_date'] = today
+                Delivery.objects.filter(pk__in=ids).update(**fields)
+            # update() идёт мимо сигналов — события outbox пишем сами
+            OutboxEvent.objects.bulk_create([
+                OutboxEvent(topic='delivery.updated', object_id=d.pk, payload=d.outbox_payload())
+                for d in to_update
+            ], batch_size=UPDATE_BATCH_SIZE)
+        changed += len(to_update)
+    return changed, skipped
+
+
+def in_flight(carrier_code, batch_size):
+    """Пачки {трек-номер: статус} незавершённых доставок перевозчика по id."""
+    last_id = 0
+    while True:
+        rows = list(
+            # Условие совпадает с частичным индексом delivery_in_flight_idx
+            Delivery.objects.filter(carrier=carrier_code, pk__gt=last_id)
+            .exclude(delivery_status=STATUS_DELIVERED)
+            .order_by('pk')
+            .values_list('pk', 'tracking_number', 'delivery_status')[:batch_size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield {number: status for pk, number, status in rows}
@@ -0,0 +1,51 @@
+"""Корзина пользователя без get_or_create на каждом запросе.
+
+У пользователя одна корзина (unique_user_cart), поэтому её id
+кэшируется по пользователю и запоминается в request на время запроса.
+Purge сбрасывает кэш только в своём процессе: при LocMem-кэше веб-воркеры
+могут держать id удалённой корзины. Чтение такой корзины безвредно
+(пустой список), а перед записью её строка проверяется (touch=True).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Cart
+
+
+def cart_id_key(user_id):
+    return f'cart_id:{user_id}'
+
+
+def forget_cart_ids(user_ids):
+    cache.delete_many([cart_id_key(user_id) for user_id in user_ids])
+
+
+def get_user_cart(request, touch=False):
+    """Корзина request.user; остальные поля, кроме id и user, отложены.
+
+    touch=True — перед записью позиций: отметить изменение корзины и, если
+    её строки уже нет, забыть id и завести корзину заново.
+    """
+    cart = _cached_cart(request)
+    if touch and not cart.touch():
+        forget_cart_ids([request.user.pk])
+        request._user_cart = None
+        cart = _cached_cart(request)
+    return cart
+
+
+def _cached_cart(request):
+    cart = getattr(request, '_user_cart', None)
+    if cart is not None:
+        return cart
+    user = request.user
+    key = cart_id_key(user.pk)
+    cart_id = cache.get(key)
+    if cart_id is None:
+        cart_id = Cart.objects.get_or_create(user=user)[0].pk
+        cache.set(key, cart_id, settings.CART_ID_CACHE_TIMEOUT)
+    cart = Cart.from_db(DEFAULT_DB_ALIAS, ['id', 'user_id'], [cart_id, user.pk])
+    cart.user = user
+    request._user_cart = cart
+    return cart
@@ -0,0 +1,263 @@
+"""Инкрементальная выгрузка: ?since=<ISO-время> или ?cursor=<курсор>.
+
+Строки отдаются в порядке (updated_at, id); курсор на следующую выгрузку
+возвращается в заголовке X-Next-Cursor. Удаления в дельту не попадают.
+
+Дельта (since, cursor или limit) останавливается на now() - EXPORT_DELTA_LAG:
+updated_at ставится до COMMIT, и свежие строки ещё могут дополниться
+строками с меньшим updated_at из незакоммиченных транзакций. Полная
+выгрузка отдаёт все строки, но курсор и в ней не уходит за эту границу —
+более свежие строки придут ещё раз со следующей дельтой.
+"""
+import base64
+import tempfile
+from datetime import timedelta
+from functools import wraps
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, HttpResponseBadRequest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .metrics import record_export
+
+CURSOR_HEADER = 'X-Next-Cursor'
+HAS_MORE_HEADER = 'X-Has-More'
+
+
+class DeltaError(ValueError):
+    pass
+
+
+def encode_cursor(updated_at, pk):
+    raw = f'{updated_at.isoformat()}~{pk}'
+    return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii')
+        stamp, pk = raw.rsplit('~', 1)
+        updated_at = parse_datetime(stamp)
+        pk = int(pk)
+    except (ValueError, UnicodeError):
+        raise DeltaError('Некорректный курсор.')
+    if updated_at is None:
+        raise DeltaError('Некорректный курсор.')
+    return updated_at, pk
+
+
+def export_horizon(params):
+    """Граница, до которой отдаёт строки дельта, или None для полной выгрузки."""
+    if not any(params.get(key) for key in ('since', 'cursor', 'limit')):
+        return None
+    return timezone.now() - timedelta(seconds=settings.EXPORT_DELTA_LAG)
+
+
+class Delta:
+    """Параметры дельта-выгрузки из GET и курсор для ответа."""
+
+    def __init__(self, params):
+        self.cursor = params.get('cursor')
+        self.since = None
+        self.after = None
+        self.limit = None
+        self.has_more = False
+        self.last = None
+        self.count = 0
+        # Курсор не уходит за границу и в полной выгрузке
+        self.horizon = timezone.now() - timedelta(seconds=settings.EXPORT_DELTA_LAG)
+        self.lagged = export_horizon(params) is not None
+
+        if self.cursor:
+            self.after = decode_cursor(self.cursor)
+        elif params.get('since'):
+            try:
+                self.since = parse_datetime(params['since'])
+            except ValueError:
+                # Формат верный, но дата несуществующая (2024-13-01)
+                self.since = None
+            if self.since is None:
+                raise DeltaError('Параметр since должен быть датой в формате ISO 8601.')
+            if timezone.is_naive(self.since):
+                self.since = timezone.make_aware(self.since)
+
+        if params.get('limit'):
+            if not params['limit'].isdigit() or int(params['limit']) < 1:
+                raise DeltaError('Параметр limit должен быть положительным числом.')
+            self.limit = int(params['limit'])
+
+    def apply(self, queryset):
+        # Порядок (updated_at, id) нужен всегда: даже полная выгрузка
+        # отдаёт курсор, с которого начнётся следующая дельта.
+        if self.after:
+            updated_at, pk = self.after
+            queryset = queryset.filter(
+                Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk)
+            )
+        elif self.since:
+            queryset = queryset.filter(updated_at__gt=self.since)
+        if self.lagged:
+            queryset = queryset.filter(updated_at__lte=self.horizon)
+        queryset = queryset.order_by('updated_at', 'pk')
+        if self.limit:
+            queryset = queryset[:self.limit + 1]
+        return queryset
+
+    def rows(self, queryset, key=None):
+        """Итерировать строки, запоминая ключ последней для курсора.
+
+        key(row) -> (updated_at, id); по умолчанию строка — экземпляр модели.
+        """
+        key = key or (lambda obj: (obj.updated_at, obj.pk))
+        for i, row in enumerate(queryset):
+            if self.limit and i == self.limit:
+                self.has_more = True
+                break
+            row_key = key(row)
+            if row_key[0] <= self.horizon:
+                self.last = row_key
+            self.count += 1
+            yield row
+
+    def set_headers(self, response):
+        if self.last is not None:
+            response[CURSOR_HEADER] = encode_cursor(*self.last)
+        elif self.cursor:
+            response[CURSOR_HEADER] = self.cursor
+        elif self.since:
+            response[CURSOR_HEADER] = encode_cursor(self.since, 0)
+        response[HAS_MORE_HEADER] = '1' if self.has_more else '0'
+        return response
+
+
+def delta_export(view):
+    """Передать во view разобранный Delta; на некорректные параметры — 400."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            delta = Delta(request.GET)
+        except DeltaError as e:
+            return HttpResponseBadRequest(str(e))
+        response = view(request, delta, *args, **kwargs)
+        record_export(request, response, delta.count)
+        return response
+    return wrapper
+
+
+# Колоночные форматы (Parquet / Arrow IPC). pyarrow — необязательная
+# зависимость и импортируется только при запросе такой выгрузки.
+
+COLUMNAR_BATCH_SIZE = 50_000
+
+COLUMNAR_FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.file', 'arrow'),
+}
+
+
+def _columnar_schema(pa, columns):
+    types = {
+        'int': pa.int64(),
+        'str': pa.string(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    fields = []
+    for lookup, kind in columns:
+        # category__name -> category_name
+        name = lookup.replace('__', '_')
+        if isinstance(kind, tuple):
+            # ('decimal', max_digits, decimal_places)
+            fields.append(pa.field(name, pa.decimal128(kind[1], kind[2])))
+        else:
+            fields.append(pa.field(name, types[kind]))
+    return pa.schema(fields)
+
+
+PRODUCT_COLUMNS = [
+    ('id', 'int'),
+    ('name', 'str'),
+    ('description', 'str'),
+    ('category__name', 'str'),
+    ('price', ('decimal', 10, 2)),
+    ('quantity', 'int'),
+    ('supplier__company_name', 'str'),
+    ('updated_at', 'timestamp'),
+]
+
+ORDER_COLUMNS = [
+    ('id', 'int'),
+    ('user__email', 'str'),
+    ('status', 'str'),
+    ('total_price', ('decimal', 12, 2)),
+    ('created_at', 'timestamp'),
+    ('updated_at', 'timestamp'),
+]
+
+SUPPLIER_COLUMNS = [
+    ('id', 'int'),
+    ('company_name', 'str'),
+    ('inn', 'str'),
+    ('phone', 'str'),
+    ('email', 'str'),
+    ('address', 'str'),
+    ('updated_at', 'timestamp'),
+]
+
+
+def column_rows(queryset, columns, delta, chunk_size=COLUMNAR_BATCH_SIZE):
+    """Кортежи значений колонок по дельте; курсор ведётся по id и updated_at."""
+    lookups = [name for name, kind in columns]
+    id_index, updated_index = lookups.index('id'), lookups.index('updated_at')
+    return delta.rows(
+        delta.apply(queryset).values_list(*lookups).iterator(chunk_size=chunk_size),
+        key=lambda row: (row[updated_index], row[id_index]),
+    )
+
+
+def write_columnar(queryset, columns, delta, fmt, sink):
+    """Записать queryset в sink в формате Parquet/Arrow пачками по COLUMNAR_BATCH_SIZE строк.
+
+    columns — [(lookup, тип)], где тип — 'int', 'str', 'timestamp' или
+    ('decimal', digits, places). Среди колонок должны быть id и updated_at.
+    Без pyarrow бросает ImportError.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _columnar_schema(pa, columns)
+    rows = column_rows(queryset, columns, delta)
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        options = pa.ipc.IpcWriteOptions(compression='zstd')
+        writer = pa.ipc.new_file(sink, schema, options=options)
+
+    with writer:
+        while True:
+            chunk = list(islice(rows, COLUMNAR_BATCH_SIZE))
+            if not chunk:
+                break
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)],
+                schema=schema,
+            ))
+
+
+def columnar_export(queryset, columns, delta, fmt, filename):
+    """Ответ с выгрузкой queryset в Parquet/Arrow (см. write_columnar)."""
+    # Файл на диске, а не в памяти: миллионы строк не должны жить в RAM
+    sink = tempfile.TemporaryFile()
+    try:
+        write_columnar(queryset, columns, delta, fmt, sink)
+    except ImportError:
+        sink.close()
+        return HttpResponse('Для этого формата на сервере нужен pyarrow.', status=501)
+    sink.seek(0)
+
+    content_type, extension = COLUMNAR_FORMATS[fmt]
+    response = FileResponse(sink, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return delta.set_headers(response)
@@ -0,0 +1,201 @@
+"""Фасетный фильтр каталога.
+
+Каждый фасет считается одним агрегирующим запросом по выборке,
+отфильтрованной всеми остальными фасетами (свой фильтр не применяется,
+чтобы у невыбранных вариантов тоже были счётчики).
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Q
+
+from .models import Category, Product
+
+PRICE_RANGES = [
+    ('0-1000', 'до 1 000 ₽', None, Decimal('1000')),
+    ('1000-5000', '1 000 – 5 000 ₽', Decimal('1000'), Decimal('5000')),
+    ('5000-20000', '5 000 – 20 000 ₽', Decimal('5000'), Decimal('20000')),
+    ('20000-', 'от 20 000 ₽', Decimal('20000'), None),
+]
+
+RATING_THRESHOLDS = [4, 3, 2, 1]
+
+SUPPLIER_FACET_LIMIT = 20
+
+
+def _parse_decimal(value):
+    if value in (None, ''):
+        return None
+    try:
+        value = Decimal(value)
+    except InvalidOperation:
+        return None
+    # NaN и Infinity Decimal разбирает, но в фильтр ORM они не годятся
+    return value if value.is_finite() else None
+
+
+def _parse_int(value):
+    if value and value.isdigit():
+        return int(value)
+    return None
+
+
+def parse_filters(params):
+    """Разобрать GET-параметры каталога. Некорректные значения игнорируются."""
+    filters = {
+        'category': None,
+        'supplier': _parse_int(params.get('supplier')),
+        'price_min': _parse_decimal(params.get('price_min')),
+        'price_max': _parse_decimal(params.get('price_max')),
+        'price_range': None,
+        'in_stock': params.get('in_stock') == '1',
+        'rating': _parse_int(params.get('rating')),
+        'missing_category': False,
+    }
+
+    category_id = _parse_int(params.get('category'))
+    if category_id:
+        filters['category'] = (
+            Category.objects.filter(pk=category_id).only('name', 'path').first()
+        )
+        # Несуществующая категория — пустая выдача, а не весь каталог
+        filters['missing_category'] = filters['category'] is None
+
+    price_range = params.get('price_range')
+    for key, label, low, high in PRICE_RANGES:
+        if key == price_range:
+            filters['price_range'] = key
+            filters['price_min'], filters['price_max'] = low, high
+    return filters
+
+
+def _filter_q(filters, exclude=None):
+    q = Q()
+    if exclude != 'category' and filters['category']:
+        q &= Q(category__path__startswith=filters['category'].path)
+    if exclude != 'category' and filters['missing_category']:
+        q &= Q(pk__in=[])
+    if exclude != 'supplier' and filters['supplier']:
+        q &= Q(supplier_id=filters['supplier'])
+    if exclude != 'price':
+        if filters['price_min'] is not None:
+            q &= Q(price__gte=filters['price_min'])
+        if filters['price_max'] is not None:
+            q &= Q(price__lt=filters['price_max'])
+    if exclude != 'in_stock' and filters['in_stock']:
+        q &= Q(quantity__gt=0)
+    if exclude != 'rating' and filters['rating']:
+        q &= Q(rating__gte=filters['rating'])
+    return q
+
+
+def filter_products(queryset, filters):
+    return queryset.filter(_filter_q(filters))
+
+
+def _category_facet(filters, nav_categories):
+    q = _filter_q(filters, exclude='category')
+    if not q:
+        # Без других фильтров счётчик поддерева уже есть в Category.product_count
+        totals = {category.path: category.product_count for category in nav_categories}
+    else:
+        totals = _subtree_counts(q)
+
+    selected = filters['category']
+    return [
+        {
+            'value': category.pk,
+            'label': category.tree_label,
+            'count': totals.get(category.path, 0),
+            'selected': selected is not None and selected.pk == category.pk,
+        }
+        for category in nav_categories
+    ]
+
+
+def _subtree_counts(q):
+    # Один GROUP BY по пути категории; счётчики поддеревьев собираем
+    # из префиксов путей, а не отдельным запросом на каждую категорию.
+    rows = (
+        Product.objects.filter(q, category__isnull=False)
+        .values_list('category__path')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    totals = {}
+    for path, n in rows:
+        parts = path.split('/')[:-1]
+        for i in range(1, len(parts) + 1):
+            prefix = '/'.join(parts[:i]) + '/'
+            totals[prefix] = totals.get(prefix, 0) + n
+    return totals
+
+
+def _supplier_facet(filters):
+    rows = (
+        Product.objects.filter(_filter_q(filters, exclude='supplier'), supplier__isnull=False)
+        .values_list('supplier_id', 'supplier__company_name')
+        .annotate(n=Count('id'))
+        .order_by('-n', 'supplier__company_name')[:SUPPLIER_FACET_LIMIT]
+    )
+    return [
+        {
+            'value': supplier_id,
+            'label': company_name,
+            'count': n,
+            'selected': supplier_id == filters['supplier'],
+        }
+        for supplier_id, company_name, n in rows
+    ]
+
+
+def _price_facet(filters):
+    aggregates = {}
+    for i, (key, label, low, high) in enumerate(PRICE_RANGES):
+        q = Q()
+        if low is not None:
+            q &= Q(price__gte=low)
+        if high is not None:
+            q &= Q(price__lt=high)
+        aggregates[f'r{i}'] = Count('id', filter=q)
+    counts = Product.objects.filter(_filter_q(filters, exclude='price')).aggregate(**aggregates)
+    return [
+        {
+            'value': key,
+            'label': label,
+            'count': counts[f'r{i}'],
+            'selected': key == filters['price_range'],
+        }
+        for i, (key, label, low, high) in enumerate(PRICE_RANGES)
+    ]
+
+
+def _in_stock_facet(filters):
+    return Product.objects.filter(_filter_q(filters, exclude='in_stock')).aggregate(
+        n=Count('id', filter=Q(quantity__gt=0))
+    )['n']
+
+
+def _rating_facet(filters):
+    counts = Product.objects.filter(_filter_q(filters, exclude='rating')).aggregate(**{
+        f'r{threshold}': Count('id', filter=Q(rating__gte=threshold))
+        for threshold in RATING_THRESHOLDS
+    })
+    return [
+        {
+            'value': threshold,
+            'label': f'от {threshold} ★',
+            'count': counts[f'r{threshold}'],
+            'selected': threshold == filters['rating'],
+        }
+        for threshold in RATING_THRESHOLDS
+    ]
+
+
+def build_facets(filters, nav_categories):
+    return {
+        'categories': _category_facet(filters, nav_categories),
+        'suppliers': _supplier_facet(filters),
+        'prices': _price_facet(filters),
+        'in_stock': _in_stock_facet(filters),
+        'ratings': _rating_facet(filters),
+    }
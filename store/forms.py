@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from .models import User, Supplier, Product, Review
 
 User = get_user_model()
@@ -101,23 +102,25 @@ class UserRegistrationForm(forms.Form):
         user_type = cleaned_data['user_type']
         
         phone = cleaned_data['phone_customer'] if user_type == 'customer' else cleaned_data['phone_supplier']
-        user = User.objects.create_user(
-            email=cleaned_data['email'],
-            username=cleaned_data['username'] if user_type == 'customer' else cleaned_data['company_name'],
-            role=user_type,
-            phone=phone,
-            address=cleaned_data.get('address', '')
-        )
-        user.set_password(cleaned_data['password1'])
-        user.save()
-        
-        if user_type == 'supplier':
-            Supplier.objects.create(
-                company_name=cleaned_data['company_name'],
-                inn=cleaned_data['inn'],
-                phone=cleaned_data['phone_supplier'],
-                email=cleaned_data['email']
+        # Пароль передаётся в create_user: один хеш и один INSERT
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email=cleaned_data['email'],
+                password=cleaned_data['password1'],
+                username=cleaned_data['username'] if user_type == 'customer' else cleaned_data['company_name'],
+                role=user_type,
+                phone=phone,
+                address=cleaned_data.get('address', '')
             )
+
+            if user_type == 'supplier':
+                Supplier.objects.create(
+                    user=user,
+                    company_name=cleaned_data['company_name'],
+                    inn=cleaned_data['inn'],
+                    phone=cleaned_data['phone_supplier'],
+                    email=cleaned_data['email']
+                )
             
         return user
 
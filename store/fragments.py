@@ -0,0 +1,50 @@
+"""Кэш отрендеренных карточек товаров.
+
+Карточка хранится под ключом товара вместе с отметкой версии
+(updated_at товара, категории и поставщика). Сохранение товара удаляет
+запись (см. signals), смена категории/поставщика меняет отметку.
+Все карточки страницы читаются одним get_many.
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = 'store/includes/product_card.html'
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+def card_key(product_id):
+    return f'product_card:{product_id}'
+
+
+def _card_version(product):
+    return (
+        product.updated_at,
+        product.category.updated_at if product.category else None,
+        product.supplier.updated_at if product.supplier else None,
+    )
+
+
+def render_product_cards(products):
+    """Вернуть HTML карточек в порядке products (ожидается select_related)."""
+    products = list(products)
+    cached = cache.get_many([card_key(p.pk) for p in products])
+
+    cards, missing = [], {}
+    for product in products:
+        entry = cached.get(card_key(product.pk))
+        version = _card_version(product)
+        if entry and entry[0] == version:
+            html = entry[1]
+        else:
+            html = render_to_string(CARD_TEMPLATE, {'product': product})
+            missing[card_key(product.pk)] = (version, html)
+        cards.append(mark_safe(html))
+
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+    return cards
+
+
+def invalidate_product_card(product_id):
+    cache.delete(card_key(product_id))
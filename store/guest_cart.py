@@ -0,0 +1,95 @@
+"""Корзина гостя в подписанной cookie.
+
+Добавление и удаление товаров не обращается к БД: корзина —
+{product_id: quantity} в cookie. При входе она одним bulk_create /
+bulk_update переносится в корзину пользователя.
+"""
+from collections import namedtuple
+
+from django.core import signing
+
+from .carts import get_user_cart
+from .models import CartItem, Product
+
+COOKIE_NAME = 'guest_cart'
+COOKIE_SALT = 'store.guest_cart'
+COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+# Cookie ограничена ~4 КБ
+MAX_COOKIE_SIZE = 4096
+MAX_ITEMS = 50
+
+GuestCartItem = namedtuple('GuestCartItem', ['pk', 'product', 'quantity'])
+
+
+def load(request):
+    raw = request.COOKIES.get(COOKIE_NAME)
+    # Слишком длинную cookie не распаковываем: браузер её бы и не сохранил
+    if not raw or len(raw) > MAX_COOKIE_SIZE:
+        return {}
+    try:
+        data = signing.loads(raw, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE)
+        cart = {int(pk): int(quantity) for pk, quantity in data.items() if int(quantity) > 0}
+    except (signing.BadSignature, AttributeError, TypeError, ValueError):
+        return {}
+    return dict(list(cart.items())[:MAX_ITEMS])
+
+
+def save(response, cart):
+    if not cart:
+        clear(response)
+        return response
+    response.set_cookie(
+        COOKIE_NAME,
+        signing.dumps({str(pk): quantity for pk, quantity in cart.items()}, salt=COOKIE_SALT, compress=True),
+        max_age=COOKIE_MAX_AGE,
+        httponly=True,
+        samesite='Lax',
+    )
+    return response
+
+
+def clear(response):
+    response.delete_cookie(COOKIE_NAME, samesite='Lax')
+    return response
+
+
+def add(cart, product_id, quantity=1):
+    if product_id not in cart and len(cart) >= MAX_ITEMS:
+        return False
+    cart[product_id] = cart.get(product_id, 0) + quantity
+    return True
+
+
+def items(cart):
+    """Позиции для шаблона корзины: товары одним запросом."""
+    products = Product.objects.in_bulk(cart.keys())
+    return [
+        GuestCartItem(pk, products[pk], quantity)
+        for pk, quantity in cart.items()
+        if pk in products
+    ]
+
+
+def merge_into_user_cart(request, user):
+    """Перенести корзину гостя в корзину пользователя. Возвращает число позиций."""
+    cart_data = load(request)
+    if not cart_data:
+        return 0
+
+    product_ids = set(Product.objects.filter(pk__in=cart_data).values_list('pk', flat=True))
+    cart = get_user_cart(request, touch=True)
+    existing = {item.product_id: item for item in CartItem.objects.filter(cart=cart, product_id__in=product_ids)}
+
+    to_update, to_create = [], []
+    for product_id in product_ids:
+        quantity = cart_data[product_id]
+        if product_id in existing:
+            item = existing[product_id]
+            item.quantity += quantity
+            to_update.append(item)
+        else:
+            to_create.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+
+    CartItem.objects.bulk_update(to_update, ['quantity'])
+    CartItem.objects.bulk_create(to_create)
+    return len(product_ids)
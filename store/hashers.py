@@ -0,0 +1,30 @@
+"""Хешеры паролей с параметрами из settings.PASSWORD_HASHER_PARAMS.
+
+Имена алгоритмов стандартные, поэтому уже сохранённые хеши читаются
+как прежде; после смены параметров хеш пересчитывается при следующем
+входе (must_update). Параметры подбираются по `manage.py bench_login`.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def _param(algorithm, name):
+    return settings.PASSWORD_HASHER_PARAMS[algorithm][name]
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    work_factor = property(lambda self: _param('scrypt', 'work_factor'))
+    block_size = property(lambda self: _param('scrypt', 'block_size'))
+    parallelism = property(lambda self: _param('scrypt', 'parallelism'))
+
+    @property
+    def maxmem(self):
+        # Память scrypt — 128 * n * r байт; запас вдвое сверх этого
+        return 256 * self.work_factor * self.block_size
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Требует argon2-cffi; без него подходит только для чтения настроек."""
+    time_cost = property(lambda self: _param('argon2', 'time_cost'))
+    memory_cost = property(lambda self: _param('argon2', 'memory_cost'))
+    parallelism = property(lambda self: _param('argon2', 'parallelism'))
@@ -0,0 +1,112 @@
+"""Валидаторы кэша (ETag / Last-Modified) для условных GET.
+
+Состояние таблицы — MAX(updated_at) и число строк: удаление меняет
+счётчик, любое изменение — максимум. Каталог вместо агрегатов по четырём
+таблицам читает одну строку CatalogVersion, которую поднимают сигналы.
+Состояние считается один раз на запрос и используется и для ETag, и для
+Last-Modified. Для дельта-выгрузок состояние считается только по строкам
+до границы EXPORT_DELTA_LAG — тех же, что попадут в ответ.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+from .exports import export_horizon
+from .models import CatalogVersion, Product, ProductNeighbor
+
+
+def table_state(queryset):
+    state = queryset.aggregate(last=Max('updated_at'), n=Count('id'))
+    return state['last'], state['n']
+
+
+def _cached_state(request, key, compute):
+    cache = request.__dict__.setdefault('_http_cache_state', {})
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
+
+def _etag(request, states):
+    # Страница зависит от пользователя (шапка, форма отзыва) и параметров запроса
+    user_id = request.user.pk if request.user.is_authenticated else 0
+    raw = repr((user_id, request.get_full_path(), states))
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _last_modified(states):
+    stamps = [last for last, n in states if last is not None]
+    return max(stamps) if stamps else None
+
+
+def catalog_states(request):
+    return _cached_state(request, 'catalog', lambda: (CatalogVersion.current(),))
+
+
+def product_states(request, pk):
+    def compute():
+        # Отзывы — через денормализованные review_count и updated_at товара:
+        # их поднимают Product.refresh_rating и голоса «полезно»
+        row = (
+            Product.objects.filter(pk=pk)
+            .values_list('review_count', 'updated_at', 'category__updated_at', 'supplier__updated_at')
+            .first()
+        )
+        if row is None:
+            return None
+        review_count, *stamps = row
+        return (
+            (max(t for t in stamps if t is not None), review_count),
+            table_state(ProductNeighbor.objects.filter(product_id=pk)),
+        )
+    return _cached_state(request, ('product', pk), compute)
+
+
+def product_version(request, pk):
+    """Отпечаток состояния товара без учёта пользователя — для ключей кэша."""
+    states = product_states(request, pk)
+    if states is None:
+        return None
+    return hashlib.md5(repr(states).encode('utf-8')).hexdigest()
+
+
+def catalog_etag(request, *args, **kwargs):
+    return _etag(request, catalog_states(request))
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return _last_modified(catalog_states(request))
+
+
+def product_etag(request, pk):
+    states = product_states(request, pk)
+    return _etag(request, states) if states else None
+
+
+def product_last_modified(request, pk):
+    states = product_states(request, pk)
+    return _last_modified(states) if states else None
+
+
+catalog_condition = condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+
+product_condition = condition(etag_func=product_etag, last_modified_func=product_last_modified)
+
+
+def export_condition(*models):
+    """Условный GET для экспорта: состояние перечисленных таблиц."""
+    def compute(request):
+        horizon = export_horizon(request.GET)
+        querysets = [model.objects.all() for model in models]
+        if horizon is not None:
+            querysets = [queryset.filter(updated_at__lte=horizon) for queryset in querysets]
+        return tuple(table_state(queryset) for queryset in querysets)
+
+    def states(request):
+        return _cached_state(request, 'export', lambda: compute(request))
+
+    return condition(
+        etag_func=lambda request, *args, **kwargs: _etag(request, states(request)),
+        last_modified_func=lambda request, *args, **kwargs: _last_modified(states(request)),
+    )
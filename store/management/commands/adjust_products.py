@@ -0,0 +1,86 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.adjustments import (
+    SCOPE_MODELS, AdjustmentError, adjust, pending, preview, product_scope, run, scoped_products,
+)
+from store.models import ProductAdjustment
+
+
+def decimal_arg(value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+
+
+class Command(BaseCommand):
+    help = 'Массово изменить цены (в %) или остатки товаров категории, поставщика или склада'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', nargs='?', choices=[kind for kind, label in ProductAdjustment.KIND_CHOICES])
+        parser.add_argument('value', nargs='?', type=decimal_arg,
+                            help='Процент для цены (-10 — скидка 10%%), число штук для остатка')
+        parser.add_argument('--category', type=int, help='id категории (вместе с подкатегориями)')
+        parser.add_argument('--supplier', type=int, help='id поставщика')
+        parser.add_argument('--warehouse', type=int, help='id склада')
+        parser.add_argument('--all', action='store_true', help='Все товары, без фильтров')
+        parser.add_argument('--chunk-size', type=int, default=settings.BULK_ADJUST_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что изменится')
+        parser.add_argument('--pending', action='store_true',
+                            help='Применить записи журнала без finished_at (отложенные админкой и прерванные)')
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            return self.handle_pending(options)
+        if options['kind'] is None or options['value'] is None:
+            raise CommandError('Укажите вид изменения и значение или --pending.')
+        filters = {}
+        for name, model in SCOPE_MODELS.items():
+            if options[name] is None:
+                continue
+            try:
+                filters[name] = model.objects.get(pk=options[name])
+            except model.DoesNotExist:
+                raise CommandError(f'{model._meta.verbose_name} с id {options[name]} не найден.')
+        if not filters and not options['all']:
+            raise CommandError('Укажите --category, --supplier, --warehouse или --all.')
+        products = product_scope(**filters)
+        kind, value = options['kind'], options['value']
+
+        try:
+            summary = preview(products, kind, value)
+            self.stdout.write(
+                f'Изменится {summary["changed"]} из {summary["matched"]} товаров: '
+                f'{summary["before_min"]}…{summary["before_max"]} → {summary["after_min"]}…{summary["after_max"]}'
+            )
+            if 'before_total' in summary:
+                self.stdout.write(f'Всего на складе: {summary["before_total"]} → {summary["after_total"]}')
+            if options['dry_run'] or not summary['changed']:
+                return
+            record = adjust(
+                products, kind, value,
+                scope={name: obj.pk for name, obj in filters.items()},
+                chunk_size=options['chunk_size'],
+                log=self.stdout.write if options['verbosity'] > 1 else None,
+            )
+        except AdjustmentError as e:
+            raise CommandError(str(e))
+        seconds = (record.finished_at - record.created_at).total_seconds()
+        self.stdout.write(f'Изменено {record.changed} товаров за {seconds:.1f} с (журнал #{record.pk})')
+
+    def handle_pending(self, options):
+        for record in pending():
+            try:
+                record = run(
+                    record, scoped_products(record.scope),
+                    chunk_size=options['chunk_size'],
+                    log=self.stdout.write if options['verbosity'] > 1 else None,
+                )
+            except AdjustmentError as e:
+                self.stderr.write(f'Журнал #{record.pk}: {e}')
+                continue
+            self.stdout.write(f'Журнал #{record.pk}: изменено {record.changed} из {record.matched} товаров')
@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def pg_command(connection, program, parameters):
+    """Аргументы и окружение для утилиты PostgreSQL из настроек подключения."""
+    if connection.vendor != 'postgresql':
+        raise CommandError(f'{program} работает только с PostgreSQL, а не с {connection.vendor}.')
+    args, env = connection.client.settings_to_cmd_args_env(connection.settings_dict, parameters)
+    # psql и pg_dump принимают одинаковые -U/-h/-p и имя базы
+    args[0] = program
+    return args, {**os.environ, **(env or {})}
+
+
+def yadisk_client():
+    if not settings.BACKUP_YADISK['TOKEN']:
+        raise CommandError('Токен Яндекс.Диска не задан (YADISK_TOKEN).')
+    try:
+        import yadisk
+    except ImportError:
+        raise CommandError('Для выгрузки на Яндекс.Диск нужен пакет yadisk.')
+    return yadisk.YaDisk(token=settings.BACKUP_YADISK['TOKEN'])
+
+
+def upload_to_yadisk(path):
+    options = settings.BACKUP_YADISK
+    disk = yadisk_client()
+    if not disk.exists(options['DIR']):
+        disk.mkdir(options['DIR'])
+    with open(path, 'rb') as f:
+        disk.upload(f, f'{options["DIR"]}/{path.name}', overwrite=True)
+
+
+def write_state(path, duration):
+    # Состояние последнего бэкапа для /metrics (store.metrics.BackupCollector)
+    state = {
+        'file': path.name,
+        'duration_seconds': round(duration, 3),
+        'size_bytes': path.stat().st_size,
+        'finished_at': time.time(),
+    }
+    with open(settings.BACKUP_STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+
+class Command(BaseCommand):
+    help = 'Снять дамп базы (pg_dump) и выгрузить его на Яндекс.Диск'
+    # Системные проверки импортируют URLconf, а с ним views и формы —
+    # cron-задаче они не нужны
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--no-upload', action='store_true', help='Только локальный файл')
+        parser.add_argument('--check-upload', action='store_true',
+                            help='Проверить токен Яндекс.Диска и выйти')
+
+    def handle(self, *args, **options):
+        upload = settings.BACKUP_YADISK['TOKEN'] and not options['no_upload']
+        if options['check_upload']:
+            disk = yadisk_client()
+            if not disk.check_token():
+                raise CommandError('Токен Яндекс.Диска недействителен.')
+            self.stdout.write(f'Токен действителен: {disk.get_disk_info().user.login}')
+            return
+
+        connection = connections[options['database']]
+        args, env = pg_command(connection, 'pg_dump', [])
+        backup_dir = settings.BACKUP_DIR
+        backup_dir.mkdir(parents=True, exist_ok=True)
+        path = backup_dir / f'{connection.settings_dict["NAME"]}_backup_{datetime.now():%Y%m%d_%H%M%S}.sql'
+
+        started = time.monotonic()
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                subprocess.run(args, stdout=f, env=env, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            path.unlink(missing_ok=True)
+            raise CommandError(f'pg_dump завершился с ошибкой: {e}')
+        if upload:
+            upload_to_yadisk(path)
+        write_state(path, time.monotonic() - started)
+
+        where = 'создан и выгружен' if upload else 'создан'
+        self.stdout.write(f'Бэкап {where}: {path}')
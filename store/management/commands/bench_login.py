@@ -0,0 +1,73 @@
+import time
+from multiprocessing import Pool
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import get_hasher, get_hashers
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+PASSWORD = 'bench-Passw0rd!'
+
+
+def verify_rate(algorithm, encoded, seconds):
+    """Проверок пароля в секунду на одном ядре."""
+    hasher = get_hasher(algorithm)
+    done, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        hasher.verify(PASSWORD, encoded)
+        done += 1
+    return done / (time.perf_counter() - started)
+
+
+class Command(BaseCommand):
+    help = 'Замерить стоимость хеша и число входов в секунду на ядро для хешеров PASSWORD_HASHERS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('algorithms', nargs='*', help='Алгоритмы (scrypt, argon2, pbkdf2_sha256...). По умолчанию — все')
+        parser.add_argument('--seconds', type=float, default=2.0, help='Длительность замера на алгоритм')
+        parser.add_argument('--processes', type=int, default=1, help='Параллельных процессов (ядер)')
+
+    def handle(self, *args, **options):
+        hashers = {h.algorithm: h for h in get_hashers()}
+        algorithms = options['algorithms'] or list(hashers)
+        unknown = set(algorithms) - set(hashers)
+        if unknown:
+            raise CommandError(f'Нет в PASSWORD_HASHERS: {", ".join(sorted(unknown))}')
+        processes = options['processes']
+
+        for algorithm in algorithms:
+            hasher = hashers[algorithm]
+            try:
+                started = time.perf_counter()
+                encoded = hasher.encode(PASSWORD, hasher.salt())
+            except ValueError as e:
+                self.stdout.write(self.style.WARNING(f'{algorithm}: пропущен ({e})'))
+                continue
+            hash_ms = (time.perf_counter() - started) * 1000
+            with Pool(processes) as pool:
+                rates = pool.starmap(verify_rate, [(algorithm, encoded, options['seconds'])] * processes)
+            self.stdout.write(
+                f'{algorithm:<16} хеш {hash_ms:7.1f} мс  '
+                f'{sum(rates) / processes:8.1f} входов/с на ядро  '
+                f'{sum(rates):8.1f} входов/с на {processes} ядр.'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Полный вход (authenticate, {get_hasher().algorithm}): {self.authenticate_rate(options["seconds"]):.1f} входов/с'
+        ))
+
+    def authenticate_rate(self, seconds):
+        """authenticate() c поиском пользователя в БД; пользователь откатывается."""
+        User = get_user_model()
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username='bench-login', email='bench-login@example.invalid', password=PASSWORD
+            )
+            done, started = 0, time.perf_counter()
+            while time.perf_counter() - started < seconds:
+                if authenticate(username=user.email, password=PASSWORD) is None:
+                    raise CommandError('authenticate() не принял тестового пользователя.')
+                done += 1
+            rate = done / (time.perf_counter() - started)
+            transaction.set_rollback(True)
+        return rate
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from store.backends import forget_user
+from store.carts import forget_cart_ids
+from store.models import Cart, CartItem, Product, User
+
+# Прежняя конфигурация: сессия и пользователь из БД на каждом запросе
+BASELINE = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Число SQL-запросов на просмотр страниц авторизованным пользователем: прежняя и текущая конфигурация'
+
+    def handle(self, *args, **options):
+        product = Product.objects.order_by('pk').first()
+        if product is None:
+            raise CommandError('Нужен хотя бы один товар.')
+        pages = [
+            ('Каталог', reverse('product_list')),
+            ('Товар', reverse('product_detail', args=[product.pk])),
+            ('Корзина', reverse('cart')),
+            ('Оформление', reverse('checkout')),
+            ('Мои заказы', reverse('order_list')),
+        ]
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+
+        # Тестовый пользователь и корзина откатываются в конце
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=hosts):
+            user = User.objects.create_user(
+                username='bench-pages', email='bench-pages@example.invalid', phone='-'
+            )
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+
+            results = {}
+            for mode, overrides in (('прежняя', BASELINE), ('текущая', {})):
+                forget_user(user.pk)
+                forget_cart_ids([user.pk])
+                with override_settings(**overrides):
+                    client = Client()
+                    client.force_login(user)
+                    results[mode] = [self.count(client, url) for name, url in pages]
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"Страница":<12} {"прежняя":>16} {"текущая":>16}   (первый / повторный)')
+        for i, (name, url) in enumerate(pages):
+            before, after = results['прежняя'][i], results['текущая'][i]
+            self.stdout.write(f'{name:<12} {before[0]:>7} / {before[1]:<6} {after[0]:>7} / {after[1]:<6}')
+        total_before = sum(warm for cold, warm in results['прежняя'])
+        total_after = sum(warm for cold, warm in results['текущая'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Повторные просмотры: {total_before} → {total_after} запросов на {len(pages)} страниц'
+        ))
+
+    def count(self, client, url):
+        """(запросов при первом просмотре, при повторном)."""
+        counts = []
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+            counts.append(len(queries))
+        return tuple(counts)
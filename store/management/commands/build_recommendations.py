@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.recommendations import refresh
+
+
+class Command(BaseCommand):
+    help = 'Обновить «С этим товаром покупают» по новым заказам (нужны numpy и scipy)'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Пересчитать по всем заказам заново')
+
+    def handle(self, *args, **options):
+        try:
+            orders, products = refresh(
+                full=options['full'],
+                log=self.stdout.write if options['verbosity'] > 1 else None,
+            )
+        except ImportError as e:
+            raise CommandError(f'Для расчёта рекомендаций нужны numpy и scipy: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Учтено заказов: {orders}, обновлены рекомендации для {products} товаров'
+        ))
@@ -0,0 +1,76 @@
+import csv
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from store.exports import (
+    COLUMNAR_FORMATS, ORDER_COLUMNS, PRODUCT_COLUMNS, SUPPLIER_COLUMNS,
+    Delta, DeltaError, column_rows, encode_cursor, write_columnar,
+)
+from store.models import Order, Product, Supplier
+
+EXPORTS = {
+    'products': (Product, PRODUCT_COLUMNS),
+    'orders': (Order, ORDER_COLUMNS),
+    'suppliers': (Supplier, SUPPLIER_COLUMNS),
+}
+
+FORMATS = ['csv', 'json', *COLUMNAR_FORMATS]
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить товары, заказы или поставщиков в файл (те же колонки и дельты, что у /export/)'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=EXPORTS)
+        parser.add_argument('output', help='Путь к файлу')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='По умолчанию — по расширению файла, иначе csv')
+        parser.add_argument('--since', help='Только изменённые после этого времени (ISO 8601)')
+        parser.add_argument('--cursor', help='Курсор предыдущей выгрузки')
+        parser.add_argument('--limit', type=int)
+
+    def handle(self, *args, **options):
+        model, columns = EXPORTS[options['table']]
+        params = {key: options[key] for key in ('since', 'cursor') if options[key]}
+        if options['limit']:
+            params['limit'] = str(options['limit'])
+        try:
+            delta = Delta(params)
+        except DeltaError as e:
+            raise CommandError(str(e))
+
+        queryset = model.objects.all()
+        fmt = options['format'] or Path(options['output']).suffix.lstrip('.')
+        if fmt not in FORMATS:
+            fmt = 'csv'
+        if fmt in COLUMNAR_FORMATS:
+            try:
+                with open(options['output'], 'wb') as sink:
+                    write_columnar(queryset, columns, delta, fmt, sink)
+            except ImportError:
+                raise CommandError('Для этого формата нужен пакет pyarrow.')
+        else:
+            names = [name.replace('__', '_') for name, kind in columns]
+            rows = column_rows(queryset, columns, delta)
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                if fmt == 'csv':
+                    writer = csv.writer(f)
+                    writer.writerow(names)
+                    writer.writerows(rows)
+                else:
+                    # Построчно, чтобы не собирать всю выгрузку в памяти
+                    f.write('[')
+                    for i, row in enumerate(rows):
+                        f.write(',\n' if i else '\n')
+                        json.dump(dict(zip(names, row)), f, ensure_ascii=False, cls=DjangoJSONEncoder)
+                    f.write('\n]\n')
+
+        self.stdout.write(f'{options["table"]}: {delta.count} строк в {options["output"]}')
+        if delta.last is not None:
+            self.stdout.write(f'Курсор следующей выгрузки: {encode_cursor(*delta.last)}')
+        if delta.has_more:
+            self.stdout.write('Есть ещё строки — продолжите с этим курсором.')
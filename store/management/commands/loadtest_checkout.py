@@ -0,0 +1,216 @@
+"""Нагрузочный тест оформления заказа.
+
+N процессов-покупателей через тестовый клиент (без сети) крутят цикл
+add_to_cart → update_cart_item → checkout до конца отведённого времени.
+Главный процесс тем временем снимает pg_stat_activity и pg_locks.
+Покупатели и товары создаются с префиксом loadtest и удаляются --cleanup.
+"""
+import logging
+import random
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from store.models import CartItem, Order, Product, User
+
+PREFIX = 'loadtest'
+OPERATIONS = ('add_to_cart', 'update_cart_item', 'checkout')
+# SQLSTATE, которые считаем отдельно
+PG_ERRORS = {'40P01': 'deadlock', '40001': 'serialization', '55P03': 'lock_timeout'}
+
+
+def classify(exc):
+    code = getattr(getattr(exc, '__cause__', None), 'pgcode', None)
+    if code in PG_ERRORS:
+        return PG_ERRORS[code]
+    if isinstance(exc, OperationalError) and 'locked' in str(exc):
+        return 'locked'
+    return type(exc).__name__
+
+
+def shopper(user_id, product_ids, duration, seed):
+    """Один покупатель; вернуть ({операция: [мс]}, Counter ошибок, заказов)."""
+    # Ошибки считаются здесь, трассировки django.request не нужны
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    rng = random.Random(seed)
+    latencies = {op: [] for op in OPERATIONS}
+    errors = Counter()
+    orders = 0
+    hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+    with override_settings(RATE_LIMITS={}, ALLOWED_HOSTS=hosts):
+        client = Client(raise_request_exception=True)
+        client.force_login(User.objects.get(pk=user_id))
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            product_id = rng.choice(product_ids)
+            steps = [
+                ('add_to_cart', lambda: client.get(reverse('add_to_cart', args=[product_id]))),
+                ('update_cart_item', lambda: client.post(
+                    reverse('update_cart_item', args=[item_id()]), {'quantity': rng.randint(1, 3)}
+                )),
+                ('checkout', lambda: client.post(reverse('checkout'))),
+            ]
+
+            def item_id():
+                return CartItem.objects.filter(
+                    cart__user_id=user_id, product_id=product_id
+                ).values_list('pk', flat=True).first() or 0
+
+            for op, request in steps:
+                started = time.perf_counter()
+                try:
+                    response = request()
+                except Exception as exc:
+                    errors[f'{op}: {classify(exc)}'] += 1
+                    break
+                latencies[op].append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    errors[f'{op}: HTTP {response.status_code}'] += 1
+                    break
+                if op == 'checkout':
+                    orders += 1
+    connection.close()
+    return latencies, errors, orders
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def pg_snapshot():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FILTER (WHERE state = 'active'),"
+            " count(*) FILTER (WHERE wait_event_type = 'Lock')"
+            " FROM pg_stat_activity WHERE datname = current_database()"
+        )
+        active, lock_waits = cursor.fetchone()
+        cursor.execute(
+            "SELECT l.mode, count(*) FROM pg_locks l"
+            " WHERE NOT l.granted GROUP BY l.mode"
+        )
+        waiting = dict(cursor.fetchall())
+    return active, lock_waits, waiting
+
+
+def pg_deadlocks():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()')
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест оформления заказа: N параллельных покупателей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shoppers', type=int, default=8, help='Параллельных покупателей (процессов)')
+        parser.add_argument('--duration', type=float, default=30, help='Длительность, секунд')
+        parser.add_argument('--products', type=int, default=20,
+                            help='Товаров в выборке; меньше — больше конкуренции за строки')
+        parser.add_argument('--sample-interval', type=float, default=0.5,
+                            help='Период снимков pg_stat_activity/pg_locks, секунд')
+        parser.add_argument('--cleanup', action='store_true', help='Удалить данные loadtest и выйти')
+        parser.add_argument('--force', action='store_true',
+                            help='Запускать и на БД, где уже есть настоящие заказы')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            users, _ = User.objects.filter(username__startswith=f'{PREFIX}-').delete()
+            products, _ = Product.objects.filter(name__startswith=f'{PREFIX} ').delete()
+            self.stdout.write(self.style.SUCCESS(f'Удалено: {users} строк покупателей, {products} строк товаров'))
+            return
+
+        # Тест пишет заказы и платежи — на рабочую БД не пускаем
+        if not options['force'] and Order.objects.exclude(user__username__startswith=f'{PREFIX}-').exists():
+            raise CommandError('В БД есть заказы не от покупателей loadtest. Запустите на отдельной БД или с --force.')
+
+        user_ids, product_ids = self.seed(options['shoppers'], options['products'])
+        postgres = connection.vendor == 'postgresql'
+        if not postgres:
+            self.stdout.write(self.style.WARNING(
+                f'БД {connection.vendor}: снимки pg_locks недоступны, считаются только ошибки.'
+            ))
+        deadlocks_before = pg_deadlocks() if postgres else 0
+
+        # Дочерние процессы открывают свои соединения
+        connections.close_all()
+        samples = []
+        started = time.monotonic()
+        with Pool(options['shoppers']) as pool:
+            pending = pool.starmap_async(shopper, [
+                (user_id, product_ids, options['duration'], i) for i, user_id in enumerate(user_ids)
+            ])
+            while not pending.ready():
+                if postgres:
+                    samples.append(pg_snapshot())
+                pending.wait(options['sample_interval'])
+            results = pending.get()
+        elapsed = time.monotonic() - started
+
+        self.report(results, elapsed, samples, (pg_deadlocks() - deadlocks_before) if postgres else None)
+
+    def seed(self, shoppers, products):
+        users = []
+        for i in range(shoppers):
+            user, created = User.objects.get_or_create(
+                username=f'{PREFIX}-{i}',
+                defaults={'email': f'{PREFIX}-{i}@example.invalid', 'phone': '-'},
+            )
+            users.append(user.pk)
+        existing = list(
+            Product.objects.filter(name__startswith=f'{PREFIX} ').order_by('pk').values_list('pk', flat=True)
+        )
+        for i in range(len(existing), products):
+            existing.append(Product.objects.create(
+                name=f'{PREFIX} {i}', price=random.randint(100, 5000), quantity=1_000_000
+            ).pk)
+        return users, existing[:products]
+
+    def report(self, results, elapsed, samples, deadlocks):
+        latencies = {op: [] for op in OPERATIONS}
+        errors = Counter()
+        orders = 0
+        for shopper_latencies, shopper_errors, shopper_orders in results:
+            for op, values in shopper_latencies.items():
+                latencies[op].extend(values)
+            errors.update(shopper_errors)
+            orders += shopper_orders
+
+        requests = sum(len(v) for v in latencies.values())
+        self.stdout.write(f'Покупателей: {len(results)}, время: {elapsed:.1f} с')
+        self.stdout.write(self.style.SUCCESS(
+            f'Заказов: {orders} ({orders / elapsed:.1f}/с), запросов: {requests} ({requests / elapsed:.1f}/с)'
+        ))
+        for op in OPERATIONS:
+            values = latencies[op]
+            self.stdout.write(
+                f'  {op:<18} n={len(values):<6} p50={percentile(values, 50):7.1f} мс  '
+                f'p99={percentile(values, 99):7.1f} мс  max={max(values, default=0):7.1f} мс'
+            )
+        if samples:
+            lock_waits = [s[1] for s in samples]
+            modes = Counter()
+            for s in samples:
+                modes.update(s[2])
+            self.stdout.write(
+                f'Ожидания блокировок: макс {max(lock_waits)}, в среднем {sum(lock_waits) / len(samples):.1f} '
+                f'сеансов из {max(s[0] for s in samples)} активных ({len(samples)} снимков)'
+            )
+            if modes:
+                self.stdout.write('  неполученные блокировки: ' + ', '.join(f'{m}: {n}' for m, n in modes.most_common()))
+        if deadlocks is not None:
+            self.stdout.write(f'Взаимных блокировок (pg_stat_database): {deadlocks}')
+        if errors:
+            self.stdout.write(self.style.WARNING('Ошибки:'))
+            for kind, n in errors.most_common():
+                self.stdout.write(f'  {kind}: {n}')
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.purge import POLICIES, configured_policies, run_policy
+
+
+class Command(BaseCommand):
+    help = 'Удалить устаревшие данные по политикам хранения (settings.PURGE_POLICIES)'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('policies', nargs='*',
+                            help=f'Политики: {", ".join(POLICIES)}. По умолчанию — все включённые')
+        parser.add_argument('--days', type=int, help='Переопределить срок хранения')
+        parser.add_argument('--batch-size', type=int, default=settings.PURGE_BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=settings.PURGE_SLEEP,
+                            help='Пауза между пачками, секунд')
+        parser.add_argument('--max-batch-seconds', type=float, default=settings.PURGE_MAX_BATCH_SECONDS,
+                            help='Пачка дольше этого — уменьшить размер и увеличить паузу')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать строки')
+
+    def handle(self, *args, **options):
+        selected = configured_policies()
+        if options['policies']:
+            unknown = set(options['policies']) - set(POLICIES)
+            if unknown:
+                raise CommandError(f'Неизвестные политики: {", ".join(sorted(unknown))}')
+            days_by_name = {p.name: days for p, days in selected}
+            selected = [(POLICIES[name], days_by_name.get(name)) for name in options['policies']]
+        if options['days'] is not None:
+            selected = [(p, options['days']) for p, days in selected]
+
+        for retention, days in selected:
+            if days is None:
+                raise CommandError(f'Для политики {retention.name} не задан срок (--days).')
+            result = run_policy(
+                retention,
+                days,
+                batch_size=options['batch_size'],
+                sleep=options['sleep'],
+                max_batch_seconds=options['max_batch_seconds'],
+                dry_run=options['dry_run'],
+                log=self.stdout.write if options['verbosity'] > 1 else None,
+            )
+            if options['dry_run']:
+                self.stdout.write(f'{retention.name}: будет удалено {result.deleted} (старше {days} дн.)')
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{retention.name}: удалено {result.deleted} за {result.seconds:.1f} с '
+                    f'({result.rate:.0f} строк/с, пачек: {result.batches})'
+                ))
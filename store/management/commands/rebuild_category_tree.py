@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать пути и счётчики товаров в дереве категорий'
+
+    def handle(self, *args, **options):
+        Category.rebuild_tree()
+        self.stdout.write(self.style.SUCCESS(
+            f'Дерево категорий пересчитано: {Category.objects.count()} категорий'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from store.models import SupplierStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать сводки кабинета поставщика (товары, остатки, продажи)'
+
+    def handle(self, *args, **options):
+        SupplierStats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Сводки пересчитаны: {SupplierStats.objects.count()} поставщиков'
+        ))
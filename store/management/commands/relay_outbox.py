@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.outbox import get_sinks, relay
+
+
+class Command(BaseCommand):
+    help = 'Раздавать события outbox приёмникам из settings.OUTBOX'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX['BATCH_SIZE'])
+        parser.add_argument('--poll-interval', type=float, default=settings.OUTBOX['POLL_INTERVAL'],
+                            help='Пауза, когда новых событий нет, секунд')
+        parser.add_argument('--once', action='store_true', help='Отдать накопленное и выйти')
+
+    def handle(self, *args, **options):
+        sinks = get_sinks()
+        relay(
+            sinks,
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
@@ -0,0 +1,40 @@
+import subprocess
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .backup_db import pg_command
+
+
+class Command(BaseCommand):
+    help = 'Загрузить в базу дамп, снятый backup_db (psql -f)'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('dump', help='Файл .sql из каталога бэкапов')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Не спрашивать подтверждение')
+
+    def handle(self, *args, **options):
+        dump = Path(options['dump'])
+        if not dump.is_file():
+            raise CommandError(f'Файл {dump} не найден.')
+        connection = connections[options['database']]
+        # ON_ERROR_STOP: без него psql продолжает после ошибки и база остаётся наполовину загруженной
+        args, env = pg_command(connection, 'psql', ['-v', 'ON_ERROR_STOP=1', '-q', '-f', str(dump)])
+
+        if options['interactive']:
+            answer = input(
+                f'Дамп {dump.name} будет загружен в базу {connection.settings_dict["NAME"]}. '
+                'Продолжить? [yes/no]: '
+            )
+            if answer != 'yes':
+                self.stdout.write('Отменено.')
+                return
+        try:
+            subprocess.run(args, env=env, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise CommandError(f'psql завершился с ошибкой: {e}')
+        self.stdout.write(f'Дамп {dump.name} загружен.')
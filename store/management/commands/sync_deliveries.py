@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.carriers import StatusError, apply_status_updates, get_carrier, in_flight
+
+
+class Command(BaseCommand):
+    help = 'Опросить перевозчиков о статусах незавершённых доставок и применить их пачками'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('carriers', nargs='*', help='Коды из settings.CARRIERS. По умолчанию — все')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Посылок в одном запросе к перевозчику')
+
+    def handle(self, *args, **options):
+        codes = options['carriers'] or list(settings.CARRIERS)
+        unknown = set(codes) - set(settings.CARRIERS)
+        if unknown:
+            raise CommandError(f'Неизвестные перевозчики: {", ".join(sorted(unknown))}')
+
+        for code in codes:
+            carrier = get_carrier(code)
+            started = time.monotonic()
+            polled = changed = skipped = 0
+            for parcels in in_flight(code, options['batch_size']):
+                polled += len(parcels)
+                try:
+                    batch_changed, batch_skipped = apply_status_updates(carrier.fetch_statuses(parcels))
+                except StatusError as e:
+                    raise CommandError(f'{code}: {e}')
+                changed += batch_changed
+                skipped += batch_skipped
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{code}: опрошено {polled}, изменено {changed}')
+            seconds = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'{code}: опрошено {polled} посылок, изменено {changed}, '
+                f'пропущено шагов назад {skipped} за {seconds:.1f} с'
+            ))
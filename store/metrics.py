@@ -0,0 +1,138 @@
+"""Метрики в формате Prometheus (/metrics).
+
+Используется prometheus_client (requirements.txt); без него метрики
+становятся пустыми заглушками, а /metrics отвечает 501. Для нескольких
+воркеров нужна переменная окружения PROMETHEUS_MULTIPROC_DIR до запуска:
+тогда каждый процесс пишет свои значения в файлы, а /metrics собирает их.
+gunicorn.conf.py задаёт её, очищает каталог при старте и убирает файлы
+завершившихся воркеров.
+"""
+import json
+import os
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+
+try:
+    import prometheus_client
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:
+    prometheus_client = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class _Noop:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _metric(cls_name, name, documentation, labelnames=(), **kwargs):
+    if prometheus_client is None:
+        return _Noop()
+    return getattr(prometheus_client, cls_name)(name, documentation, labelnames, **kwargs)
+
+
+REQUEST_LATENCY = _metric(
+    'Histogram', 'marketplace_request_duration_seconds', 'Время обработки запроса',
+    ['view', 'method'], buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = _metric(
+    'Histogram', 'marketplace_request_db_queries', 'Число SQL-запросов на HTTP-запрос',
+    ['view'], buckets=QUERY_BUCKETS,
+)
+CHECKOUTS = _metric(
+    'Counter', 'marketplace_checkouts', 'Оформления заказа по результату', ['result'],
+)
+STOCK_OUTS = _metric(
+    'Counter', 'marketplace_stock_outs', 'Товар закончился на складе (остаток стал 0)',
+)
+EXPORT_ROWS = _metric(
+    'Counter', 'marketplace_export_rows', 'Выгружено строк', ['export'],
+)
+EXPORT_BYTES = _metric(
+    'Counter', 'marketplace_export_bytes', 'Выгружено байт (до сжатия)', ['export'],
+)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        REQUEST_LATENCY.labels(view, request.method).observe(duration)
+        REQUEST_QUERIES.labels(view).observe(queries)
+        return response
+
+
+def record_export(request, response, rows):
+    match = getattr(request, 'resolver_match', None)
+    export = match.url_name if match else 'unknown'
+    if response.streaming:
+        size = int(response.get('Content-Length') or 0)
+    else:
+        size = len(response.content)
+    EXPORT_ROWS.labels(export).inc(rows)
+    EXPORT_BYTES.labels(export).inc(size)
+
+
+if prometheus_client is not None:
+    class BackupCollector:
+        """Последний бэкап из файла состояния, который пишет manage.py backup_db."""
+
+        def collect(self):
+            try:
+                with open(settings.BACKUP_STATE_FILE, encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                return
+            for key, name, documentation in (
+                ('duration_seconds', 'marketplace_backup_duration_seconds', 'Длительность последнего бэкапа'),
+                ('size_bytes', 'marketplace_backup_size_bytes', 'Размер последнего бэкапа'),
+                ('finished_at', 'marketplace_backup_last_success_timestamp_seconds', 'Время завершения последнего бэкапа'),
+            ):
+                if key in state:
+                    yield GaugeMetricFamily(name, documentation, value=state[key])
+
+    _backup_registry = prometheus_client.CollectorRegistry()
+    _backup_registry.register(BackupCollector())
+
+
+def metrics_view(request):
+    if prometheus_client is None:
+        return HttpResponse('Для /metrics нужен пакет prometheus_client.', status=501)
+    allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    if not allowed and not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    output = prometheus_client.generate_latest(registry) + prometheus_client.generate_latest(_backup_registry)
+    return HttpResponse(output, content_type=prometheus_client.CONTENT_TYPE_LATEST)
@@ -0,0 +1,59 @@
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+# Уже сжатые форматы (Parquet/Arrow пишутся с zstd) повторно не жмём
+ALREADY_COMPRESSED_TYPES = (
+    'application/vnd.apache.parquet',
+    'application/vnd.apache.arrow',
+    'image/',
+    'application/zip',
+    'application/gzip',
+)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Brotli для выгрузок и JSON, gzip для остального.
+
+    HTML всегда идёт через gzip: у GZipMiddleware Django есть защита от
+    BREACH (случайное имя файла в заголовке), а страницы содержат CSRF-токен.
+    Ответы меньше COMPRESSION_MIN_SIZE байт не сжимаются.
+    """
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '')
+        if content_type.startswith(ALREADY_COMPRESSED_TYPES):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        if (
+            brotli is not None
+            and not response.streaming
+            and not content_type.startswith('text/html')
+            and not response.has_header('Content-Encoding')
+            and re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        ):
+            return self._brotli(response)
+        return super().process_response(request, response)
+
+    def _brotli(self, response):
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(response.content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_tree(apps, schema_editor):
+    # До этой миграции все категории были корневыми
+    Category = apps.get_model('store', 'Category')
+    Product = apps.get_model('store', 'Product')
+    counts = dict(
+        Product.objects.filter(category__isnull=False)
+        .values_list('category_id')
+        .annotate(n=Count('id'))
+    )
+    categories = list(Category.objects.only('id'))
+    for category in categories:
+        category.path = f'{category.pk:010d}/'
+        category.depth = 0
+        category.product_count = counts.get(category.pk, 0)
+    Category.objects.bulk_update(categories, ['path', 'depth', 'product_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_alter_supplier_options_alter_supplier_company_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='category',
+            options={'ordering': ['path']},
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='store.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_tree, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:22
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def fill_ratings(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    stats = (
+        Review.objects.values_list('product_id')
+        .annotate(avg=Avg('rating'), n=Count('id'))
+        .order_by()
+    )
+    for product_id, avg, n in stats:
+        Product.objects.filter(pk=product_id).update(
+            rating=Decimal(str(avg)).quantize(Decimal('0.01')), review_count=n
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_category_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=models.DecimalField(db_index=True, decimal_places=2, max_digits=10),
+        ),
+        migrations.RunPython(fill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:35
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """Слить дубли корзин в самую раннюю: позиции, заказы — в неё, дубли удалить."""
+    Cart = apps.get_model('store', 'Cart')
+    CartItem = apps.get_model('store', 'CartItem')
+    Order = apps.get_model('store', 'Order')
+    duplicated = (
+        Cart.objects.values('user_id').annotate(n=Count('id')).filter(n__gt=1)
+        .values_list('user_id', flat=True)
+    )
+    for user_id in duplicated:
+        cart_ids = list(Cart.objects.filter(user_id=user_id).order_by('id').values_list('id', flat=True))
+        keep, extra = cart_ids[0], cart_ids[1:]
+        kept_items = {item.product_id: item for item in CartItem.objects.filter(cart_id=keep)}
+        for item in CartItem.objects.filter(cart_id__in=extra):
+            if item.product_id in kept_items:
+                kept_items[item.product_id].quantity += item.quantity
+                kept_items[item.product_id].save(update_fields=['quantity'])
+            else:
+                item.cart_id = keep
+                item.save(update_fields=['cart'])
+                kept_items[item.product_id] = item
+        Order.objects.filter(cart_id__in=extra).update(cart_id=keep)
+        Cart.objects.filter(id__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_cart_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='unique_user_cart'),
+        ),
+    ]
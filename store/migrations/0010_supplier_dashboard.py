@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+def link_and_fill(apps, schema_editor):
+    """Привязать поставщиков к учётным записям по email и посчитать сводки."""
+    Supplier = apps.get_model('store', 'Supplier')
+    SupplierStats = apps.get_model('store', 'SupplierStats')
+    Product = apps.get_model('store', 'Product')
+    Order = apps.get_model('store', 'Order')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    users = dict(
+        User.objects.filter(role='supplier').exclude(email='').values_list('email', 'pk')
+    )
+    for supplier in Supplier.objects.exclude(email=''):
+        if supplier.email in users:
+            supplier.user_id = users.pop(supplier.email)
+            supplier.save(update_fields=['user'])
+
+    threshold = settings.LOW_STOCK_THRESHOLD
+    products = {
+        row[0]: row[1:] for row in
+        Product.objects.filter(supplier__isnull=False).values_list('supplier_id')
+        .annotate(n=Count('id'), stock=Sum('quantity'), low=Count('id', filter=Q(quantity__lte=threshold)))
+        .order_by()
+    }
+    sales = {
+        row[0]: row[1:] for row in
+        Order.objects.filter(cart__items__product__supplier__isnull=False)
+        .values_list('cart__items__product__supplier_id')
+        .annotate(
+            units=Sum('cart__items__quantity'),
+            revenue=Sum(F('cart__items__quantity') * F('cart__items__product__price')),
+        )
+        .order_by()
+    }
+    SupplierStats.objects.bulk_create([
+        SupplierStats(
+            supplier_id=pk,
+            product_count=products.get(pk, (0, 0, 0))[0],
+            total_stock=products.get(pk, (0, 0, 0))[1] or 0,
+            low_stock_count=products.get(pk, (0, 0, 0))[2],
+            units_sold=sales.get(pk, (0, 0))[0] or 0,
+            revenue=sales.get(pk, (0, 0))[1] or 0,
+        )
+        for pk in Supplier.objects.values_list('pk', flat=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_cart_unique_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierStats',
+            fields=[
+                ('supplier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='store.supplier')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('total_stock', models.PositiveBigIntegerField(default=0)),
+                ('low_stock_count', models.PositiveIntegerField(default=0)),
+                ('units_sold', models.PositiveBigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='supplier_profile', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['supplier', 'id'], name='product_supplier_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['supplier', 'quantity'], name='product_supplier_qty_idx'),
+        ),
+        migrations.RunPython(link_and_fill, migrations.RunPython.noop),
+    ]
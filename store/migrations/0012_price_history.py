@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_history(apps, schema_editor):
+    """Текущая цена каждого товара — первая строка истории (с updated_at)."""
+    Product = apps.get_model('store', 'Product')
+    PriceHistory = apps.get_model('store', 'PriceHistory')
+    rows = Product.objects.values_list('pk', 'price', 'updated_at').iterator(chunk_size=2000)
+    batch = []
+    for pk, price, updated_at in rows:
+        batch.append(PriceHistory(product_id=pk, price=price, valid_from=updated_at))
+        if len(batch) >= 2000:
+            PriceHistory.objects.bulk_create(batch)
+            batch = []
+    PriceHistory.objects.bulk_create(batch)
+
+
+BRIN_INDEX = 'price_valid_from_brin'
+
+
+def create_brin(apps, schema_editor):
+    # Строки добавляются по времени, BRIN на valid_from почти ничего не весит
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX {BRIN_INDEX} ON store_pricehistory USING brin (valid_from)'
+        )
+
+
+def drop_brin(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {BRIN_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valid_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'valid_from'], include=('price',), name='price_product_from_idx')],
+            },
+        ),
+        migrations.RunPython(create_brin, drop_brin),
+        migrations.RunPython(fill_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_product_neighbors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('carrier', models.CharField(max_length=20)),
+                ('start', models.BigIntegerField()),
+                ('end', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='carrier',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='status_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='delivery',
+            name='tracking_number',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(condition=models.Q(('delivery_status', 'получен'), _negated=True), fields=['carrier', 'id'], name='delivery_in_flight_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='trackingblock',
+            constraint=models.UniqueConstraint(fields=('carrier', 'start'), name='unique_tracking_block'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_carriers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAdjustment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('price_percent', 'Цена, %'), ('stock_add', 'Остаток, прибавить'), ('stock_set', 'Остаток, установить')], max_length=20)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('scope', models.JSONField(blank=True, default=dict)),
+                ('matched', models.PositiveIntegerField(default=0)),
+                ('changed', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
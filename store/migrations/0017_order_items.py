@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_items(apps, schema_editor):
+    """Позиции старых заказов — из их корзин по цене на момент заказа.
+
+    Приближение: до этой миграции состав заказа не сохранялся, и страница
+    заказа показывала текущее содержимое корзины.
+    """
+    CartItem = apps.get_model('store', 'CartItem')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    PriceHistory = apps.get_model('store', 'PriceHistory')
+    Order = apps.get_model('store', 'Order')
+    orders = Order.objects.filter(cart__isnull=False).values_list('pk', 'cart_id', 'created_at')
+    batch = []
+    for order_id, cart_id, created_at in orders.iterator(chunk_size=2000):
+        price_then = Subquery(
+            PriceHistory.objects.filter(product=OuterRef('product_id'), valid_from__lte=created_at)
+            .order_by('-valid_from').values('price')[:1]
+        )
+        items = (
+            CartItem.objects.filter(cart_id=cart_id)
+            .annotate(price_then=Coalesce(price_then, 'product__price'))
+            .values_list('product_id', 'product__name', 'price_then', 'quantity')
+        )
+        for product_id, name, price, quantity in items:
+            batch.append(OrderItem(
+                order_id=order_id, product_id=product_id, name=name, price=price, quantity=quantity,
+            ))
+        if len(batch) >= 2000:
+            OrderItem.objects.bulk_create(batch)
+            batch = []
+    OrderItem.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_catalog_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantity', models.PositiveIntegerField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='store.order')),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='store.product')),
+            ],
+        ),
+        migrations.RunPython(fill_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_order_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingCounter',
+            fields=[
+                ('carrier', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('next_number', models.BigIntegerField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_tracking_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productadjustment',
+            name='last_id',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -1,4 +1,11 @@
-from django.db import models
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import DEFERRED, Count, F, Q, Sum, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone 
 
@@ -33,20 +40,172 @@ class User(AbstractUser):
     def is_customer(self):
         return self.role == 'customer'
 
+class OutboxMixin:
+    """Сохранение строки вместе с её событием outbox (пишут signals) в одной транзакции."""
+    outbox_topic = None
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def outbox_payload(self):
+        raise NotImplementedError
+
 class Category(models.Model):
+    # Ширина одного сегмента materialized path: id с ведущими нулями + '/'
+    PATH_STEP = 10
+    # Меняются только UPDATE-ами дерева и сигналов товаров; save() их не пишет,
+    # чтобы устаревший экземпляр не затёр свежие значения
+    TREE_FIELDS = ('path', 'depth', 'product_count')
+
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    parent = models.ForeignKey(
+        'self', on_delete=models.PROTECT, null=True, blank=True, related_name='children'
+    )
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Количество товаров во всём поддереве (категория + потомки)
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        ordering = ['path']
 
     def __str__(self):
         return self.name
 
+    @property
+    def tree_label(self):
+        return f"{'— ' * self.depth}{self.name}"
+
+    def get_ancestor_ids(self):
+        """id всех предков (от корня), без самой категории."""
+        return [int(part) for part in self.path.split('/')[:-2]]
+
+    def get_descendants(self, include_self=True):
+        qs = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            qs = qs.exclude(pk=self.pk)
+        return qs
+
+    def _build_path(self):
+        prefix = ''
+        if self.parent_id:
+            # Путь родителя — из БД: экземпляр parent мог устареть после переноса
+            prefix = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+        return f'{prefix}{self.pk:0{self.PATH_STEP}d}/'
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        if self.parent_id and self.parent_id == self.pk:
+            raise ValueError('Категория не может быть родителем самой себя.')
+
+        old_path = None
+        if self.pk:
+            old_path = (
+                Category.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+            )
+        if old_path is not None and not kwargs.get('force_insert'):
+            fields = kwargs.get('update_fields')
+            if fields is None:
+                fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            kwargs['update_fields'] = [name for name in fields if name not in self.TREE_FIELDS]
+        super().save(*args, **kwargs)
+
+        new_path = self._build_path()
+        if old_path == new_path:
+            self.path, self.depth = new_path, new_path.count('/') - 1
+            return
+        if old_path and new_path.startswith(old_path):
+            raise ValueError('Нельзя перенести категорию внутрь собственного поддерева.')
+
+        self.path = new_path
+        self.depth = new_path.count('/') - 1
+        if not old_path:
+            Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            return
+
+        # Перенос поддерева: переписываем пути потомков одним UPDATE
+        # и переносим счётчик товаров со старых предков на новых.
+        old_ancestor_ids = [int(part) for part in old_path.split('/')[:-2]]
+        depth_delta = self.depth - (old_path.count('/') - 1)
+        Category.objects.filter(path__startswith=old_path).update(
+            path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+            depth=F('depth') + depth_delta,
+        )
+        subtree_count = (
+            Category.objects.filter(pk=self.pk).values_list('product_count', flat=True).first()
+        )
+        if subtree_count:
+            Category.objects.filter(pk__in=old_ancestor_ids).update(
+                product_count=F('product_count') - subtree_count
+            )
+            Category.objects.filter(pk__in=self.get_ancestor_ids()).update(
+                product_count=F('product_count') + subtree_count
+            )
+
+    @classmethod
+    def adjust_product_count(cls, category_id, delta):
+        """Изменить счётчик товаров у категории и всех её предков."""
+        if not category_id or not delta:
+            return
+        path = cls.objects.filter(pk=category_id).values_list('path', flat=True).first()
+        if not path:
+            return
+        ids = [int(part) for part in path.split('/')[:-1]]
+        cls.objects.filter(pk__in=ids).update(product_count=F('product_count') + delta)
+
+    @classmethod
+    def rebuild_tree(cls):
+        """Полный пересчёт путей и счётчиков (после импорта или ручных правок в БД)."""
+        with transaction.atomic():
+            paths = {}
+            pending = list(cls.objects.values_list('id', 'parent_id'))
+            while pending:
+                rest = []
+                for pk, parent_id in pending:
+                    if parent_id is None:
+                        paths[pk] = f'{pk:0{cls.PATH_STEP}d}/'
+                    elif parent_id in paths:
+                        paths[pk] = f'{paths[parent_id]}{pk:0{cls.PATH_STEP}d}/'
+                    else:
+                        rest.append((pk, parent_id))
+                if len(rest) == len(pending):
+                    raise ValueError('В дереве категорий обнаружен цикл.')
+                pending = rest
+
+            direct = dict(
+                Product.objects.filter(category__isnull=False)
+                .values_list('category_id')
+                .annotate(n=Count('id'))
+            )
+            totals = dict.fromkeys(paths, 0)
+            for pk, n in direct.items():
+                for part in paths[pk].split('/')[:-1]:
+                    totals[int(part)] += n
+
+            categories = [
+                cls(pk=pk, path=path, depth=path.count('/') - 1, product_count=totals[pk])
+                for pk, path in paths.items()
+            ]
+            cls.objects.bulk_update(
+                categories, ['path', 'depth', 'product_count'], batch_size=1000
+            )
+            CatalogVersion.bump()
+
 class Supplier(models.Model):
+    # Учётная запись поставщика (кабинет); у старых записей может отсутствовать
+    user = models.OneToOneField(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='supplier_profile'
+    )
     company_name = models.CharField(max_length=100, unique=True)
     inn = models.CharField(max_length=12)
     phone = models.CharField(max_length=20)
     email = models.EmailField(blank=True)
     address = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.company_name
@@ -54,6 +213,10 @@ class Supplier(models.Model):
     class Meta:
         verbose_name = 'Поставщик'
         verbose_name_plural = 'Поставщики'
+        indexes = [
+            # Курсор дельта-выгрузки и MAX(updated_at) для ETag
+            models.Index(fields=['updated_at', 'id'], name='supplier_updated_id_idx'),
+        ]
 
 class Warehouse(models.Model):
     name = models.CharField(max_length=100)
@@ -62,41 +225,375 @@ class Warehouse(models.Model):
     def __str__(self):
         return self.name
 
-class Product(models.Model):
+class Product(OutboxMixin, models.Model):
+    outbox_topic = 'product'
+
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True)
     warehouse = models.ForeignKey(Warehouse, on_delete=models.SET_NULL, null=True)
-    price = models.DecimalField(max_digits=10, decimal_places=2)
+    price = models.DecimalField(max_digits=10, decimal_places=2, db_index=True)
     quantity = models.PositiveIntegerField()
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    # Денормализованный средний рейтинг — для фасета и сортировки без JOIN по отзывам
+    rating = models.DecimalField(
+        max_digits=3, decimal_places=2, null=True, blank=True, editable=False, db_index=True
+    )
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    # {"1": n, ..., "5": n} — поддерживается Product.refresh_rating
+    rating_histogram = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='product_updated_id_idx'),
+            # Кабинет поставщика: страницы товаров по id и товары на исходе
+            models.Index(fields=['supplier', 'id'], name='product_supplier_id_idx'),
+            models.Index(fields=['supplier', 'quantity'], name='product_supplier_qty_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения на момент загрузки — нужны сигналам, чтобы видеть изменения
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not DEFERRED
+        }
+        return instance
+
+    def get_loaded_value(self, field_name):
+        return getattr(self, '_loaded_values', {}).get(field_name)
+
+    @classmethod
+    def refresh_rating(cls, product_id):
+        """Пересчитать гистограмму оценок, средний рейтинг и число отзывов.
+
+        Один GROUP BY по индексу (product, rating) при изменении отзыва,
+        а не при каждом просмотре страницы товара.
+        """
+        counts = dict(
+            Review.objects.filter(product_id=product_id)
+            .values_list('rating')
+            .annotate(n=Count('id'))
+            .order_by()
+        )
+        histogram = {str(star): counts.get(star, 0) for star in range(1, 6)}
+        total = sum(counts.values())
+        rating = None
+        if total:
+            avg = Decimal(sum(star * n for star, n in counts.items())) / total
+            rating = avg.quantize(Decimal('0.01'))
+        cls.objects.filter(pk=product_id).update(
+            rating=rating,
+            review_count=total,
+            rating_histogram=histogram,
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def take_stock(cls, quantities):
+        """Списать остатки {id товара: штук}; вернуть товары, которых не хватает.
+
+        Строки блокируются в порядке id. Если хоть чего-то не хватает,
+        ничего не списывается. Вызывать внутри транзакции.
+        """
+        products = list(cls.objects.select_for_update().filter(pk__in=quantities).order_by('pk'))
+        short = [product for product in products if product.quantity < quantities[product.pk]]
+        if short:
+            return short
+        for product in products:
+            product.quantity -= quantities[product.pk]
+            # Через save(): сигналы ведут outbox, сводки поставщика и STOCK_OUTS
+            product.save(update_fields=['quantity', 'updated_at'])
+        return []
+
+    def outbox_payload(self):
+        return {
+            'name': self.name,
+            'price': self.price,
+            'quantity': self.quantity,
+            'category_id': self.category_id,
+            'supplier_id': self.supplier_id,
+        }
 
     def get_average_rating(self):
-        reviews = self.review_set.all()
-        if reviews:
-            return sum([r.rating for r in reviews]) / len(reviews)
-        return None
-    
+        return float(self.rating) if self.rating is not None else None
+
+    def get_rating_histogram(self):
+        """[(звёзды, число отзывов, процент)] от 5 до 1."""
+        histogram = self.rating_histogram or {}
+        rows = []
+        for star in range(5, 0, -1):
+            n = histogram.get(str(star), 0)
+            percent = round(n * 100 / self.review_count) if self.review_count else 0
+            rows.append((star, n, percent))
+        return rows
+
     def __str__(self):
         return self.name
 
+class PriceHistory(models.Model):
+    """Цена товара с момента valid_from; строка добавляется при каждой смене цены (signals)."""
+    product = models.ForeignKey(Product, related_name='price_history', on_delete=models.CASCADE)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    valid_from = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Цена на момент T и график — только по индексу (price в INCLUDE на Postgres).
+            # BRIN по valid_from для аналитики по времени — в миграции, только Postgres.
+            models.Index(fields=['product', 'valid_from'], include=['price'], name='price_product_from_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.price} с {self.valid_from:%d.%m.%Y %H:%M}"
+
+class ProductNeighbor(models.Model):
+    """Top-K товаров, которые покупают вместе с product (store.recommendations)."""
+    product = models.ForeignKey(Product, related_name='neighbors', on_delete=models.CASCADE)
+    neighbor = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    # co_count / sqrt(заказов с product * заказов с neighbor)
+    score = models.FloatField()
+    co_count = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'neighbor'], name='unique_product_neighbor'),
+        ]
+        indexes = [
+            # Рекомендации на странице товара — один проход по индексу
+            models.Index(fields=['product', '-score'], name='neighbor_product_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} → {self.neighbor_id} ({self.score:.3f})"
+
+class CatalogVersion(models.Model):
+    """Версия каталога для ETag / Last-Modified (store.http_cache) — одна строка.
+
+    Поднимается после COMMIT любых изменений товаров, категорий, поставщиков
+    и отзывов: сигналами, а массовыми UPDATE — явным вызовом bump().
+    Читается одним запросом по первичному ключу.
+    """
+    ROW_ID = 1
+
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def bump(cls):
+        """Поднять версию после COMMIT текущей транзакции — один раз на транзакцию."""
+        connection = transaction.get_connection()
+        if any(func == cls._increment for sids, func, robust in connection.run_on_commit):
+            return
+        # После COMMIT, а не внутри: строка одна на весь каталог, и её блокировка
+        # до конца транзакции выстроила бы оформления заказов в очередь
+        transaction.on_commit(cls._increment)
+
+    @classmethod
+    def _increment(cls):
+        now = timezone.now()
+        if not cls.objects.filter(pk=cls.ROW_ID).update(version=F('version') + 1, updated_at=now):
+            cls.objects.get_or_create(pk=cls.ROW_ID, defaults={'version': 1, 'updated_at': now})
+
+    @classmethod
+    def current(cls):
+        """(updated_at, version); до первого изменения — (None, 0)."""
+        return cls.objects.filter(pk=cls.ROW_ID).values_list('updated_at', 'version').first() or (None, 0)
+
+
+class SupplierStats(models.Model):
+    """Сводка кабинета поставщика, поддерживается инкрементально.
+
+    Товарные счётчики меняют сигналы Product, продажи — оформление заказа;
+    изменения применяются после COMMIT (adjust). Массовые update() мимо сигналов исправляет rebuild_supplier_stats.
+    """
+    supplier = models.OneToOneField(
+        Supplier, on_delete=models.CASCADE, primary_key=True, related_name='stats'
+    )
+    product_count = models.PositiveIntegerField(default=0)
+    total_stock = models.PositiveBigIntegerField(default=0)
+    low_stock_count = models.PositiveIntegerField(default=0)
+    units_sold = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def is_low(quantity):
+        return quantity is not None and quantity <= settings.LOW_STOCK_THRESHOLD
+
+    @classmethod
+    def adjust(cls, supplier_id, **deltas):
+        """Добавить дельты к сводке поставщика после COMMIT текущей транзакции.
+
+        Дельты копятся по уровням savepoint и применяются в порядке
+        supplier_id: строки поставщиков не блокируются до конца оформления
+        заказа, и два оформления не ждут друг друга крест-накрест.
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if supplier_id is None or not deltas:
+            return
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            cls._apply({supplier_id: deltas})
+            return
+        live = set(connection.savepoint_ids)
+        for sids, func, robust in connection.run_on_commit:
+            # Дописываем в отложенный вызов с теми же живыми savepoint:
+            # их откат отбросит его вместе с этими дельтами
+            if getattr(func, 'func', None) == cls._apply and sids & live == live:
+                pending = func.args[0]
+                break
+        else:
+            pending = {}
+            transaction.on_commit(partial(cls._apply, pending))
+        totals = pending.setdefault(supplier_id, {})
+        for name, delta in deltas.items():
+            totals[name] = totals.get(name, 0) + delta
+
+    @classmethod
+    def _apply(cls, pending):
+        now = timezone.now()
+        with transaction.atomic():
+            for supplier_id in sorted(pending):
+                changes = {name: F(name) + delta for name, delta in pending[supplier_id].items() if delta}
+                if not changes:
+                    continue
+                changes['updated_at'] = now
+                if not cls.objects.filter(pk=supplier_id).update(**changes):
+                    cls.objects.get_or_create(pk=supplier_id)
+                    cls.objects.filter(pk=supplier_id).update(**changes)
+
+    @classmethod
+    def product_changed(cls, old_supplier_id, old_quantity, new_supplier_id, new_quantity):
+        """Учесть создание (old_*=None), изменение или удаление (new_*=None) товара."""
+        if old_supplier_id == new_supplier_id:
+            cls.adjust(
+                new_supplier_id,
+                total_stock=(new_quantity or 0) - (old_quantity or 0),
+                low_stock_count=int(cls.is_low(new_quantity)) - int(cls.is_low(old_quantity)),
+            )
+            return
+        if old_quantity is not None:
+            cls.adjust(
+                old_supplier_id,
+                product_count=-1,
+                total_stock=-old_quantity,
+                low_stock_count=-int(cls.is_low(old_quantity)),
+            )
+        if new_quantity is not None:
+            cls.adjust(
+                new_supplier_id,
+                product_count=1,
+                total_stock=new_quantity,
+                low_stock_count=int(cls.is_low(new_quantity)),
+            )
+
+    @classmethod
+    def record_sale(cls, order):
+        """Добавить продажи заказа к сводкам поставщиков (один GROUP BY)."""
+        rows = (
+            order.items.filter(product__supplier__isnull=False)
+            .values_list('product__supplier_id')
+            .annotate(units=Sum('quantity'), revenue=Sum(F('quantity') * F('price')))
+            .order_by()
+        )
+        for supplier_id, units, revenue in rows:
+            cls.adjust(supplier_id, units_sold=units, revenue=revenue)
+
+    @classmethod
+    def rebuild(cls, supplier_ids=None):
+        """Пересчитать сводки с нуля одним GROUP BY по товарам и одним по заказам."""
+        suppliers = Supplier.objects.all()
+        if supplier_ids is not None:
+            suppliers = suppliers.filter(pk__in=supplier_ids)
+        threshold = settings.LOW_STOCK_THRESHOLD
+        products = dict(
+            (row[0], row[1:]) for row in
+            Product.objects.filter(supplier__in=suppliers)
+            .values_list('supplier_id')
+            .annotate(
+                n=Count('id'),
+                stock=Sum('quantity'),
+                low=Count('id', filter=Q(quantity__lte=threshold)),
+            )
+            .order_by()
+        )
+        sales = dict(
+            (row[0], row[1:]) for row in
+            OrderItem.objects.filter(product__supplier__in=suppliers)
+            .values_list('product__supplier_id')
+            .annotate(units=Sum('quantity'), revenue=Sum(F('quantity') * F('price')))
+            .order_by()
+        )
+        with transaction.atomic():
+            for supplier_id in suppliers.values_list('pk', flat=True):
+                n, stock, low = products.get(supplier_id, (0, 0, 0))
+                units, revenue = sales.get(supplier_id, (0, 0))
+                cls.objects.update_or_create(pk=supplier_id, defaults={
+                    'product_count': n,
+                    'total_stock': stock or 0,
+                    'low_stock_count': low,
+                    'units_sold': units or 0,
+                    'revenue': revenue or 0,
+                })
+
+    def __str__(self):
+        return f"Сводка {self.supplier_id}"
+
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     rating = models.PositiveSmallIntegerField()
     text = models.TextField()
+    helpful_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset-пагинация отзывов товара для каждой сортировки
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_new_idx'),
+            models.Index(fields=['product', '-helpful_count', '-id'], name='review_product_helpful_idx'),
+            models.Index(fields=['product', '-rating', '-id'], name='review_product_rating_idx'),
+        ]
 
     def __str__(self):
         return f"Отзыв {self.user.username} на {self.product.name}"
 
+class ReviewVote(models.Model):
+    review = models.ForeignKey(Review, related_name='votes', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['review', 'user'], name='unique_review_vote'),
+        ]
+
+    def __str__(self):
+        return f"Голос {self.user.username} за отзыв {self.review_id}"
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Последнее изменение состава корзины — по нему чистятся брошенные корзины
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # Одна корзина на пользователя: get_or_create(user=...) не плодит дубли
+        constraints = [
+            models.UniqueConstraint(fields=['user'], name='unique_user_cart'),
+        ]
     
     def get_total_price(self):
         return sum([item.product.price * item.quantity for item in self.items.all()])
+
+    def touch(self):
+        """Отметить изменение; False — корзины уже нет."""
+        return bool(Cart.objects.filter(pk=self.pk).update(updated_at=timezone.now()))
     
     def __str__(self):
         return f"Корзина {self.user.username}"
@@ -109,12 +606,23 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.product.name} (x{self.quantity})"
 
-class Order(models.Model):
+class Order(OutboxMixin, models.Model):
+    outbox_topic = 'order'
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     cart = models.ForeignKey(Cart, on_delete=models.SET_NULL, null=True, blank=True)
     status = models.CharField(max_length=20)
     total_price = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='order_updated_id_idx'),
+        ]
+
+    def outbox_payload(self):
+        return {'user_id': self.user_id, 'status': self.status, 'total_price': self.total_price}
 
     def update_status(self, new_status):
         self.status = new_status
@@ -123,6 +631,30 @@ class Order(models.Model):
     def __str__(self):
         return f"Заказ {self.user.username} - {self.total_price}₽"
 
+class OrderItem(models.Model):
+    """Позиция заказа: товар, цена и количество на момент оформления."""
+    order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
+    # Товар могут удалить — название и цена заказа остаются
+    product = models.ForeignKey(Product, related_name='order_items', on_delete=models.SET_NULL, null=True)
+    name = models.CharField(max_length=100)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.name} (x{self.quantity})"
+
+    def get_total_price(self):
+        return self.price * self.quantity
+
+    @classmethod
+    def snapshot(cls, order, cart):
+        """Скопировать позиции корзины в заказ (одним INSERT)."""
+        return cls.objects.bulk_create([
+            cls(order=order, product=item.product, name=item.product.name,
+                price=item.product.price, quantity=item.quantity)
+            for item in cart.items.select_related('product').order_by('pk')
+        ])
+
 class Payment(models.Model):
     order = models.OneToOneField(Order, on_delete=models.CASCADE)
     method = models.CharField(max_length=20)
@@ -133,13 +665,121 @@ class Payment(models.Model):
     def __str__(self):
         return f"Оплата заказа {self.order.id}"
 
-class Delivery(models.Model):
+class Delivery(OutboxMixin, models.Model):
+    outbox_topic = 'delivery'
+
     order = models.OneToOneField(Order, on_delete=models.CASCADE)
-    tracking_number = models.CharField(max_length=50)
+    # Код перевозчика из settings.CARRIERS (store.carriers)
+    carrier = models.CharField(max_length=20, blank=True)
+    # Статусы от перевозчика приходят по трек-номеру
+    tracking_number = models.CharField(max_length=50, db_index=True)
     delivery_date = models.DateField(null=True, blank=True)
     shipped_date = models.DateField(null=True, blank=True)
     delivery_address = models.CharField(max_length=255)
     delivery_status = models.CharField(max_length=20)
+    status_updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Опрос перевозчика: незавершённые доставки пачками по id (частичный индекс)
+            models.Index(
+                fields=['carrier', 'id'],
+                condition=~Q(delivery_status='получен'),
+                name='delivery_in_flight_idx',
+            ),
+        ]
+
+    def outbox_payload(self):
+        return {
+            'order_id': self.order_id,
+            'tracking_number': self.tracking_number,
+            'delivery_status': self.delivery_status,
+            'shipped_date': self.shipped_date,
+            'delivery_date': self.delivery_date,
+        }
+
+    def __str__(self):
+        return f"Доставка заказа {self.order.id}"
+
+class TrackingBlock(models.Model):
+    """Диапазон трек-номеров [start, end), заранее выданный перевозчиком."""
+    carrier = models.CharField(max_length=20)
+    start = models.BigIntegerField()
+    end = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['carrier', 'start'], name='unique_tracking_block'),
+        ]
+
+    def __str__(self):
+        return f"{self.carrier}: {self.start}–{self.end - 1}"
+
+
+class TrackingCounter(models.Model):
+    """Следующий свободный трек-номер перевозчика; UPDATE строки сериализует резервы блоков."""
+    carrier = models.CharField(max_length=20, primary_key=True)
+    next_number = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.carrier}: с {self.next_number}"
+
+class OutboxEvent(models.Model):
+    """Событие об изменении товара, заказа или доставки.
+
+    Пишется в транзакции самого изменения; relay_outbox читает события
+    пачками по возрастанию id и раздаёт их приёмникам (store.outbox).
+    """
+    id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def publish(cls, instance, action, **extra):
+        payload = instance.outbox_payload()
+        payload.update(extra)
+        return cls.objects.create(
+            topic=f'{instance.outbox_topic}.{action}', object_id=instance.pk, payload=payload
+        )
+
+    def __str__(self):
+        return f"{self.topic} #{self.object_id}"
+
+class OutboxCursor(models.Model):
+    """Позиция приёмника в outbox: последний доставленный id."""
+    sink = models.CharField(max_length=50, primary_key=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.sink}: {self.last_id}"
+
+
+class ProductAdjustment(models.Model):
+    """Журнал массовых изменений цен и остатков (store.adjustments)."""
+    KIND_PRICE_PERCENT = 'price_percent'
+    KIND_STOCK_ADD = 'stock_add'
+    KIND_STOCK_SET = 'stock_set'
+    KIND_CHOICES = [
+        (KIND_PRICE_PERCENT, 'Цена, %'),
+        (KIND_STOCK_ADD, 'Остаток, прибавить'),
+        (KIND_STOCK_SET, 'Остаток, установить'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    value = models.DecimalField(max_digits=12, decimal_places=2)
+    # Какие товары выбраны: фильтры команды или параметры списка в админке
+    scope = models.JSONField(default=dict, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    matched = models.PositiveIntegerField(default=0)
+    changed = models.PositiveIntegerField(default=0)
+    # id последнего обработанного товара: прерванный или отложенный запуск продолжается с него
+    last_id = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
-        return f"Доставка заказа {self.order.id}"
\ No newline at end of file
+        return f"{self.get_kind_display()} {self.value}: {self.changed} из {self.matched}"
@@ -0,0 +1,155 @@
+"""Раздача событий outbox приёмникам.
+
+У каждого приёмника своя позиция (OutboxCursor), поэтому упавший
+вебхук не задерживает запись в файл. Доставка «хотя бы один раз»:
+позиция сдвигается после успешной отправки пачки, приёмник должен
+переживать повторы (в событии есть id).
+
+id выдаётся при INSERT, а видимым событие становится при COMMIT: транзакция
+с id N может зафиксироваться позже транзакции с N+1. Поэтому позиция не
+перескакивает «дыру» в id, пока событие после неё моложе
+OUTBOX['GAP_TIMEOUT'] секунд, — дальше дыра считается откатом.
+
+Приёмники задаются в settings.OUTBOX['SINKS']: {'имя': {'CLASS': путь, ...}},
+остальные ключи передаются в конструктор.
+"""
+import json
+import logging
+import time
+import urllib.request
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .fragments import invalidate_product_card
+from .models import OutboxCursor, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def event_to_dict(event):
+    return {
+        'id': event.id,
+        'topic': event.topic,
+        'object_id': event.object_id,
+        'payload': event.payload,
+        'created_at': event.created_at,
+    }
+
+
+class Sink:
+    def __init__(self, name, **options):
+        self.name = name
+
+    def send(self, events):
+        raise NotImplementedError
+
+
+class NdjsonSink(Sink):
+    """Дописывает события в файл, по одному JSON на строку."""
+
+    def __init__(self, name, PATH, **options):
+        super().__init__(name)
+        self.path = Path(PATH)
+
+    def send(self, events):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open('a', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event_to_dict(event), cls=DjangoJSONEncoder, ensure_ascii=False))
+                f.write('\n')
+
+
+class WebhookSink(Sink):
+    """POST пачки событий одним JSON-массивом; без URL только пишет в лог."""
+
+    def __init__(self, name, URL=None, TIMEOUT=5, **options):
+        super().__init__(name)
+        self.url = URL
+        self.timeout = TIMEOUT
+
+    def send(self, events):
+        body = json.dumps([event_to_dict(e) for e in events], cls=DjangoJSONEncoder).encode('utf-8')
+        if not self.url:
+            logger.info('outbox %s: %d событий (URL не задан)', self.name, len(events))
+            return
+        request = urllib.request.Request(
+            self.url, data=body, method='POST', headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class CacheInvalidationSink(Sink):
+    """Сбрасывает кэш карточек изменённых товаров (в т.ч. на других узлах с общим кэшем)."""
+
+    def send(self, events):
+        for event in events:
+            if event.topic.startswith('product.'):
+                invalidate_product_card(event.object_id)
+
+
+def get_sinks():
+    sinks = []
+    for name, options in settings.OUTBOX['SINKS'].items():
+        options = dict(options)
+        sinks.append(import_string(options.pop('CLASS'))(name, **options))
+    return sinks
+
+
+def visible_events(last_id, batch_size, gap_timeout=None):
+    """События после last_id до первой свежей дыры в id."""
+    if gap_timeout is None:
+        gap_timeout = settings.OUTBOX['GAP_TIMEOUT']
+    horizon = timezone.now() - timedelta(seconds=gap_timeout)
+    events = []
+    previous = last_id
+    for event in OutboxEvent.objects.filter(id__gt=last_id).order_by('id')[:batch_size]:
+        # Пропущенный id выдан не позже, чем создано следующее за ним событие
+        if event.id != previous + 1 and event.created_at > horizon:
+            break
+        events.append(event)
+        previous = event.id
+    return events
+
+
+def relay_batch(sink, batch_size):
+    """Отправить приёмнику следующую пачку; вернуть число событий."""
+    cursor, created = OutboxCursor.objects.get_or_create(sink=sink.name)
+    events = visible_events(cursor.last_id, batch_size)
+    if not events:
+        return 0
+    sink.send(events)
+    OutboxCursor.objects.filter(sink=sink.name).update(last_id=events[-1].id)
+    return len(events)
+
+
+def relay(sinks, batch_size, poll_interval, once=False, log=None):
+    """Крутить пачки, пока есть события; once=True — выйти, когда всё отдано."""
+    while True:
+        sent = 0
+        for sink in sinks:
+            started = time.monotonic()
+            try:
+                n = relay_batch(sink, batch_size)
+            except Exception:
+                logger.exception('outbox %s: ошибка отправки, повтор позже', sink.name)
+                continue
+            sent += n
+            if n and log:
+                log(f'{sink.name}: {n} событий за {time.monotonic() - started:.2f} с')
+        if not sent:
+            if once:
+                return
+            time.sleep(poll_interval)
+
+
+def delivered_id():
+    """Наибольший id, уже доставленный всем приёмникам."""
+    names = list(settings.OUTBOX['SINKS'])
+    positions = dict(OutboxCursor.objects.filter(sink__in=names).values_list('sink', 'last_id'))
+    return min(positions.get(name, 0) for name in names) if names else 0
@@ -0,0 +1,96 @@
+"""Запросы к истории цен.
+
+Все они идут по индексу (product, valid_from) с ценой в INCLUDE:
+цена на момент T — обратный проход по индексу с LIMIT 1 на товар,
+график — диапазон индекса одного товара, сгруппированный по интервалам.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import PriceHistory, Product
+
+# (интервал Trunc, длина в секундах) — выбирается самый мелкий, дающий не больше points точек
+CHART_INTERVALS = [
+    ('hour', 3600),
+    ('day', 86400),
+    ('week', 7 * 86400),
+    ('month', 31 * 86400),
+    ('quarter', 92 * 86400),
+    ('year', 366 * 86400),
+]
+
+
+def price_at(when, product_ref='pk'):
+    """Подзапрос: цена товара OuterRef(product_ref) на момент when."""
+    return Subquery(
+        PriceHistory.objects.filter(product=OuterRef(product_ref), valid_from__lte=when)
+        .order_by('-valid_from')
+        .values('price')[:1]
+    )
+
+
+def prices_at(product_ids, when):
+    """{id товара: цена на момент when} одним запросом; None — товара тогда не было."""
+    return dict(
+        Product.objects.filter(pk__in=product_ids)
+        .annotate(price_then=price_at(when))
+        .values_list('pk', 'price_then')
+    )
+
+
+def previous_price(product_id):
+    """Цена до последнего изменения или None."""
+    return (
+        PriceHistory.objects.filter(product_id=product_id)
+        .order_by('-valid_from')
+        .values_list('price', flat=True)[1:2]
+        .first()
+    )
+
+
+def price_chart(product_id, days=365, points=100):
+    """График цены за days дней не более чем из points интервалов.
+
+    {'interval', 'opening' — цена на начало периода,
+     'points': [{'at', 'low', 'high', 'changes'}]} — только интервалы с изменениями.
+    """
+    end = timezone.now()
+    start = end - timedelta(days=days)
+    span = (end - start).total_seconds()
+    interval = next(
+        (name for name, seconds in CHART_INTERVALS if span / seconds <= points),
+        CHART_INTERVALS[-1][0],
+    )
+    opening = (
+        PriceHistory.objects.filter(product_id=product_id, valid_from__lte=start)
+        .order_by('-valid_from')
+        .values_list('price', flat=True)
+        .first()
+    )
+    rows = (
+        PriceHistory.objects.filter(product_id=product_id, valid_from__gt=start, valid_from__lte=end)
+        .annotate(at=Trunc('valid_from', interval))
+        .values('at')
+        .annotate(low=Min('price'), high=Max('price'), changes=Count('id'))
+        .order_by('at')
+    )
+    return {'interval': interval, 'opening': opening, 'points': _merge_points(list(rows), points)}
+
+
+def _merge_points(rows, points):
+    """Склеить соседние интервалы, если их больше points (крупнее года Trunc не бывает)."""
+    if len(rows) <= points:
+        return rows
+    size = -(-len(rows) // points)
+    return [
+        {
+            'at': group[0]['at'],
+            'low': min(row['low'] for row in group),
+            'high': max(row['high'] for row in group),
+            'changes': sum(row['changes'] for row in group),
+        }
+        for group in (rows[i:i + size] for i in range(0, len(rows), size))
+    ]
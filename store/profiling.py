@@ -0,0 +1,240 @@
+"""Выборочное профилирование запросов.
+
+Включается settings.PROFILING['ENABLED']; если выключено, middleware
+не попадает в цепочку (MiddlewareNotUsed) и ничего не стоит. Профиль
+снимается для URL из PROFILING['URL_NAMES'] с вероятностью SAMPLE_RATE
+или всегда, если сотрудник прислал заголовок PROFILING['HEADER'].
+Движки (PROFILING['ENGINE']):
+    sampling    — сэмплер стеков в отдельном потоке, даёт flamegraph (.folded)
+    cprofile    — детерминированный cProfile, таблица функций (.prof)
+    pyinstrument — готовый HTML-отчёт pyinstrument, если пакет установлен
+Профили и метаданные (.json) складываются в PROFILING['DIR'].
+"""
+import cProfile
+import json
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+# Узлы короче этой доли от корня в flamegraph не рисуются
+FLAME_MIN_FRACTION = 0.005
+SAMPLE_INTERVAL = 0.001
+
+
+def profiling_settings():
+    return settings.PROFILING
+
+
+def profile_dir():
+    path = Path(profiling_settings()['DIR'])
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not profiling_settings().get('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.config = profiling_settings()
+        self.url_names = set(self.config.get('URL_NAMES', ()))
+        self.header = 'HTTP_' + self.config.get('HEADER', 'X-Profile').upper().replace('-', '_')
+
+    def should_profile(self, request):
+        if request.META.get(self.header) and request.user.is_staff:
+            return True
+        if not self.url_names or random.random() >= self.config.get('SAMPLE_RATE', 0.01):
+            return False
+        try:
+            return resolve(request.path_info).url_name in self.url_names
+        except Resolver404:
+            return False
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        engine = self.config.get('ENGINE', 'sampling')
+        started = time.perf_counter()
+        if engine == 'pyinstrument':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        elif engine == 'cprofile':
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+        else:
+            profiler = StackSampler(self.config.get('SAMPLE_INTERVAL', SAMPLE_INTERVAL))
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        duration = time.perf_counter() - started
+
+        save_profile(request, response, profiler, engine, duration)
+        return response
+
+
+class StackSampler:
+    """Периодически снимает стек потока запроса (collapsed stacks)."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        stop_code = ProfilingMiddleware.__call__.__code__
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            # Кадры выше middleware (WSGI-сервер) одинаковы для всех сэмплов
+            while frame is not None and frame.f_code is not stop_code:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})')
+                frame = frame.f_back
+            # Сэмпл, снятый во время остановки, показывал бы сам сэмплер
+            if stack and not self._stop.is_set():
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.items())
+
+
+def save_profile(request, response, profiler, engine, duration):
+    profile_id = f"{timezone.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}"
+    directory = profile_dir()
+    if engine == 'pyinstrument':
+        (directory / f'{profile_id}.html').write_text(profiler.output_html(), encoding='utf-8')
+    elif engine == 'cprofile':
+        profiler.dump_stats(directory / f'{profile_id}.prof')
+    else:
+        (directory / f'{profile_id}.folded').write_text(profiler.folded(), encoding='utf-8')
+
+    match = getattr(request, 'resolver_match', None)
+    meta = {
+        'id': profile_id,
+        'engine': engine,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'url_name': match.url_name if match else None,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 1),
+        'user': request.user.get_username() if request.user.is_authenticated else None,
+        'created_at': timezone.now().isoformat(),
+    }
+    (directory / f'{profile_id}.json').write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+    prune_profiles(directory)
+
+
+def prune_profiles(directory):
+    keep = profiling_settings().get('KEEP', 200)
+    metas = sorted(directory.glob('*.json'), reverse=True)
+    for meta in metas[keep:]:
+        for path in directory.glob(f'{meta.stem}.*'):
+            path.unlink(missing_ok=True)
+
+
+def list_profiles():
+    profiles = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        try:
+            profiles.append(json.loads(path.read_text(encoding='utf-8')))
+        except ValueError:
+            continue
+    return profiles
+
+
+def load_profile(profile_id):
+    """Метаданные профиля или None. profile_id проверяется по списку файлов."""
+    for path in profile_dir().glob('*.json'):
+        if path.stem == profile_id:
+            return json.loads(path.read_text(encoding='utf-8'))
+    return None
+
+
+def pyinstrument_html(profile_id):
+    return (profile_dir() / f'{profile_id}.html').read_text(encoding='utf-8')
+
+
+def _func_label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f'{name} ({Path(filename).name}:{line})'
+
+
+def flame_rows(meta):
+    """Flamegraph по уровням стека: [[{'label', 'seconds', 'percent', 'left', 'width'}]].
+
+    left и width — проценты от всего запроса. Шаблон рисует уровни циклом,
+    без рекурсии, поэтому глубина стека не ограничена.
+    """
+    root = {'label': 'request', 'count': 0, 'children': {}}
+    path = profile_dir() / f"{meta['id']}.folded"
+    for line in path.read_text(encoding='utf-8').splitlines():
+        stack, _, count = line.rpartition(' ')
+        count = int(count)
+        root['count'] += count
+        node = root
+        for label in stack.split(';'):
+            node = node['children'].setdefault(label, {'label': label, 'count': 0, 'children': {}})
+            node['count'] += count
+    if not root['count']:
+        return []
+
+    total = root['count']
+    seconds_per_sample = meta['duration_ms'] / 1000 / total
+    rows = []
+    pending = [(root, 0, 0)]
+    while pending:
+        node, depth, offset = pending.pop()
+        if depth == len(rows):
+            rows.append([])
+        rows[depth].append({
+            'label': node['label'],
+            'seconds': node['count'] * seconds_per_sample,
+            'percent': node['count'] * 100 / total,
+            'left': offset * 100 / total,
+            'width': node['count'] * 100 / total,
+        })
+        for child in sorted(node['children'].values(), key=lambda n: -n['count']):
+            if child['count'] / total >= FLAME_MIN_FRACTION:
+                pending.append((child, depth + 1, offset))
+            offset += child['count']
+    for row in rows:
+        row.sort(key=lambda n: n['left'])
+    return rows
+
+
+def top_functions(profile_id, limit=30):
+    stats = pstats.Stats(str(profile_dir() / f'{profile_id}.prof')).stats
+    rows = [
+        {'label': _func_label(func), 'calls': nc, 'own': tt, 'cumulative': ct}
+        for func, (cc, nc, tt, ct, callers) in stats.items()
+    ]
+    return sorted(rows, key=lambda r: -r['own'])[:limit]
@@ -0,0 +1,156 @@
+"""Политики хранения данных для `manage.py purge`.
+
+Политика описывает, какие строки модели устарели. Удаление идёт
+пачками по диапазонам первичного ключа (pk > последний, pk <= граница
+пачки), чтобы каждый DELETE был коротким и шёл по индексу. Между
+пачками — пауза; если пачка удалялась дольше max_batch_seconds, размер
+пачки уменьшается вдвое, а пауза удваивается.
+
+Сроки хранения задаются в settings.PURGE_POLICIES: {'имя': {'days': N}},
+days=None отключает политику.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+from .carts import forget_cart_ids
+from .models import Cart, OutboxEvent, Product, Review
+from .outbox import delivered_id
+from .signals import suspend_rating_refresh
+
+POLICIES = {}
+
+
+def policy(name):
+    def register(cls):
+        cls.name = name
+        POLICIES[name] = cls()
+        return cls
+    return register
+
+
+class RetentionPolicy:
+    name = None
+    model = None
+
+    def queryset(self, cutoff):
+        raise NotImplementedError
+
+    def before_batch(self, batch):
+        """Вызывается с queryset пачки до удаления."""
+
+    def delete_batch(self, batch):
+        return batch.delete()[1].get(self.model._meta.label, 0)
+
+
+@policy('carts')
+class AbandonedCartPolicy(RetentionPolicy):
+    """Корзины, не менявшиеся дольше срока.
+
+    Корзина переживает оформление заказа, поэтому наличие заказов не
+    учитывается: у оформленных заказов ссылка на корзину обнуляется.
+    """
+    model = Cart
+
+    def queryset(self, cutoff):
+        return Cart.objects.filter(updated_at__lt=cutoff)
+
+    def before_batch(self, batch):
+        forget_cart_ids(batch.values_list('user_id', flat=True))
+
+
+@policy('sessions')
+class ExpiredSessionPolicy(RetentionPolicy):
+    """Истёкшие сессии (days — запас после expire_date)."""
+    model = Session
+
+    def queryset(self, cutoff):
+        return Session.objects.filter(expire_date__lt=cutoff)
+
+
+@policy('reviews')
+class OldReviewPolicy(RetentionPolicy):
+    """Старые отзывы; рейтинг товаров пересчитывается раз на пачку."""
+    model = Review
+
+    def queryset(self, cutoff):
+        return Review.objects.filter(created_at__lt=cutoff)
+
+    def before_batch(self, batch):
+        self.product_ids = set(batch.values_list('product_id', flat=True))
+
+    def delete_batch(self, batch):
+        with suspend_rating_refresh():
+            deleted = super().delete_batch(batch)
+        for product_id in self.product_ids:
+            Product.refresh_rating(product_id)
+        return deleted
+
+
+@policy('outbox')
+class DeliveredOutboxPolicy(RetentionPolicy):
+    """События outbox, уже отданные всем приёмникам."""
+    model = OutboxEvent
+
+    def queryset(self, cutoff):
+        return OutboxEvent.objects.filter(created_at__lt=cutoff, id__lte=delivered_id())
+
+
+class PurgeResult:
+    def __init__(self, name):
+        self.name = name
+        self.deleted = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    @property
+    def rate(self):
+        return self.deleted / self.seconds if self.seconds else 0.0
+
+
+def run_policy(retention, days, batch_size, sleep, max_batch_seconds, dry_run=False, log=None):
+    cutoff = timezone.now() - timedelta(days=days)
+    candidates = retention.queryset(cutoff)
+    result = PurgeResult(retention.name)
+    if dry_run:
+        result.deleted = candidates.count()
+        return result
+
+    started = time.monotonic()
+    last = None
+    while True:
+        window = candidates if last is None else candidates.filter(pk__gt=last)
+        keys = list(window.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            break
+        batch = window.filter(pk__lte=keys[-1])
+
+        batch_started = time.monotonic()
+        retention.before_batch(batch)
+        result.deleted += retention.delete_batch(batch)
+        result.batches += 1
+        batch_seconds = time.monotonic() - batch_started
+        last = keys[-1]
+
+        if log:
+            log(f'{retention.name}: пачка {result.batches}, удалено {result.deleted} '
+                f'({batch_seconds:.2f} с, размер {batch_size})')
+        if batch_seconds > max_batch_seconds and batch_size > 1:
+            batch_size = max(1, batch_size // 2)
+            sleep *= 2
+        time.sleep(sleep)
+
+    result.seconds = time.monotonic() - started
+    return result
+
+
+def configured_policies():
+    """[(политика, days)] для включённых в settings.PURGE_POLICIES."""
+    enabled = []
+    for name, options in settings.PURGE_POLICIES.items():
+        if options.get('days') is not None:
+            enabled.append((POLICIES[name], options['days']))
+    return enabled
@@ -0,0 +1,109 @@
+"""Token bucket для дорогих эндпоинтов.
+
+Лимиты задаются в settings.RATE_LIMITS по областям, отдельно для
+пользователя и для IP, в виде '30/m' (ёмкость ведра и скорость
+пополнения за секунду/минуту/час). Вёдра хранятся в кэше
+settings.RATE_LIMIT_CACHE.
+"""
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+
+_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def take_token(key, rate, now=None, cost=1):
+    """Забрать токен из ведра. Возвращает (успех, секунд до следующего токена).
+
+    cost=0 только проверяет, есть ли в ведре токен.
+    """
+    capacity, period = parse_rate(rate)
+    refill = capacity / period
+    now = time.time() if now is None else now
+    cache = caches[settings.RATE_LIMIT_CACHE]
+
+    with _lock:
+        tokens, stamp = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - stamp) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= cost
+        cache.set(key, (tokens, now), period * 2)
+    return allowed, 0 if allowed else (1 - tokens) / refill
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def ratelimit(scope, methods=None):
+    """Ограничить view лимитами области scope; при превышении — 429."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            limits = settings.RATE_LIMITS.get(scope, {})
+            if methods is None or request.method in methods:
+                buckets = []
+                if request.user.is_authenticated and 'user' in limits:
+                    buckets.append((f'rl:{scope}:user:{request.user.pk}', limits['user']))
+                if 'ip' in limits:
+                    buckets.append((f'rl:{scope}:ip:{client_ip(request)}', limits['ip']))
+                for key, rate in buckets:
+                    allowed, retry_after = take_token(key, rate)
+                    if not allowed:
+                        response = HttpResponse(
+                            'Слишком много запросов. Повторите позже.', status=429
+                        )
+                        response['Retry-After'] = str(int(retry_after) + 1)
+                        return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _login_key(scope, username):
+    return f'rl:{scope}:login:{username.strip().lower()}'
+
+
+def _failure_buckets(scope, request, username):
+    limits = settings.RATE_LIMITS.get(scope, {})
+    buckets = []
+    if username and 'user' in limits:
+        buckets.append((_login_key(scope, username), limits['user']))
+    if 'ip' in limits:
+        buckets.append((f'rl:{scope}:ip:{client_ip(request)}', limits['ip']))
+    return buckets
+
+
+def failures_blocked(scope, request, username):
+    """Секунд до следующей попытки, если ошибок по логину или IP слишком много, иначе 0.
+
+    Проверка до проверки пароля: заблокированная попытка не стоит хеша.
+    """
+    for key, rate in _failure_buckets(scope, request, username):
+        allowed, retry_after = take_token(key, rate, cost=0)
+        if not allowed:
+            return int(retry_after) + 1
+    return 0
+
+
+def record_failure(scope, request, username):
+    for key, rate in _failure_buckets(scope, request, username):
+        take_token(key, rate)
+
+
+def reset_failures(scope, request, username):
+    """Успешный вход обнуляет счётчик по логину; счётчик по IP остаётся."""
+    if username:
+        caches[settings.RATE_LIMIT_CACHE].delete(_login_key(scope, username))
@@ -0,0 +1,176 @@
+"""«С этим товаром покупают»: совместная встречаемость товаров в заказах.
+
+Заказы читаются пачками по id (состав заказа — его позиции OrderItem).
+Каждая пачка — разреженная матрица заказ × товар X, к счётчикам
+добавляется X.T @ X. Диагональ — число заказов с товаром, вне
+диагонали — число заказов с парой товаров.
+
+Матрица и id последнего учтённого заказа хранятся в
+RECOMMENDATIONS['STATE_DIR']; следующий запуск досчитывает только новые
+заказы и пересчитывает top-K для затронутых ими товаров, а также для
+товаров, у которых затронутый товар среди соседей (score зависит от
+числа заказов соседа). Как и в store.outbox, id последнего заказа не
+перескакивает «дыру» в id моложе RECOMMENDATIONS['GAP_TIMEOUT'] секунд:
+заказ с меньшим id может закоммититься позже.
+
+numpy и scipy — необязательные зависимости, импортируются при запуске.
+"""
+import json
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderItem, Product, ProductNeighbor
+
+MATRIX_FILE = 'cooccurrence.npz'
+STATE_FILE = 'state.json'
+
+
+def _state_dir():
+    return Path(settings.RECOMMENDATIONS['STATE_DIR'])
+
+
+def load_state(sparse):
+    directory = _state_dir()
+    try:
+        state = json.loads((directory / STATE_FILE).read_text(encoding='utf-8'))
+        counts = sparse.load_npz(directory / MATRIX_FILE).tocsr()
+    except (OSError, ValueError):
+        return None, 0
+    return counts, state['last_order_id']
+
+
+def save_state(sparse, counts, last_order_id):
+    directory = _state_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    sparse.save_npz(directory / MATRIX_FILE, counts)
+    (directory / STATE_FILE).write_text(json.dumps({'last_order_id': last_order_id}), encoding='utf-8')
+
+
+def committed_order_ids(after_id, batch_size, horizon):
+    """id заказов после after_id до первой дыры, за которой заказ создан после horizon."""
+    order_ids = []
+    previous = after_id
+    for pk, created_at in (
+        Order.objects.filter(pk__gt=after_id).order_by('pk').values_list('pk', 'created_at')[:batch_size]
+    ):
+        # Пропущенный id мог быть выдан транзакции, которая ещё не закоммитилась
+        if pk != previous + 1 and created_at > horizon:
+            break
+        order_ids.append(pk)
+        previous = pk
+    return order_ids
+
+
+def order_batches(after_id, batch_size, gap_timeout=None):
+    """Пачки [(id заказа, id товара)] по возрастанию id заказа."""
+    if gap_timeout is None:
+        gap_timeout = settings.RECOMMENDATIONS['GAP_TIMEOUT']
+    horizon = timezone.now() - timedelta(seconds=gap_timeout)
+    while True:
+        order_ids = committed_order_ids(after_id, batch_size, horizon)
+        if not order_ids:
+            return
+        pairs = list(
+            OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False)
+            .values_list('order_id', 'product_id')
+        )
+        yield order_ids[-1], pairs
+        after_id = order_ids[-1]
+
+
+def count_batch(np, sparse, pairs, size):
+    """X.T @ X для пачки; X — бинарная матрица заказ × товар."""
+    orders = np.fromiter((o for o, p in pairs), dtype=np.int64, count=len(pairs))
+    products = np.fromiter((p for o, p in pairs), dtype=np.int64, count=len(pairs))
+    rows = np.unique(orders, return_inverse=True)[1]
+    incidence = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (rows, products)),
+        shape=(rows.max() + 1, size),
+    )
+    incidence.data[:] = 1  # один товар дважды в заказе — всё равно одна встреча
+    return (incidence.T @ incidence).tocsr()
+
+
+def top_neighbors(np, counts, product_ids, top_k, min_count):
+    """{товар: [(сосед, score, co_count)]} для строк product_ids."""
+    diagonal = counts.diagonal().astype(np.float64)
+    result = {}
+    for product_id in product_ids:
+        start, end = counts.indptr[product_id], counts.indptr[product_id + 1]
+        neighbors = counts.indices[start:end]
+        co = counts.data[start:end]
+        keep = (neighbors != product_id) & (co >= min_count)
+        neighbors, co = neighbors[keep], co[keep]
+        if not len(neighbors):
+            result[product_id] = []
+            continue
+        scores = co / np.sqrt(diagonal[product_id] * diagonal[neighbors])
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+            neighbors, co, scores = neighbors[best], co[best], scores[best]
+        order = np.argsort(-scores, kind='stable')
+        result[product_id] = [
+            (int(neighbors[i]), float(scores[i]), int(co[i])) for i in order
+        ]
+    return result
+
+
+def save_neighbors(neighbors):
+    with transaction.atomic():
+        ProductNeighbor.objects.filter(product_id__in=list(neighbors)).delete()
+        ProductNeighbor.objects.bulk_create([
+            ProductNeighbor(product_id=product_id, neighbor_id=neighbor_id, score=score, co_count=co)
+            for product_id, rows in neighbors.items()
+            for neighbor_id, score, co in rows
+        ], batch_size=1000)
+
+
+def refresh(full=False, log=None):
+    """Досчитать новые заказы (или всё заново) и обновить top-K. Вернуть (заказов, товаров)."""
+    import numpy as np
+    from scipy import sparse
+
+    options = settings.RECOMMENDATIONS
+    counts, last_order_id = (None, 0) if full else load_state(sparse)
+    touched = set()
+    orders = 0
+
+    for batch_last_id, pairs in order_batches(last_order_id, options['BATCH_SIZE']):
+        last_order_id = batch_last_id
+        if not pairs:
+            continue
+        size = max(p for o, p in pairs) + 1
+        if counts is not None:
+            size = max(size, counts.shape[0])
+            counts.resize((size, size))
+        batch = count_batch(np, sparse, pairs, size)
+        counts = batch if counts is None else (counts + batch).tocsr()
+        touched.update(p for o, p in pairs)
+        orders += len({o for o, p in pairs})
+        if log:
+            log(f'заказы до #{batch_last_id}: {orders}, товаров затронуто: {len(touched)}')
+
+    if counts is None:
+        return 0, 0
+    if touched:
+        # score = co / sqrt(n_a * n_b): у товара меняется оценка соседа,
+        # даже если сам товар в новых заказах не встречался
+        touched.update(
+            ProductNeighbor.objects.filter(neighbor_id__in=list(touched))
+            .values_list('product_id', flat=True).distinct()
+        )
+    neighbors = top_neighbors(np, counts, sorted(touched), options['TOP_K'], options['MIN_CO_COUNT'])
+    # Удалённые товары остаются в матрице — отбрасываем их одним запросом
+    mentioned = touched.union(n for rows in neighbors.values() for n, score, co in rows)
+    existing = set(Product.objects.filter(pk__in=mentioned).values_list('pk', flat=True))
+    neighbors = {
+        product_id: [row for row in rows if row[0] in existing]
+        for product_id, rows in neighbors.items() if product_id in existing
+    }
+    save_neighbors(neighbors)
+    save_state(sparse, counts, last_order_id)
+    return orders, len(neighbors)
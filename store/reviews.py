@@ -0,0 +1,80 @@
+"""Keyset-пагинация отзывов товара.
+
+Каждая сортировка опирается на свой индекс (product, <колонка>, id),
+поэтому страница отзывов стоит одинаково при 10 и при 100 000 отзывов.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Review
+
+REVIEWS_PAGE_SIZE = 10
+
+REVIEW_SORTS = {
+    'new': ('created_at', 'Сначала новые'),
+    'helpful': ('helpful_count', 'Самые полезные'),
+    'rating': ('rating', 'По оценке'),
+}
+DEFAULT_REVIEW_SORT = 'new'
+
+
+class CursorError(ValueError):
+    pass
+
+
+def _encode(value, pk):
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    raw = json.dumps([value, pk])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode(cursor, field):
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if field == 'created_at':
+            value = parse_datetime(value)
+        else:
+            value = int(value)
+        pk = int(pk)
+    except (ValueError, TypeError, UnicodeError):
+        raise CursorError('Некорректный курсор.')
+    if value is None:
+        raise CursorError('Некорректный курсор.')
+    return value, pk
+
+
+def review_page(product_id, sort=DEFAULT_REVIEW_SORT, cursor=None, limit=REVIEWS_PAGE_SIZE):
+    """Вернуть (отзывы, курсор следующей страницы или None)."""
+    field = REVIEW_SORTS.get(sort, REVIEW_SORTS[DEFAULT_REVIEW_SORT])[0]
+    reviews = (
+        Review.objects.filter(product_id=product_id)
+        .select_related('user')
+        .only('id', 'rating', 'text', 'helpful_count', 'created_at', 'user__username')
+        .order_by(f'-{field}', '-id')
+    )
+    if cursor:
+        value, pk = _decode(cursor, field)
+        reviews = reviews.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+
+    page = list(reviews[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_cursor = _encode(getattr(last, field), last.pk)
+    return page, next_cursor
+
+
+def review_to_dict(review):
+    return {
+        'id': review.id,
+        'user': review.user.username,
+        'rating': review.rating,
+        'text': review.text,
+        'helpful_count': review.helpful_count,
+        'created_at': review.created_at.isoformat(),
+    }
@@ -0,0 +1,171 @@
+import threading
+from decimal import Decimal
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .backends import forget_user
+from .fragments import invalidate_product_card
+from .metrics import STOCK_OUTS
+from .models import (
+    CatalogVersion, Category, Delivery, Order, OutboxEvent, PriceHistory, Product, Review, Supplier,
+    SupplierStats, User,
+)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    invalidate_product_card(instance.pk)
+    publish_change(sender, instance, created)
+    if created:
+        Category.adjust_product_count(instance.category_id, 1)
+        SupplierStats.product_changed(None, None, instance.supplier_id, instance.quantity)
+        PriceHistory.objects.create(product=instance, price=instance.price)
+        instance._loaded_values = {
+            'category_id': instance.category_id,
+            'supplier_id': instance.supplier_id,
+            'quantity': instance.quantity,
+            'price': Decimal(str(instance.price)),
+        }
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if loaded.get('quantity') and instance.quantity == 0:
+        STOCK_OUTS.inc()
+    if 'supplier_id' in loaded and 'quantity' in loaded:
+        SupplierStats.product_changed(
+            loaded['supplier_id'], loaded['quantity'], instance.supplier_id, instance.quantity
+        )
+        loaded['supplier_id'] = instance.supplier_id
+    loaded['quantity'] = instance.quantity
+    # Цена могла быть присвоена строкой или int — храним и сравниваем Decimal
+    price = Decimal(str(instance.price))
+    if 'price' in loaded and loaded['price'] != price:
+        PriceHistory.objects.create(product=instance, price=price)
+    loaded['price'] = price
+    if 'category_id' not in loaded:
+        return
+    old_category_id = loaded['category_id']
+    if old_category_id != instance.category_id:
+        Category.adjust_product_count(old_category_id, -1)
+        Category.adjust_product_count(instance.category_id, 1)
+    loaded['category_id'] = instance.category_id
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Delivery)
+def publish_change(sender, instance, created, **kwargs):
+    """Событие outbox; выполняется внутри транзакции OutboxMixin.save."""
+    if created:
+        OutboxEvent.publish(instance, 'created')
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    previous = {
+        name: loaded[name] for name in ('price', 'quantity')
+        if name in loaded and loaded[name] != getattr(instance, name)
+    }
+    if previous:
+        OutboxEvent.publish(instance, 'updated', previous=previous)
+    else:
+        OutboxEvent.publish(instance, 'updated')
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Delivery)
+def publish_delete(sender, instance, **kwargs):
+    # post_delete отправляется внутри транзакции удаления (Collector)
+    OutboxEvent.publish(instance, 'deleted')
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    invalidate_product_card(instance.pk)
+    Category.adjust_product_count(instance.category_id, -1)
+    SupplierStats.product_changed(instance.supplier_id, instance.quantity, None, None)
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    # Товары удаляемой категории уходят в SET_NULL без сигналов,
+    # поэтому снимаем их со счётчиков предков заранее.
+    # Путь и счётчик — из БД: экземпляр мог устареть
+    row = Category.objects.filter(pk=instance.pk).values_list('path', 'product_count').first()
+    if row is None:
+        return
+    path, product_count = row
+    ancestor_ids = [int(part) for part in path.split('/')[:-2]]
+    if ancestor_ids and product_count:
+        Category.objects.filter(pk__in=ancestor_ids).update(
+            product_count=F('product_count') - product_count
+        )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Supplier)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def catalog_changed(sender, **kwargs):
+    # ETag страниц каталога (store.http_cache.catalog_states)
+    CatalogVersion.bump()
+
+
+# Названия, которые выгрузка товаров берёт из связанных таблиц:
+# модель -> (поле названия, поле Product)
+RENAMED_IN_PRODUCTS = {Category: ('name', 'category'), Supplier: ('company_name', 'supplier')}
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Supplier)
+def remember_name(sender, instance, **kwargs):
+    field, _ = RENAMED_IN_PRODUCTS[sender]
+    if instance.pk:
+        instance._saved_name = (
+            sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Supplier)
+def touch_renamed_products(sender, instance, created, **kwargs):
+    # Иначе переименование не попадёт в дельту товаров (курсор по Product.updated_at)
+    field, product_field = RENAMED_IN_PRODUCTS[sender]
+    saved_name = getattr(instance, '_saved_name', None)
+    if created or saved_name is None or saved_name == getattr(instance, field):
+        return
+    Product.objects.filter(**{product_field: instance}).update(updated_at=timezone.now())
+    instance._saved_name = getattr(instance, field)
+
+
+_local = threading.local()
+
+
+@contextmanager
+def suspend_rating_refresh():
+    """Не пересчитывать рейтинг на каждый отзыв (массовое удаление пересчитает сам)."""
+    _local.suspended = True
+    try:
+        yield
+    finally:
+        _local.suspended = False
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    if getattr(_local, 'suspended', False):
+        return
+    Product.refresh_rating(instance.product_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Кэш CachedModelBackend; на создании — на случай повторного id
+    forget_user(instance.pk)
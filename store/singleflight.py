@@ -0,0 +1,65 @@
+"""Схлопывание одинаковых промахов кэша (single-flight).
+
+Если несколько потоков одновременно промахнулись по одному ключу,
+вычисление выполняет только первый, остальные ждут его результат.
+Схлопывание действует в пределах процесса-воркера.
+"""
+import threading
+
+from django.core.cache import cache
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            call.done.set()
+            with self._lock:
+                del self._calls[key]
+        return call.result
+
+
+flight = SingleFlight()
+
+
+def cached_call(key, fn, timeout):
+    """cache.get(key), а при промахе — одно вычисление fn на все ожидающие потоки."""
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    def compute():
+        value = cache.get(key)
+        if value is None:
+            value = fn()
+            cache.set(key, value, timeout)
+        return value
+
+    return flight.do(key, compute)
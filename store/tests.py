@@ -1,3 +1,1404 @@
-from django.test import TestCase
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin import helpers
+from django.contrib.auth.hashers import ScryptPasswordHasher, check_password, get_hasher, make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core import signing
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command, load_command_class
+from django.template.loader import render_to_string
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+try:
+    from prometheus_client.parser import text_string_to_metric_families
+except ImportError:
+    pass
+
+from . import guest_cart
+from .adjustments import adjust, preview, product_scope
+from .carriers import STATUS_IN_TRANSIT, STATUS_PICKUP, STATUS_PROCESSING, LocalStubCarrier
+from .exports import CURSOR_HEADER, HAS_MORE_HEADER, Delta, DeltaError, decode_cursor
+from .facets import parse_filters
+from .fragments import card_key, render_product_cards
+from .metrics import prometheus_client
+from .middleware import CompressionMiddleware, brotli
+from .outbox import relay_batch
+from .prices import previous_price, price_chart, prices_at
+from .profiling import StackSampler, list_profiles
+from .purge import POLICIES, run_policy
+from .ratelimit import ratelimit, take_token
+from .recommendations import refresh
+from .singleflight import cached_call, flight
+from .models import (
+    Cart, CartItem, CatalogVersion, Category, Delivery, Order, OrderItem, OutboxCursor, OutboxEvent, Payment,
+    PriceHistory, Product, ProductAdjustment, ProductNeighbor, Review, Supplier, SupplierStats, TrackingBlock,
+    TrackingCounter, User,
+)
+
+
+class ApiQueryCountTests(TestCase):
+    """Число запросов API не должно зависеть от размера выдачи."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='buyer@example.com', username='buyer', phone='1', password='secret'
+        )
+        category = Category.objects.create(name='Книги')
+        supplier = Supplier.objects.create(company_name='ООО Тест', inn='123', phone='1')
+        cls.products = [
+            Product.objects.create(
+                name=f'Товар {i}', category=category, supplier=supplier, price='10.50', quantity=i
+            )
+            for i in range(30)
+        ]
+        cart = Cart.objects.create(user=cls.user)
+        for product in cls.products[:5]:
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+        for i in range(10):
+            order = Order.objects.create(user=cls.user, cart=cart, status='оплачен', total_price='105.00')
+            OrderItem.snapshot(order, cart)
+            Payment.objects.create(order=order, method='test', amount='105.00', status='успешно')
+            Delivery.objects.create(
+                order=order, tracking_number=f'T-{i}', delivery_address='-', delivery_status='-'
+            )
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_product_list_single_query(self):
+        with self.assertNumQueries(1):
+            data = self.get_json(reverse('api_product_list'), include='category,supplier', limit=20)
+        self.assertEqual(len(data['data']), 20)
+        self.assertEqual(data['data'][0]['category']['name'], 'Книги')
+        self.assertEqual(data['data'][0]['price'], '10.50')
+
+        with self.assertNumQueries(1):
+            rest = self.get_json(reverse('api_product_list'), cursor=data['next_cursor'], limit=20)
+        self.assertEqual(len(rest['data']), 10)
+        self.assertIsNone(rest['next_cursor'])
+
+    def test_product_sparse_fields(self):
+        data = self.get_json(reverse('api_product_list'), fields='name,price', limit=1)
+        self.assertEqual(set(data['data'][0]), {'id', 'name', 'price'})
+
+    def test_unknown_category_gives_empty_result(self):
+        data = self.get_json(reverse('api_product_list'), category=Category.objects.latest('pk').pk + 1)
+        self.assertEqual(data['data'], [])
+
+    def test_non_finite_price_ignored(self):
+        for value in ('NaN', 'sNaN', 'Infinity', '-inf'):
+            self.assertIsNone(parse_filters({'price_min': value})['price_min'])
+            self.assertTrue(self.get_json(reverse('api_product_list'), price_min=value)['data'])
+            self.assertEqual(self.client.get(reverse('product_list'), {'price_max': value}).status_code, 200)
+
+    def test_unknown_field_rejected(self):
+        response = self.client.get(reverse('api_product_list'), {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cart_requires_login(self):
+        self.assertEqual(self.client.get(reverse('api_cart')).status_code, 401)
+
+    def test_cart_bounded_queries(self):
+        self.client.force_login(self.user)
+        # пользователь (сессия — из кэша), корзина, позиции с товарами
+        with self.assertNumQueries(3):
+            data = self.get_json(reverse('api_cart'))
+        self.assertEqual(len(data['data']['items']), 5)
+        self.assertEqual(data['data']['total_price'], '105.00')
+
+    def test_order_list_bounded_queries(self):
+        self.client.force_login(self.user)
+        # пользователь, заказы с оплатой и доставкой, позиции
+        with self.assertNumQueries(3):
+            data = self.get_json(reverse('api_order_list'), include='payment,delivery,items')
+        self.assertEqual(len(data['data']), 10)
+        self.assertEqual(len(data['data'][0]['items']), 5)
+        self.assertEqual(data['data'][0]['payment']['status'], 'успешно')
+
+    def test_add_cart_item(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('api_cart_item_create'),
+            json.dumps({'product': self.products[0].pk, 'quantity': 3}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            CartItem.objects.get(cart__user=self.user, product=self.products[0]).quantity, 5
+        )
+
+    def test_product_detail_single_query(self):
+        with self.assertNumQueries(1):
+            data = self.get_json(reverse('api_product_detail', args=[self.products[0].pk]), include='category')
+        self.assertEqual(data['data']['category']['name'], 'Книги')
+
+    def test_order_detail_bounded_queries(self):
+        self.client.force_login(self.user)
+        order = Order.objects.filter(user=self.user).first()
+        # пользователь, заказ с оплатой и доставкой, позиции
+        with self.assertNumQueries(3):
+            data = self.get_json(reverse('api_order_detail', args=[order.pk]), include='payment,delivery,items')
+        self.assertEqual(len(data['data']['items']), 5)
+
+    def test_cart_item_update_and_delete_bounded_queries(self):
+        self.client.force_login(self.user)
+        item = CartItem.objects.filter(cart__user=self.user).first()
+        url = reverse('api_cart_item_detail', args=[item.pk])
+        # пользователь, позиция с корзиной, UPDATE позиции, UPDATE корзины, позиции корзины
+        with self.assertNumQueries(5):
+            response = self.client.patch(url, json.dumps({'quantity': 4}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(5):
+            response = self.client.delete(url)
+        self.assertEqual(len(json.loads(response.content)['data']['items']), 4)
+
+    def test_missing_objects_are_json_404(self):
+        self.client.force_login(self.user)
+        for url in (
+            reverse('api_product_detail', args=[0]),
+            reverse('api_order_detail', args=[0]),
+            reverse('api_cart_item_detail', args=[0]),
+        ):
+            response = self.client.delete(url) if 'cart' in url else self.client.get(url)
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertIn('error', json.loads(response.content))
+
+
+@override_settings(USER_CACHE_ALIAS='default')
+class PageQueryCountTests(TestCase):
+    """Сессия, пользователь и id корзины берутся из кэша (в тесте один процесс — LocMem достаточно)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='page@example.com', username='page', phone='1', password='secret'
+        )
+        product = Product.objects.create(name='Товар', price='10.50', quantity=5)
+        cart = Cart.objects.create(user=cls.user)
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+
+    def setUp(self):
+        # id корзин и пользователи в кэше переживают откат транзакции теста
+        cache.clear()
+
+    def test_cart_page_warm_single_query(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('cart'))
+        # только позиции корзины с товарами
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cart'))
+        self.assertEqual(len(response.context['items']), 1)
+
+    def test_password_change_drops_cached_user(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('cart'))
+        self.user.set_password('changed')
+        self.user.save()
+        response = self.client.get(reverse('cart'))
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    @override_settings(USER_CACHE_ALIAS=None)
+    def test_bulk_deactivation_without_shared_cache(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('cart'))
+        # update() идёт мимо сигналов; без общего кэша пользователь читается из БД
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.get(reverse('cart'))
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_add_to_cart_after_cart_purged_elsewhere(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('cart'))
+        # purge в другом процессе: строка удалена, id остался в кэше этого
+        Cart.objects.filter(user=self.user).delete()
+        product = Product.objects.get()
+        response = self.client.post(reverse('add_to_cart', args=[product.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(CartItem.objects.filter(cart__user=self.user, product=product).exists())
+
+
+@skipIf(prometheus_client is None, 'нужен prometheus_client')
+class CheckoutMetricsTests(TestCase):
+    """Оформление списывает остатки; /metrics видит заказ и обнулившийся товар."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='metrics@example.com', username='metrics', phone='1', password='secret'
+        )
+        cls.last = Product.objects.create(name='Последний', price='10.00', quantity=2)
+        cls.plenty = Product.objects.create(name='Много', price='5.00', quantity=5)
+        cart = Cart.objects.create(user=cls.user)
+        CartItem.objects.create(cart=cart, product=cls.last, quantity=2)
+        CartItem.objects.create(cart=cart, product=cls.plenty, quantity=1)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return {
+            (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+            for family in text_string_to_metric_families(response.content.decode())
+            for sample in family.samples
+        }
+
+    def increase(self, before, after, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        return after.get(key, 0) - before.get(key, 0)
+
+    def test_checkout_updates_stock_and_metrics(self):
+        before = self.scrape()
+        response = self.client.post(reverse('checkout'))
+        order = Order.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('order_detail', args=[order.pk]), fetch_redirect_response=False)
+        after = self.scrape()
+
+        self.assertEqual(self.increase(before, after, 'marketplace_checkouts_total', result='success'), 1)
+        self.assertEqual(self.increase(before, after, 'marketplace_stock_outs_total'), 1)
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'quantity')), {'Последний': 0, 'Много': 4}
+        )
+
+    def test_order_keeps_its_items(self):
+        self.client.post(reverse('checkout'))
+        order = Order.objects.get(user=self.user)
+        self.assertFalse(CartItem.objects.filter(cart__user=self.user).exists())
+        # Смена цены и удаление товара не меняют состав оформленного заказа
+        Product.objects.filter(pk=self.plenty.pk).update(price='7.00')
+        self.last.delete()
+        response = self.client.get(reverse('order_detail', args=[order.pk]))
+        self.assertEqual(
+            [(item.name, item.price, item.quantity) for item in response.context['items']],
+            [('Последний', Decimal('10.00'), 2), ('Много', Decimal('5.00'), 1)],
+        )
+
+    def test_checkout_without_stock_rolls_back(self):
+        CartItem.objects.filter(product=self.last).update(quantity=3)
+        before = self.scrape()
+        response = self.client.post(reverse('checkout'))
+        self.assertRedirects(response, reverse('cart'), fetch_redirect_response=False)
+        after = self.scrape()
+
+        self.assertEqual(self.increase(before, after, 'marketplace_checkouts_total', result='out_of_stock'), 1)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'quantity')), {'Последний': 2, 'Много': 5}
+        )
+
+
+class PriceHistoryTests(TestCase):
+    """Цена на момент T, предыдущая цена и прореживание графика."""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.product = Product.objects.create(name='Товар', price='10.00', quantity=1)
+        PriceHistory.objects.filter(product=self.product).update(valid_from=self.now - timedelta(days=10))
+        for days, price in ((5, '12.00'), (1, '15.00')):
+            PriceHistory.objects.create(product=self.product, price=price, valid_from=self.now - timedelta(days=days))
+
+    def test_prices_at(self):
+        newer = Product.objects.create(name='Новый', price='1.00', quantity=1)
+        ids = [self.product.pk, newer.pk]
+        self.assertEqual(
+            prices_at(ids, self.now - timedelta(days=7)), {self.product.pk: Decimal('10.00'), newer.pk: None}
+        )
+        self.assertEqual(prices_at(ids, self.now - timedelta(days=5))[self.product.pk], Decimal('12.00'))
+        self.assertEqual(prices_at(ids, self.now)[self.product.pk], Decimal('15.00'))
+
+    def test_previous_price(self):
+        self.assertEqual(previous_price(self.product.pk), Decimal('12.00'))
+        single = Product.objects.create(name='Без изменений', price='1.00', quantity=1)
+        self.assertIsNone(previous_price(single.pk))
+
+    def test_chart(self):
+        chart = price_chart(self.product.pk, days=7, points=200)
+        self.assertEqual(chart['interval'], 'hour')
+        self.assertEqual(chart['opening'], Decimal('10.00'))
+        self.assertEqual(
+            [(p['low'], p['changes']) for p in chart['points']], [(Decimal('12.00'), 1), (Decimal('15.00'), 1)]
+        )
+
+    def test_chart_respects_points(self):
+        PriceHistory.objects.bulk_create([
+            PriceHistory(
+                product=self.product, price=Decimal(20 + month), valid_from=self.now - timedelta(days=30 * month)
+            )
+            for month in range(12, 120)
+        ])
+        chart = price_chart(self.product.pk, days=3650, points=10)
+        self.assertLessEqual(len(chart['points']), 10)
+        # 108 помесячных изменений и три из setUp
+        self.assertEqual(sum(p['changes'] for p in chart['points']), 111)
+        self.assertEqual(chart['points'][0]['high'], Decimal(20 + 119))
+
+
+class CategoryTreeTests(TestCase):
+    """Materialized path, перенос поддерева и счётчики товаров поддерева."""
+
+    def setUp(self):
+        self.books = Category.objects.create(name='Книги')
+        self.prose = Category.objects.create(name='Проза', parent=self.books)
+        self.novels = Category.objects.create(name='Романы', parent=self.prose)
+        self.music = Category.objects.create(name='Музыка')
+        Product.objects.create(name='Сборник', category=self.prose, price='1.00', quantity=1)
+        for i in range(2):
+            Product.objects.create(name=f'Роман {i}', category=self.novels, price='1.00', quantity=1)
+
+    def tree(self):
+        return {
+            name: (path, depth, count)
+            for name, path, depth, count in Category.objects.values_list('name', 'path', 'depth', 'product_count')
+        }
+
+    def test_path_and_depth_on_create(self):
+        books, prose, novels = (f'{c.pk:010d}/' for c in (self.books, self.prose, self.novels))
+        tree = self.tree()
+        self.assertEqual(tree['Книги'], (books, 0, 3))
+        self.assertEqual(tree['Проза'], (books + prose, 1, 3))
+        self.assertEqual(tree['Романы'], (books + prose + novels, 2, 2))
+        self.assertEqual(list(self.books.get_descendants()), [self.books, self.prose, self.novels])
+
+    def test_move_subtree(self):
+        self.prose.parent = self.music
+        self.prose.save()
+        music, prose, novels = (f'{c.pk:010d}/' for c in (self.music, self.prose, self.novels))
+        tree = self.tree()
+        self.assertEqual(tree['Книги'][2], 0)
+        self.assertEqual(tree['Музыка'], (music, 0, 3))
+        self.assertEqual(tree['Проза'], (music + prose, 1, 3))
+        self.assertEqual(tree['Романы'], (music + prose + novels, 2, 2))
+
+    def test_move_into_own_descendant_rejected(self):
+        before = self.tree()
+        self.prose.parent = self.novels
+        with self.assertRaises(ValueError):
+            self.prose.save()
+        self.assertEqual(self.tree(), before)
+
+    def test_counts_follow_products(self):
+        novel = Product.objects.filter(category=self.novels).first()
+        novel.category = self.music
+        novel.save()
+        Product.objects.filter(category=self.prose).first().delete()
+        counts = {name: count for name, (path, depth, count) in self.tree().items()}
+        self.assertEqual(counts, {'Книги': 1, 'Проза': 1, 'Романы': 1, 'Музыка': 1})
+
+        # Удаление категории снимает её товары со счётчиков предков
+        self.novels.delete()
+        self.assertEqual(self.tree()['Книги'][2], 0)
+
+        Category.objects.update(product_count=7)
+        Category.rebuild_tree()
+        counts = {name: count for name, (path, depth, count) in self.tree().items()}
+        self.assertEqual(counts, {'Книги': 0, 'Проза': 0, 'Музыка': 1})
+
+    def test_catalog_counts(self):
+        facets = self.client.get(reverse('product_list')).context['facets']['categories']
+        self.assertEqual({f['label']: f['count'] for f in facets}, {'Книги': 3, 'Музыка': 0})
+        # С другими фильтрами — из GROUP BY, а не из product_count
+        Product.objects.filter(category=self.prose).update(quantity=0)
+        facets = self.client.get(reverse('product_list'), {'in_stock': '1'}).context['facets']['categories']
+        self.assertEqual({f['label']: f['count'] for f in facets}, {'Книги': 2, 'Музыка': 0})
+
+
+class CatalogConditionTests(TestCase):
+    """ETag каталога — одна строка CatalogVersion, поднимается после COMMIT."""
+
+    def test_conditional_get_reads_single_row(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                Category.objects.create(name='Книги')
+                Product.objects.create(name='Товар', price='10.00', quantity=1)
+        # Одно повышение версии на транзакцию
+        self.assertEqual(len(callbacks), 1)
+
+        etag = self.client.get(reverse('product_list'))['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Тест идёт в одной транзакции, поэтому COMMIT следующей изображаем сами
+        CatalogVersion._increment()
+        response = self.client.get(reverse('product_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductConditionTests(TestCase):
+    """ETag товара не читает его отзывы, но меняется от отзывов и голосов «полезно»."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='voter@example.com', username='voter', phone='1', password='secret'
+        )
+        cls.product = Product.objects.create(name='Товар', price='10.00', quantity=1)
+        cls.reviews = [
+            Review.objects.create(product=cls.product, user=cls.user, rating=star, text='Отзыв')
+            for star in range(1, 6)
+        ]
+        Product.objects.filter(pk=cls.product.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('product_detail', args=[self.product.pk]), **headers)
+
+    def test_conditional_get_independent_of_reviews(self):
+        etag = self.get()['ETag']
+        # товар с категорией и поставщиком + соседи
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get(etag).status_code, 304)
+
+    def test_helpful_vote_changes_etag(self):
+        self.client.force_login(self.user)
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(etag).status_code, 304)
+        self.client.post(reverse('review_helpful', args=[self.reviews[0].pk]))
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_review_delete_changes_etag(self):
+        etag = self.get()['ETag']
+        self.reviews[0].delete()
+        self.assertEqual(self.get(etag).status_code, 200)
+
+
+class ProductCardCacheTests(TestCase):
+    """Карточки читаются из кэша, пока не изменились товар, категория или поставщик."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Книги')
+        cls.product = Product.objects.create(name='Товар', price='10.00', quantity=1, category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self):
+        products = Product.objects.select_related('category', 'supplier').filter(pk=self.product.pk)
+        with mock.patch('store.fragments.render_to_string', wraps=render_to_string) as render:
+            cards = render_product_cards(products)
+        return cards, render.call_count
+
+    def test_hit_and_miss(self):
+        cards, renders = self.render()
+        self.assertEqual(renders, 1)
+        self.assertIn('Товар', cards[0])
+        self.assertEqual(self.render(), (cards, 0))
+
+    def test_product_save_invalidates(self):
+        self.render()
+        self.product.name = 'Новое имя'
+        self.product.save()
+        self.assertIsNone(cache.get(card_key(self.product.pk)))
+        cards, renders = self.render()
+        self.assertEqual(renders, 1)
+        self.assertIn('Новое имя', cards[0])
+
+    def test_category_change_invalidates(self):
+        self.render()
+        Category.objects.filter(pk=self.category.pk).update(updated_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(self.render()[1], 1)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Brotli для JSON, gzip для HTML, маленькие и уже сжатые ответы не трогаем."""
+
+    body = json.dumps([{'name': 'Товар', 'price': '10.00'}] * 50).encode()
+
+    def respond(self, accept, content_type='application/json', body=None):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        response = HttpResponse(self.body if body is None else body, content_type=content_type)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    @skipIf(brotli is None, 'нужен brotli')
+    def test_brotli_for_json(self):
+        response = self.respond('gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(brotli.decompress(response.content), self.body)
+
+    def test_gzip_without_brotli(self):
+        response = self.respond('gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_html_always_gzip(self):
+        response = self.respond('gzip, br', content_type='text/html; charset=utf-8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_small_response_skipped(self):
+        response = self.respond('gzip, br', body=b'{}')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, b'{}')
+
+    def test_compressed_type_skipped(self):
+        response = self.respond('gzip, br', content_type='application/vnd.apache.parquet')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.body)
+
+
+class GuestCartTests(TestCase):
+    """Корзина гостя: подпись и размер cookie, лимит позиций, перенос при входе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='buyer@example.com', username='buyer', phone='1', password='secret'
+        )
+        cls.first = Product.objects.create(name='Первый', price='10.00', quantity=5)
+        cls.second = Product.objects.create(name='Второй', price='20.00', quantity=5)
+
+    def signed(self, cart):
+        return signing.dumps({str(pk): quantity for pk, quantity in cart.items()}, salt=guest_cart.COOKIE_SALT)
+
+    def load(self, raw):
+        request = RequestFactory().get('/')
+        request.COOKIES[guest_cart.COOKIE_NAME] = raw
+        return guest_cart.load(request)
+
+    def test_add_without_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('add_to_cart', args=[self.first.pk]))
+        self.assertEqual(self.load(response.cookies[guest_cart.COOKIE_NAME].value), {self.first.pk: 1})
+
+    def test_tampered_cookie_ignored(self):
+        raw = self.signed({self.first.pk: 1})
+        payload, signature = raw.rsplit(':', 1)
+        forged = signing.dumps({str(self.first.pk): 99}, salt=guest_cart.COOKIE_SALT, key='not-the-secret')
+        self.assertEqual(self.load(raw), {self.first.pk: 1})
+        self.assertEqual(self.load(forged), {})
+        self.assertEqual(self.load(payload + ':' + signature[::-1]), {})
+        self.assertEqual(self.load('не cookie'), {})
+
+    def test_oversized_cookie_ignored(self):
+        self.assertEqual(self.load('x' * (guest_cart.MAX_COOKIE_SIZE + 1)), {})
+        # подписанная, но с лишними позициями — обрезается до MAX_ITEMS
+        cart = {pk: 1 for pk in range(1, guest_cart.MAX_ITEMS + 11)}
+        self.assertEqual(len(self.load(self.signed(cart))), guest_cart.MAX_ITEMS)
+
+    def test_max_items(self):
+        cart = {pk: 1 for pk in range(1, guest_cart.MAX_ITEMS + 1)}
+        self.assertFalse(guest_cart.add(cart, guest_cart.MAX_ITEMS + 1))
+        self.assertEqual(len(cart), guest_cart.MAX_ITEMS)
+        self.assertTrue(guest_cart.add(cart, 1))
+        self.assertEqual(cart[1], 2)
+
+    def test_merge_on_login(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.first, quantity=2)
+        self.client.cookies[guest_cart.COOKIE_NAME] = self.signed(
+            {self.first.pk: 3, self.second.pk: 1, self.second.pk + 100: 1}
+        )
+        response = self.client.post(reverse('login'), {'username': 'buyer@example.com', 'password': 'secret'})
+        self.assertRedirects(response, reverse('product_list'), fetch_redirect_response=False)
+        self.assertEqual(response.cookies[guest_cart.COOKIE_NAME].value, '')
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity')),
+            {self.first.pk: 5, self.second.pk: 1},
+        )
+
+
+class PurgeTests(TestCase):
+    """Брошенные корзины удаляются пачками по сроку последнего изменения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(email=f'cart{n}@example.com', username=f'cart{n}', phone=str(n))
+            for n in range(5)
+        ]
+        cls.carts = [Cart.objects.create(user=user) for user in cls.users]
+        cls.product = Product.objects.create(name='Товар', price='10.00', quantity=5)
+        CartItem.objects.create(cart=cls.carts[0], product=cls.product)
+        # у первого покупателя уже был заказ из этой же корзины
+        cls.order = Order.objects.create(user=cls.users[0], cart=cls.carts[0], status='оплачен', total_price='10.00')
+        old = timezone.now() - timedelta(days=40)
+        Cart.objects.filter(pk__in=[cart.pk for cart in cls.carts[:4]]).update(updated_at=old)
+
+    def purge(self, **options):
+        options = {'batch_size': 2, 'sleep': 0, 'max_batch_seconds': 60, **options}
+        return run_policy(POLICIES['carts'], 30, **options)
+
+    def test_dry_run_counts(self):
+        self.assertEqual(self.purge(dry_run=True).deleted, 4)
+        self.assertEqual(Cart.objects.count(), 5)
+
+    def test_abandoned_carts_purged_in_batches(self):
+        result = self.purge()
+        self.assertEqual((result.deleted, result.batches), (4, 2))
+        self.assertEqual(list(Cart.objects.values_list('pk', flat=True)), [self.carts[4].pk])
+        self.assertFalse(CartItem.objects.exists())
+        # заказ остаётся, ссылка на корзину обнуляется
+        self.order.refresh_from_db()
+        self.assertIsNone(self.order.cart_id)
+
+    def test_recently_touched_cart_kept(self):
+        self.carts[0].touch()
+        self.assertEqual(self.purge().deleted, 3)
+        self.assertTrue(Cart.objects.filter(pk=self.carts[0].pk).exists())
+
+
+class ProductAdjustmentTests(TestCase):
+    """Массовые изменения пачками оставляют тот же след, что и save() по одному."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.parent = Category.objects.create(name='Электроника')
+        cls.child = Category.objects.create(name='Телефоны', parent=cls.parent)
+        other = Category.objects.create(name='Книги')
+        cls.supplier = Supplier.objects.create(company_name='ООО Тест', inn='123', phone='1')
+        cls.products = [
+            Product.objects.create(
+                name=f'Товар {i}', category=cls.child if i % 2 else cls.parent,
+                supplier=cls.supplier, price='10.50', quantity=i,
+            )
+            for i in range(5)
+        ]
+        cls.untouched = Product.objects.create(name='Книга', category=other, price='10.50', quantity=3)
+
+    def test_preview_changes_nothing(self):
+        summary = preview(product_scope(category=self.parent), ProductAdjustment.KIND_PRICE_PERCENT, 10)
+        self.assertEqual((summary['matched'], summary['changed']), (5, 5))
+        self.assertFalse(ProductAdjustment.objects.exists())
+        self.assertEqual(PriceHistory.objects.count(), 6)
+
+    def test_price_percent(self):
+        record = adjust(
+            product_scope(category=self.parent), ProductAdjustment.KIND_PRICE_PERCENT, 10, chunk_size=2,
+        )
+        self.assertEqual((record.matched, record.changed), (5, 5))
+        self.assertIsNotNone(record.finished_at)
+        prices = set(Product.objects.filter(category__isnull=False).values_list('pk', 'price'))
+        self.assertIn((self.untouched.pk, Decimal('10.50')), prices)
+        self.assertIn((self.products[0].pk, Decimal('11.55')), prices)
+        self.assertEqual(PriceHistory.objects.filter(price=Decimal('11.55')).count(), 5)
+        events = OutboxEvent.objects.filter(topic='product.updated')
+        self.assertEqual(events.count(), 5)
+        self.assertEqual(set(events.first().payload['previous']), {'price'})
+
+    def test_stock_add_keeps_supplier_stats(self):
+        SupplierStats.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            record = adjust(product_scope(supplier=self.supplier), ProductAdjustment.KIND_STOCK_ADD, -2)
+        # Товар с нулевым остатком не трогаем, остаток не уходит ниже нуля
+        self.assertEqual((record.matched, record.changed), (5, 4))
+        self.assertEqual(
+            sorted(Product.objects.filter(supplier=self.supplier).values_list('quantity', flat=True)),
+            [0, 0, 0, 1, 2],
+        )
+        stats = SupplierStats.objects.get(pk=self.supplier)
+        incremental = (stats.total_stock, stats.low_stock_count)
+        SupplierStats.rebuild()
+        stats.refresh_from_db()
+        self.assertEqual(incremental, (stats.total_stock, stats.low_stock_count))
+
+    @override_settings(BULK_ADJUST_ADMIN_LIMIT=3)
+    def test_large_admin_selection_deferred(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse('admin:store_product_changelist'), {
+            'action': 'adjust_products', 'select_across': '1', 'index': '0',
+            helpers.ACTION_CHECKBOX_NAME: [self.products[0].pk],
+            'kind': ProductAdjustment.KIND_PRICE_PERCENT, 'value': '10', 'apply': '1',
+        })
+        self.assertEqual(response.status_code, 302)
+        record = ProductAdjustment.objects.get()
+        self.assertIsNone(record.finished_at)
+        self.assertEqual(len(record.scope['ids']), 6)
+        self.assertFalse(Product.objects.filter(price=Decimal('11.55')).exists())
+
+        # Прерванный запуск: первые два товара уже изменены, команда продолжает с last_id
+        record.last_id = self.products[1].pk
+        record.save()
+        call_command('adjust_products', '--pending', stdout=StringIO())
+        record.refresh_from_db()
+        self.assertIsNotNone(record.finished_at)
+        self.assertEqual(record.changed, 4)
+        self.assertEqual(
+            set(Product.objects.filter(price=Decimal('11.55')).values_list('pk', flat=True)),
+            {p.pk for p in self.products[2:]} | {self.untouched.pk},
+        )
+
+
+class SupplierStatsTests(TestCase):
+    """Сводки поставщиков: дельты применяются после COMMIT, rebuild считает с нуля."""
+
+    def setUp(self):
+        self.first = Supplier.objects.create(company_name='ООО Первый', inn='1', phone='1')
+        self.second = Supplier.objects.create(company_name='ООО Второй', inn='2', phone='1')
+
+    def stats(self):
+        return {
+            row[0]: row[1:] for row in SupplierStats.objects.values_list(
+                'pk', 'product_count', 'total_stock', 'low_stock_count', 'units_sold', 'revenue'
+            )
+        }
+
+    def test_deltas_applied_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            a = Product.objects.create(name='A', supplier=self.second, price='2.00', quantity=10)
+            b = Product.objects.create(name='B', supplier=self.first, price='3.00', quantity=3)
+            a.quantity = 4
+            a.save()
+            b.supplier = self.second
+            b.save()
+            try:
+                with transaction.atomic():
+                    Product.objects.create(name='Откат', supplier=self.first, price='1.00', quantity=1)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            # До COMMIT строки сводок не трогаются
+            self.assertFalse(SupplierStats.objects.exists())
+        # Товар B ушёл от первого поставщика, откаченный товар не учтён
+        self.assertEqual(self.stats(), {
+            self.first.pk: (0, 0, 0, 0, Decimal('0')),
+            self.second.pk: (2, 7, 2, 0, Decimal('0')),
+        })
+
+    def test_rebuild(self):
+        user = User.objects.create_user(email='stats@example.com', username='stats', phone='1')
+        with self.captureOnCommitCallbacks(execute=True):
+            a = Product.objects.create(name='A', supplier=self.first, price='2.50', quantity=8)
+            b = Product.objects.create(name='B', supplier=self.second, price='1.00', quantity=2)
+            order = Order.objects.create(user=user, status='оплачен', total_price='6.00')
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=a, name='A', price='2.50', quantity=2),
+                OrderItem(order=order, product=b, name='B', price='1.00', quantity=1),
+            ])
+            SupplierStats.record_sale(order)
+        incremental = {
+            self.first.pk: (1, 8, 0, 2, Decimal('5.00')),
+            self.second.pk: (1, 2, 1, 1, Decimal('1.00')),
+        }
+        self.assertEqual(self.stats(), incremental)
+        SupplierStats.rebuild()
+        self.assertEqual(self.stats(), incremental)
+
+        # update() мимо сигналов сводку не меняет — её исправляет rebuild
+        Product.objects.filter(pk=a.pk).update(quantity=0)
+        SupplierStats.rebuild([self.first.pk])
+        self.assertEqual(self.stats()[self.first.pk], (1, 0, 1, 2, Decimal('5.00')))
+
+
+class CollectingSink:
+    name = 'test'
+
+    def __init__(self):
+        self.ids = []
+
+    def send(self, events):
+        self.ids.extend(event.id for event in events)
+
+
+class OutboxRelayTests(TestCase):
+    """Позиция приёмника не перескакивает id, который ещё может закоммититься."""
+
+    def publish(self, **kwargs):
+        return OutboxEvent.objects.create(topic='test.created', object_id=1, **kwargs)
+
+    def setUp(self):
+        self.first, self.middle, self.last = self.publish(), self.publish(), self.publish()
+        # Последовательности id не откатываются вместе с тестом
+        OutboxCursor.objects.create(sink='test', last_id=self.first.id - 1)
+
+    def test_out_of_order_commit_is_delivered(self):
+        first, last, late_id = self.first, self.last, self.middle.id
+        # late_id выдан раньше last, но его транзакция ещё не зафиксирована
+        self.middle.delete()
+        sink = CollectingSink()
+        relay_batch(sink, batch_size=10)
+        self.assertEqual(sink.ids, [first.id])
+
+        self.publish(id=late_id)
+        relay_batch(sink, batch_size=10)
+        self.assertEqual(sink.ids, [first.id, late_id, last.id])
+        self.assertEqual(OutboxCursor.objects.get(sink='test').last_id, last.id)
+
+    def test_old_gap_is_skipped(self):
+        first, last = self.first, self.last
+        # Откатившаяся транзакция оставляет дыру навсегда
+        self.middle.delete()
+        OutboxEvent.objects.filter(pk=last.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        sink = CollectingSink()
+        relay_batch(sink, batch_size=10)
+        self.assertEqual(sink.ids, [first.id, last.id])
+
+
+class RateLimitTests(SimpleTestCase):
+    """Ведро пополняется со временем, при пустом ведре view отвечает 429."""
+
+    def setUp(self):
+        caches['ratelimit'].clear()
+
+    def test_bucket_refills(self):
+        self.assertEqual(take_token('rl:test', '2/m', now=0), (True, 0))
+        self.assertEqual(take_token('rl:test', '2/m', now=0), (True, 0))
+        allowed, retry_after = take_token('rl:test', '2/m', now=0)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 30)
+        # через 30 секунд в ведре снова один токен
+        self.assertEqual(take_token('rl:test', '2/m', now=30), (True, 0))
+        self.assertFalse(take_token('rl:test', '2/m', now=30)[0])
+
+    @override_settings(RATE_LIMITS={'test': {'ip': '2/m'}})
+    def test_view_returns_429(self):
+        view = ratelimit('test')(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        self.assertEqual(view(request).status_code, 200)
+        self.assertEqual(view(request).status_code, 200)
+        response = view(request)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(int(response['Retry-After']), 30)
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Одновременные промахи по одному ключу вычисляются один раз."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_load_once(self):
+        release = threading.Event()
+        calls = []
+
+        def load():
+            calls.append(1)
+            release.wait(5)
+            return 'value'
+
+        results = []
+
+        def worker():
+            results.append(cached_call('sf:test', load, 60))
+
+        leader = threading.Thread(target=worker)
+        leader.start()
+        while 'sf:test' not in flight._calls:
+            time.sleep(0.001)
+        followers = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in followers:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 6)
+        self.assertEqual(cache.get('sf:test'), 'value')
+
+
+class PasswordHasherTests(SimpleTestCase):
+    """Параметры scrypt берутся из settings, старые хеши пересчитываются при входе."""
+
+    def test_params_from_settings(self):
+        hasher = get_hasher()
+        self.assertEqual(hasher.algorithm, 'scrypt')
+        encoded = make_password('secret')
+        decoded = hasher.decode(encoded)
+        params = settings.PASSWORD_HASHER_PARAMS['scrypt']
+        self.assertEqual(
+            (decoded['work_factor'], decoded['block_size'], decoded['parallelism']),
+            (params['work_factor'], params['block_size'], params['parallelism']),
+        )
+        self.assertTrue(check_password('secret', encoded))
+        self.assertFalse(hasher.must_update(encoded))
+
+    def test_default_scrypt_hash_upgraded(self):
+        encoded = make_password('secret', hasher=ScryptPasswordHasher())
+        self.assertTrue(check_password('secret', encoded))
+        self.assertTrue(get_hasher().must_update(encoded))
+
+
+@override_settings(RATE_LIMITS={'login': {'user': '3/m', 'ip': '100/m'}})
+class LoginThrottleTests(TestCase):
+    """Вход блокируется после N ошибок по логину, успешный вход сбрасывает счётчик."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='login@example.com', username='login', phone='1', password='secret'
+        )
+
+    def setUp(self):
+        caches['ratelimit'].clear()
+
+    def login(self, password):
+        return self.client.post(reverse('login'), {'username': 'login@example.com', 'password': password})
+
+    def test_blocks_after_failures(self):
+        for _ in range(3):
+            self.assertEqual(self.login('wrong').status_code, 200)
+        # даже верный пароль не проверяется, пока ведро пусто
+        response = self.login('secret')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_success_resets(self):
+        for _ in range(2):
+            self.login('wrong')
+        self.assertEqual(self.login('secret').status_code, 302)
+        self.client.logout()
+        for _ in range(3):
+            self.assertEqual(self.login('wrong').status_code, 200)
+        self.assertEqual(self.login('wrong').status_code, 429)
+
+
+class TrackingBlockTests(TestCase):
+    """Блоки трек-номеров идут подряд по счётчику перевозчика."""
+
+    def test_blocks_continue_after_existing(self):
+        # Блоки, выданные до появления счётчика
+        TrackingBlock.objects.create(carrier='test', start=1, end=501)
+        carrier = LocalStubCarrier('test', PREFIX='T', BLOCK_SIZE=100)
+        self.assertEqual(carrier.reserve_block(100), (501, 601))
+        self.assertEqual(carrier.reserve_block(50), (601, 651))
+        self.assertEqual(TrackingCounter.objects.get(carrier='test').next_number, 651)
+        self.assertEqual(carrier.allocate(), 'T0000000651')
+
+
+@override_settings(CARRIERS={
+    'hook-test': {'CLASS': 'store.carriers.LocalStubCarrier', 'PREFIX': 'H', 'WEBHOOK_SECRET': 'key'},
+})
+class CarrierWebhookTests(TestCase):
+    """Вебхук принимает только статусы из STATUS_FLOW и не откатывает доставку назад."""
+
+    def setUp(self):
+        user = User.objects.create_user(email='hook@example.com', username='hook', phone='1')
+        self.deliveries = {}
+        for number, status in (('H1', STATUS_PROCESSING), ('H2', STATUS_PICKUP)):
+            order = Order.objects.create(user=user, status='оплачен', total_price='1.00')
+            self.deliveries[number] = Delivery.objects.create(
+                order=order, carrier='hook-test', tracking_number=number, delivery_address='-',
+                delivery_status=status,
+            )
+
+    def post(self, updates):
+        body = json.dumps({'updates': [
+            {'tracking_number': number, 'status': status} for number, status in updates.items()
+        ]}).encode()
+        return self.client.post(
+            reverse('carrier_webhook', args=['hook-test']), body, content_type='application/json',
+            HTTP_X_CARRIER_SIGNATURE=hmac.new(b'key', body, hashlib.sha256).hexdigest(),
+        )
+
+    def statuses(self):
+        return dict(Delivery.objects.values_list('tracking_number', 'delivery_status'))
+
+    def test_unknown_status_rejected(self):
+        response = self.post({'H1': STATUS_IN_TRANSIT, 'H2': 'x' * 100})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.statuses(), {'H1': STATUS_PROCESSING, 'H2': STATUS_PICKUP})
+
+    def test_backward_transition_skipped(self):
+        response = self.post({'H1': STATUS_IN_TRANSIT, 'H2': STATUS_IN_TRANSIT})
+        self.assertEqual(json.loads(response.content), {'changed': 1, 'skipped': 1})
+        self.assertEqual(self.statuses(), {'H1': STATUS_IN_TRANSIT, 'H2': STATUS_PICKUP})
+
+
+class DeltaParamsTests(SimpleTestCase):
+    """Некорректные since и курсор — DeltaError (400), а не 500."""
+
+    def test_invalid_since(self):
+        for since in ('вчера', '2024-13-01T00:00:00', '2024-02-30'):
+            with self.assertRaises(DeltaError):
+                Delta({'since': since})
+
+    def test_invalid_cursor(self):
+        for stamp in ('2024-13-01T00:00:00~5', 'не дата~5', '2024-01-01T00:00:00~x'):
+            cursor = base64.urlsafe_b64encode(stamp.encode()).decode()
+            with self.assertRaises(DeltaError):
+                Delta({'cursor': cursor})
+
+
+class ExportDeltaTests(TestCase):
+    """Дельта товаров: свежие строки ждут EXPORT_DELTA_LAG, переименования попадают в неё."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Книги')
+        self.supplier = Supplier.objects.create(company_name='ООО Тест', inn='123', phone='1')
+        self.product = Product.objects.create(
+            name='Товар', category=self.category, supplier=self.supplier, price='10.00', quantity=1
+        )
+        self.since = timezone.now()
+
+    def delta_ids(self):
+        delta = Delta({'since': self.since.isoformat()})
+        return [product.pk for product in delta.rows(delta.apply(Product.objects.all()))]
+
+    @override_settings(EXPORT_DELTA_LAG=0)
+    def test_rename_reaches_product_delta(self):
+        self.assertEqual(self.delta_ids(), [])
+        self.category.name = 'Книги и журналы'
+        self.category.save()
+        self.assertEqual(self.delta_ids(), [self.product.pk])
+
+        self.since = timezone.now()
+        self.supplier.phone = '2'
+        self.supplier.save()
+        self.assertEqual(self.delta_ids(), [])
+        self.supplier.company_name = 'ООО Новое'
+        self.supplier.save()
+        self.assertEqual(self.delta_ids(), [self.product.pk])
+
+    def test_fresh_rows_wait_for_lag(self):
+        self.since -= timedelta(hours=1)
+        self.assertEqual(self.delta_ids(), [])
+        Product.objects.filter(pk=self.product.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.delta_ids(), [self.product.pk])
+
+    def test_full_export_keeps_fresh_rows(self):
+        settled = timezone.now() - timedelta(minutes=5)
+        Product.objects.filter(pk=self.product.pk).update(updated_at=settled)
+        fresh = Product.objects.create(name='Свежий', price='1.00', quantity=1)
+        delta = Delta({})
+        self.assertEqual([p.pk for p in delta.rows(delta.apply(Product.objects.all()))], [self.product.pk, fresh.pk])
+        # Курсор — до границы: свежая строка придёт и со следующей дельтой
+        self.assertEqual(delta.last, (settled, self.product.pk))
+
+    def test_etag_follows_lag_horizon(self):
+        user = User.objects.create_user(email='export@example.com', username='export', phone='1')
+        self.client.force_login(user)
+        url = reverse('export_products_json')
+        params = {'since': (self.since - timedelta(hours=1)).isoformat()}
+        response = self.client.get(url, params)
+        self.assertEqual(json.loads(response.content), [])
+        # Граница прошла (строка не менялась) — старый ETag больше не подходит
+        with override_settings(EXPORT_DELTA_LAG=0):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in json.loads(response.content)], [self.product.pk])
+
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+@skipIf(pyarrow is None, 'нужен pyarrow')
+class ColumnarExportTests(TestCase):
+    """Parquet и Arrow IPC читаются обратно с типами, курсор ведёт по страницам."""
+
+    def setUp(self):
+        user = User.objects.create_user(email='columnar@example.com', username='columnar', phone='1')
+        self.client.force_login(user)
+        category = Category.objects.create(name='Книги')
+        self.products = [
+            Product.objects.create(name=f'Товар {i}', category=category, price=f'{i}.25', quantity=i)
+            for i in range(3)
+        ]
+        # Дельта отдаёт только строки старше EXPORT_DELTA_LAG
+        settled = timezone.now() - timedelta(minutes=5)
+        for i, product in enumerate(self.products):
+            Product.objects.filter(pk=product.pk).update(updated_at=settled + timedelta(seconds=i))
+
+    def fetch(self, fmt, **params):
+        response = self.client.get(reverse(f'export_products_{fmt}'), params)
+        self.assertEqual(response.status_code, 200)
+        sink = pyarrow.BufferReader(b''.join(response.streaming_content))
+        if fmt == 'parquet':
+            table = pyarrow.parquet.read_table(sink)
+        else:
+            table = pyarrow.ipc.open_file(sink).read_all()
+        return table, response
+
+    def test_round_trip(self):
+        for fmt in ('parquet', 'arrow'):
+            with self.subTest(fmt=fmt):
+                table, response = self.fetch(fmt, limit=2)
+                self.assertEqual(table.schema.field('price').type, pyarrow.decimal128(10, 2))
+                self.assertEqual(table.schema.field('updated_at').type, pyarrow.timestamp('us', tz='UTC'))
+                self.assertEqual(table.schema.field('category_name').type, pyarrow.string())
+                self.assertEqual(table.num_rows, 2)
+                self.assertEqual(table.column('price').to_pylist(), [Decimal('0.25'), Decimal('1.25')])
+                self.assertEqual(response[HAS_MORE_HEADER], '1')
+
+                table, response = self.fetch(fmt, cursor=response[CURSOR_HEADER], limit=2)
+                self.assertEqual(table.column('id').to_pylist(), [self.products[2].pk])
+                self.assertEqual(response[HAS_MORE_HEADER], '0')
+                updated_at = Product.objects.get(pk=self.products[2].pk).updated_at
+                self.assertEqual(decode_cursor(response[CURSOR_HEADER]), (updated_at, self.products[2].pk))
+
+
+try:
+    import numpy  # noqa: F401
+    import scipy  # noqa: F401
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+
+@skipIf(not HAS_SCIPY, 'нужны numpy и scipy')
+class RecommendationTests(TestCase):
+    """Счётчики совместных покупок, порядок top-K и инкрементальный пересчёт."""
+
+    def setUp(self):
+        self.products = {
+            name: Product.objects.create(name=name, price='1.00', quantity=100) for name in 'ABCDE'
+        }
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.state_dir.cleanup)
+        self.orders = 0
+
+    def order(self, names, times=1):
+        for _ in range(times):
+            self.orders += 1
+            user = User.objects.create_user(
+                email=f'rec{self.orders}@example.com', username=f'rec{self.orders}', phone='1'
+            )
+            order = Order.objects.create(user=user, status='оплачен', total_price=0)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=self.products[name], name=name, price='1.00', quantity=2)
+                for name in names
+            ])
+        # Заказы теста не «свежие»: id могут начинаться не с 1
+        Order.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+    def refresh(self, full=False, state_dir=None):
+        options = {
+            'TOP_K': 2, 'MIN_CO_COUNT': 1, 'BATCH_SIZE': 3, 'GAP_TIMEOUT': 60,
+            'STATE_DIR': state_dir or self.state_dir.name,
+        }
+        with override_settings(RECOMMENDATIONS=options):
+            return refresh(full=full)
+
+    def neighbors(self, name):
+        names = {product.pk: name for name, product in self.products.items()}
+        return [
+            (names[neighbor_id], co)
+            for neighbor_id, co in ProductNeighbor.objects.filter(product=self.products[name])
+            .order_by('-score').values_list('neighbor_id', 'co_count')
+        ]
+
+    def snapshot(self):
+        return sorted(
+            (product_id, neighbor_id, round(score, 9), co)
+            for product_id, neighbor_id, score, co in
+            ProductNeighbor.objects.values_list('product_id', 'neighbor_id', 'score', 'co_count')
+        )
+
+    def test_counts_and_top_k_order(self):
+        self.order('AB', times=3)
+        self.order('AC')
+        self.order('AD', times=2)
+        self.assertEqual(self.refresh(), (6, 4))
+        # score: B 3/√18 ≈ 0.71, D 2/√12 ≈ 0.58, C 1/√6 ≈ 0.41; в top-2 — B и D
+        self.assertEqual(self.neighbors('A'), [('B', 3), ('D', 2)])
+        self.assertEqual(self.neighbors('C'), [('A', 1)])
+
+    def test_incremental_matches_full(self):
+        self.order('AB', times=2)
+        self.order('AC')
+        self.refresh()
+        # C в новых заказах нет, но его сосед A стал популярнее — оценка C→A падает
+        self.order('AE', times=3)
+        self.refresh()
+        incremental = self.snapshot()
+        with tempfile.TemporaryDirectory() as state_dir:
+            self.refresh(full=True, state_dir=state_dir)
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_fresh_gap_holds_watermark(self):
+        self.order('AB', times=2)
+        self.refresh()
+        self.order('AB')
+        self.order('AC')
+        # Транзакция заказа late ещё не зафиксирована, а следующий уже виден
+        late, last = Order.objects.order_by('-pk')[:2][::-1]
+        Order.objects.filter(pk=last.pk).update(created_at=timezone.now())
+        late_id = late.pk
+        late.delete()
+        self.assertEqual(self.refresh(), (0, 0))
+
+        order = Order.objects.create(id=late_id, user=late.user, status='оплачен', total_price=0)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.products[name], name=name, price='1.00', quantity=2)
+            for name in 'AB'
+        ])
+        self.assertEqual(self.refresh()[0], 2)
+        self.assertEqual(self.neighbors('C'), [('A', 1)])
+
+
+class ProfilingTests(TestCase):
+    """Сэмплер стеков и страницы профилей; flamegraph рисуется без рекурсии."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.enterContext(override_settings(PROFILING={
+            'ENABLED': True, 'ENGINE': 'sampling', 'URL_NAMES': [], 'SAMPLE_RATE': 0,
+            'HEADER': 'X-Profile', 'DIR': self.directory, 'KEEP': 10,
+        }))
+        staff = User.objects.create_user(email='staff@example.com', username='staff', phone='1', is_staff=True)
+        self.client.force_login(staff)
+
+    def test_sampler_collects_stacks(self):
+        sampler = StackSampler(0.001)
+        sampler.start()
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+        sampler.stop()
+        lines = sampler.folded().splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+        self.assertTrue(any('test_sampler_collects_stacks (tests.py' in line for line in lines))
+
+    def test_staff_header_saves_profile(self):
+        self.assertEqual(self.client.get(reverse('product_list'), HTTP_X_PROFILE='1').status_code, 200)
+        [meta] = list_profiles()
+        self.assertEqual((meta['url_name'], meta['engine'], meta['user']), ('product_list', 'sampling', 'staff@example.com'))
+        self.assertContains(self.client.get(reverse('profile_list')), meta['id'])
+        self.assertEqual(self.client.get(reverse('profile_detail', args=[meta['id']])).status_code, 200)
+
+    def test_deep_stack_renders(self):
+        profile_id = '20260101_000000_deadbeef'
+        frames = [f'frame{i} (views.py:{i})' for i in range(300)]
+        (self.directory / f'{profile_id}.folded').write_text(
+            f"{';'.join(frames)} 3\n{';'.join(frames[:-1])} 1\n", encoding='utf-8'
+        )
+        (self.directory / f'{profile_id}.json').write_text(json.dumps({
+            'id': profile_id, 'engine': 'sampling', 'method': 'GET', 'path': '/', 'url_name': 'product_list',
+            'status': 200, 'duration_ms': 40.0, 'user': None, 'created_at': '2026-01-01T00:00:00',
+        }), encoding='utf-8')
+        response = self.client.get(reverse('profile_detail', args=[profile_id]))
+        self.assertContains(response, 'frame299 (views.py:299)')
+        rows = response.context['flame']
+        self.assertEqual(len(rows), 301)
+        self.assertEqual((rows[0][0]['width'], rows[-1][0]['width']), (100.0, 75.0))
+        self.assertAlmostEqual(rows[-1][0]['seconds'], 0.03)
+
+
+# Запускаются из cron и как воркеры: старт не должен тянуть веб-часть
+BACKGROUND_COMMANDS = [
+    'backup_db', 'restore_db', 'purge', 'export_data', 'relay_outbox', 'sync_deliveries',
+    'build_recommendations', 'adjust_products',
+]
+STARTUP_FORBIDDEN_MODULES = [
+    'store.views', 'store.forms', 'store.api', 'store.admin', 'yadisk', 'pyarrow', 'numpy', 'scipy',
+]
+STARTUP_PACKAGES = ('store', 'marketplace')
+# import time (cumulative, мкс) модулей проекта вместе со всем, что они тянут.
+# Сейчас около 40 мс; настенное время старта зависит от машины и проверяется
+# только по запросу: STARTUP_BUDGET_SECONDS=1.0 python manage.py test
+STARTUP_IMPORT_BUDGET_US = 200_000
+
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.core.cache import cache
+from django.core.management import load_command_class
+for name in sys.argv[1:]:
+    load_command_class('store', name).create_parser('manage.py', name)
+print(json.dumps({'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}))
+"""
+
+
+class LoadTestCommandTests(TestCase):
+    def test_refuses_database_with_orders(self):
+        user = User.objects.create_user(email='real@example.com', username='real', phone='1')
+        Order.objects.create(user=user, status='оплачен', total_price='1.00')
+        with self.assertRaisesMessage(CommandError, '--force'):
+            call_command('loadtest_checkout', stdout=StringIO())
+        self.assertFalse(User.objects.filter(username__startswith='loadtest-').exists())
+
+
+class StartupTimeTests(SimpleTestCase):
+    """Бюджет импорта при старте management-команд (python -X importtime)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT, *BACKGROUND_COMMANDS],
+            capture_output=True, text=True, check=True,
+        )
+        cls.startup = json.loads(result.stdout)
+        # import time: self [us] | cumulative | модуль; первая строка — заголовок
+        cls.timings = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            own, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                # Вложенность импорта — отступ имени по два пробела
+                depth = (len(name) - len(name.lstrip())) // 2
+                cls.timings.append((int(cumulative), depth, name.strip()))
+        cls.slowest = [
+            f'{cumulative:>9} us  {name}'
+            for cumulative, depth, name in sorted(cls.timings, reverse=True)[:15]
+        ]
+
+    def project_import_time(self):
+        """Сумма cumulative по внешним модулям проекта (вложенные уже учтены в них)."""
+        total = 0
+        enclosing = []
+        # importtime печатает модуль после его зависимостей; в обратном порядке родитель идёт первым
+        for cumulative, depth, name in reversed(self.timings):
+            while enclosing and enclosing[-1][0] >= depth:
+                enclosing.pop()
+            is_project = name.split('.')[0] in STARTUP_PACKAGES
+            if is_project and not any(project for d, project in enclosing):
+                total += cumulative
+            enclosing.append((depth, is_project))
+        return total
+
+    def test_heavy_modules_not_imported(self):
+        loaded = set(self.startup['modules'])
+        self.assertEqual([m for m in STARTUP_FORBIDDEN_MODULES if m in loaded], [])
+
+    def test_project_import_budget(self):
+        self.assertLess(
+            self.project_import_time(), STARTUP_IMPORT_BUDGET_US,
+            'Самые долгие импорты:\n' + '\n'.join(self.slowest),
+        )
+
+    @skipIf(not os.environ.get('STARTUP_BUDGET_SECONDS'), 'задайте STARTUP_BUDGET_SECONDS')
+    def test_startup_wall_clock(self):
+        self.assertLess(
+            self.startup['seconds'], float(os.environ['STARTUP_BUDGET_SECONDS']),
+            'Самые долгие импорты:\n' + '\n'.join(self.slowest),
+        )
+
+    def test_system_checks_skipped(self):
+        # Проверки импортируют URLconf, а с ним всё из STARTUP_FORBIDDEN_MODULES
+        for name in BACKGROUND_COMMANDS:
+            with self.subTest(name):
+                self.assertEqual(load_command_class('store', name).requires_system_checks, [])
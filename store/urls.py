@@ -1,9 +1,12 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.product_list, name='product_list'),
     path('product/<int:pk>/', views.product_detail, name='product_detail'),
+    path('product/<int:pk>/reviews/', views.product_reviews, name='product_reviews'),
+    path('product/<int:pk>/prices/', views.product_price_history, name='product_price_history'),
+    path('review/<int:pk>/helpful/', views.review_helpful, name='review_helpful'),
     path('register/', views.register, name='register'),
     path('login/', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
@@ -21,11 +24,13 @@ urlpatterns = [
 
     # Заказы
     path('cart/checkout/', views.checkout, name='checkout'),
+    path('carriers/<str:code>/webhook/', views.carrier_webhook, name='carrier_webhook'),
     path('orders/', views.order_list, name='order_list'),
     path('orders/<int:pk>/', views.order_detail, name='order_detail'),
 
     # Товары поставщика
     path('supplier/<int:pk>/', views.supplier_products, name='supplier_products'),
+    path('supplier/dashboard/', views.supplier_dashboard, name='supplier_dashboard'),
 
     # Экспорт
     path('export/products/json/', views.export_products_json, name='export_products_json'),
@@ -34,4 +39,23 @@ urlpatterns = [
     path('export/orders/csv/', views.export_orders_csv, name='export_orders_csv'),
     path('export/suppliers/json/', views.export_suppliers_json, name='export_suppliers_json'),
     path('export/suppliers/csv/', views.export_suppliers_csv, name='export_suppliers_csv'),
-]
\ No newline at end of file
+    path('export/products/parquet/', views.export_products_columnar, {'fmt': 'parquet'}, name='export_products_parquet'),
+    path('export/products/arrow/', views.export_products_columnar, {'fmt': 'arrow'}, name='export_products_arrow'),
+    path('export/orders/parquet/', views.export_orders_columnar, {'fmt': 'parquet'}, name='export_orders_parquet'),
+    path('export/orders/arrow/', views.export_orders_columnar, {'fmt': 'arrow'}, name='export_orders_arrow'),
+    path('export/suppliers/parquet/', views.export_suppliers_columnar, {'fmt': 'parquet'}, name='export_suppliers_parquet'),
+    path('export/suppliers/arrow/', views.export_suppliers_columnar, {'fmt': 'arrow'}, name='export_suppliers_arrow'),
+
+    # Профили запросов (для сотрудников)
+    path('profiles/', views.profile_list, name='profile_list'),
+    path('profiles/<str:profile_id>/', views.profile_detail, name='profile_detail'),
+
+    # JSON API v1
+    path('api/v1/products/', api.product_list, name='api_product_list'),
+    path('api/v1/products/<int:pk>/', api.product_detail, name='api_product_detail'),
+    path('api/v1/cart/', api.cart_detail, name='api_cart'),
+    path('api/v1/cart/items/', api.cart_item_create, name='api_cart_item_create'),
+    path('api/v1/cart/items/<int:pk>/', api.cart_item_detail, name='api_cart_item_detail'),
+    path('api/v1/orders/', api.order_list, name='api_order_list'),
+    path('api/v1/orders/<int:pk>/', api.order_detail, name='api_order_detail'),
+]
@@ -1,54 +1,110 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
-from .models import Product, Category, Supplier, Cart, CartItem, Order, Payment, Delivery, Review
+from .models import (
+    Product, Category, Supplier, SupplierStats, CartItem, Order, OrderItem, Payment, Delivery, Review,
+    ReviewVote, ProductNeighbor,
+)
 from .forms import UserRegistrationForm, ProductForm, ReviewForm
+from .facets import parse_filters, filter_products, build_facets
+from .http_cache import catalog_condition, product_condition, export_condition, product_version
+from .exports import (
+    PRODUCT_COLUMNS, ORDER_COLUMNS, SUPPLIER_COLUMNS, delta_export, columnar_export,
+)
+from .fragments import render_product_cards
+from . import guest_cart, profiling
+from .carriers import STATUS_PROCESSING, StatusError, apply_status_updates, get_carrier
+from .carts import get_user_cart
+from .prices import previous_price, price_chart
+from .ratelimit import failures_blocked, ratelimit, record_failure, reset_failures
+from .metrics import CHECKOUTS
+from .singleflight import cached_call
+from .reviews import REVIEW_SORTS, DEFAULT_REVIEW_SORT, CursorError, review_page, review_to_dict
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import CreateView
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 import csv
+import hashlib
+import hmac
 import json
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
 
+@catalog_condition
 def product_list(request):
-    products = Product.objects.all()
-    categories = Category.objects.all()
+    filters = parse_filters(request.GET)
+    selected_category = filters['category']
+    products = filter_products(
+        Product.objects.select_related('category', 'supplier', 'user'), filters
+    )
 
-    category_id = request.GET.get('category')
-    supplier_id = request.GET.get('supplier')
+    # В навигации только корни, ветка выбранной категории и её дочерние
+    nav_filter = Q(depth=0)
+    if selected_category:
+        nav_filter |= Q(pk__in=selected_category.get_ancestor_ids()) | Q(parent_id=selected_category.pk)
+    categories = Category.objects.filter(nav_filter).only('name', 'depth', 'path', 'product_count')
 
-    selected_category_name = None
-    selected_supplier = None
+    facets = build_facets(filters, categories)
 
-    if category_id:
-        products = products.filter(category_id=category_id)
-        try:
-            selected_category_name = Category.objects.get(id=category_id).name
-        except Category.DoesNotExist:
-            selected_category_name = None
-
-    if supplier_id:
-        products = products.filter(supplier_id=supplier_id)
-        try:
-            selected_supplier = Supplier.objects.get(id=supplier_id)
-        except Supplier.DoesNotExist:
-            selected_supplier = None
+    # Название поставщика берём из фасета, отдельный запрос — только если
+    # выбранный поставщик не попал в топ фасета
+    selected_supplier = None
+    if filters['supplier']:
+        selected_supplier = next(
+            (s['label'] for s in facets['suppliers'] if s['selected']), None
+        ) or Supplier.objects.filter(pk=filters['supplier']).values_list(
+            'company_name', flat=True
+        ).first()
 
     return render(request, 'store/product_list.html', {
-        'products': products,
-        'categories': categories,
-        'selected_category': category_id,
-        'selected_category_name': selected_category_name,
+        'cards': render_product_cards(products),
+        'facets': facets,
+        'filters': filters,
+        'selected_category': selected_category.pk if selected_category else None,
+        'selected_category_name': selected_category.name if selected_category else None,
         'selected_supplier': selected_supplier,
     })
 
+PRODUCT_DETAIL_TIMEOUT = 60
+RELATED_PRODUCTS = 6
+
+
+def _product_detail_data(pk, sort):
+    product = get_object_or_404(Product.objects.select_related('category', 'supplier'), pk=pk)
+    reviews, next_cursor = review_page(product.pk, sort)
+    # Один проход по индексу (product, -score)
+    related = [
+        n.neighbor for n in
+        ProductNeighbor.objects.filter(product_id=product.pk)
+        .select_related('neighbor').order_by('-score')[:RELATED_PRODUCTS]
+    ]
+    return product, reviews, next_cursor, previous_price(product.pk), related
+
+
+@product_condition
+@ratelimit('review', methods=('POST',))
 def product_detail(request, pk):
-    product = get_object_or_404(Product, pk=pk)
-    reviews = Review.objects.filter(product=product).select_related('user').order_by('-created_at')
-    avg_rating = product.get_average_rating()
+    sort = request.GET.get('sort')
+    if sort not in REVIEW_SORTS:
+        sort = DEFAULT_REVIEW_SORT
+
+    # Одновременные промахи по одному товару считаются один раз
+    version = product_version(request, pk)
+    if version is None:
+        raise Http404('Товар не найден.')
+    product, reviews, next_cursor, old_price, related = cached_call(
+        f'product_detail:{pk}:{version}:{sort}',
+        lambda: _product_detail_data(pk, sort),
+        PRODUCT_DETAIL_TIMEOUT,
+    )
 
     if request.method == 'POST':
         if not request.user.is_authenticated:
@@ -67,10 +123,58 @@ def product_detail(request, pk):
     return render(request, 'store/product_detail.html', {
         'product': product,
         'reviews': reviews,
-        'avg_rating': avg_rating,
+        'next_cursor': next_cursor,
+        'review_sort': sort,
+        'review_sorts': [(key, label) for key, (field, label) in REVIEW_SORTS.items()],
+        'avg_rating': product.get_average_rating(),
+        'histogram': product.get_rating_histogram(),
+        'old_price': old_price,
+        'related': related,
         'form': form,
     })
 
+@product_condition
+def product_reviews(request, pk):
+    """Следующая страница отзывов (JSON) для кнопки «Более старые отзывы»."""
+    if product_version(request, pk) is None:
+        raise Http404('Товар не найден.')
+    try:
+        reviews, next_cursor = review_page(pk, request.GET.get('sort'), request.GET.get('cursor'))
+    except CursorError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'reviews': [review_to_dict(r) for r in reviews],
+        'next_cursor': next_cursor,
+    })
+
+@product_condition
+def product_price_history(request, pk):
+    """Прореженный график цены (JSON): ?days=365&points=100."""
+    if product_version(request, pk) is None:
+        raise Http404('Товар не найден.')
+    try:
+        days = min(max(int(request.GET.get('days', 365)), 1), 3650)
+        points = min(max(int(request.GET.get('points', 100)), 10), 1000)
+    except ValueError:
+        return JsonResponse({'error': 'days и points должны быть числами.'}, status=400)
+    return JsonResponse(price_chart(pk, days, points))
+
+@login_required
+@ratelimit('review', methods=('POST',))
+def review_helpful(request, pk):
+    review = get_object_or_404(Review, pk=pk)
+    if request.method == 'POST':
+        with transaction.atomic():
+            vote, created = ReviewVote.objects.get_or_create(review=review, user=request.user)
+            if created:
+                now = timezone.now()
+                Review.objects.filter(pk=review.pk).update(
+                    helpful_count=F('helpful_count') + 1, updated_at=now
+                )
+                # Счётчик виден на странице товара, а её ETag и кэш — по Product.updated_at
+                Product.objects.filter(pk=review.product_id).update(updated_at=now)
+    return redirect('product_detail', pk=review.product_id)
+
 def register(request):
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)
@@ -85,10 +189,22 @@ def register(request):
 def user_login(request):
     if request.method == 'POST':
         form = AuthenticationForm(request, data=request.POST)
+        username = request.POST.get('username', '')
+        retry_after = failures_blocked('login', request, username)
+        if retry_after:
+            form = AuthenticationForm(request, initial={'username': username})
+            messages.error(request, f'Слишком много неудачных попыток. Повторите через {retry_after} с.')
+            response = render(request, 'store/login.html', {'form': form}, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
         if form.is_valid():
             user = form.get_user()
+            reset_failures('login', request, username)
             login(request, user)
-            return redirect('product_list')
+            if guest_cart.merge_into_user_cart(request, user):
+                messages.success(request, 'Товары из гостевой корзины перенесены в вашу корзину.')
+            return guest_cart.clear(redirect('product_list'))
+        record_failure('login', request, username)
     else:
         form = AuthenticationForm()
     return render(request, 'store/login.html', {'form': form})
@@ -108,20 +224,35 @@ class ProductCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.user = self.request.user
+        supplier = Supplier.objects.filter(user=self.request.user).first()
+        if supplier:
+            form.instance.supplier = supplier
         return super().form_valid(form)
 
-@login_required
 def cart_view(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    total_price = cart.get_total_price()
+    if not request.user.is_authenticated:
+        items = guest_cart.items(guest_cart.load(request))
+        cart = None
+    else:
+        cart = get_user_cart(request)
+        items = list(cart.items.select_related('product'))
+    total_price = sum(item.product.price * item.quantity for item in items)
     return render(request, 'store/cart.html', {
-        'cart': cart, 'total_price': total_price
+        'cart': cart, 'items': items, 'total_price': total_price
     })
 
-@login_required
 def add_to_cart(request, pk):
+    if not request.user.is_authenticated:
+        # Гость: только cookie, без запросов к БД
+        cart = guest_cart.load(request)
+        if guest_cart.add(cart, pk):
+            messages.success(request, 'Товар добавлен в корзину!')
+        else:
+            messages.error(request, 'В корзине гостя слишком много товаров — войдите, чтобы продолжить.')
+        return guest_cart.save(redirect('cart'), cart)
+
     product = get_object_or_404(Product, pk=pk)
-    cart, created = Cart.objects.get_or_create(user=request.user)
+    cart = get_user_cart(request, touch=True)
     cart_item, created = CartItem.objects.get_or_create(
         cart=cart, product=product, defaults={'quantity': 1}
     )
@@ -131,33 +262,53 @@ def add_to_cart(request, pk):
     messages.success(request, f'{product.name} добавлен в корзину!')
     return redirect('cart')
 
-@login_required
 def remove_from_cart(request, pk):
-    cart_item = get_object_or_404(CartItem, pk=pk, cart__user=request.user)
+    if not request.user.is_authenticated:
+        # У гостя pk — id товара
+        cart = guest_cart.load(request)
+        cart.pop(pk, None)
+        messages.success(request, 'Товар удален из корзины!')
+        return guest_cart.save(redirect('cart'), cart)
+
+    cart_item = get_object_or_404(CartItem.objects.select_related('cart'), pk=pk, cart__user=request.user)
     cart_item.delete()
+    cart_item.cart.touch()
     messages.success(request, 'Товар удален из корзины!')
     return redirect('cart')
 
-@login_required
 def update_cart_item(request, pk):
-    cart_item = get_object_or_404(CartItem, pk=pk, cart__user=request.user)
     quantity = int(request.POST.get('quantity', 1))
+    if not request.user.is_authenticated:
+        cart = guest_cart.load(request)
+        if quantity > 0:
+            if pk in cart:
+                cart[pk] = quantity
+        else:
+            cart.pop(pk, None)
+        return guest_cart.save(redirect('cart'), cart)
+
+    cart_item = get_object_or_404(CartItem.objects.select_related('cart'), pk=pk, cart__user=request.user)
     if quantity > 0:
         cart_item.quantity = quantity
         cart_item.save()
     else:
         cart_item.delete()
+    cart_item.cart.touch()
     return redirect('cart')
 
 @login_required
-def export_products_json(request):
-    products = Product.objects.all()
+@export_condition(Product, Category, Supplier)
+@ratelimit('export')
+@delta_export
+def export_products_json(request, delta):
+    products = Product.objects.select_related('category', 'supplier')
     category_id = request.GET.get('category')
     if category_id not in (None, '', 'None'):
         products = products.filter(category_id=category_id)
+    products = delta.apply(products)
 
     data = []
-    for p in products:
+    for p in delta.rows(products):
         data.append({
             'id': p.id,
             'name': p.name,
@@ -173,15 +324,19 @@ def export_products_json(request):
         content_type='application/json; charset=utf-8'
     )
     response['Content-Disposition'] = 'attachment; filename="products.json"'
-    return response
+    return delta.set_headers(response)
 
 @login_required
-def export_products_csv(request):
-    products = Product.objects.all()
+@export_condition(Product, Category, Supplier)
+@ratelimit('export')
+@delta_export
+def export_products_csv(request, delta):
+    products = Product.objects.select_related('category', 'supplier')
     category_id = request.GET.get('category')
 
     if category_id not in (None, '', 'None'):
         products = products.filter(category_id=category_id)
+    products = delta.apply(products)
 
     response = HttpResponse(content_type='text/csv; charset=utf-8')
     response['Content-Disposition'] = 'attachment; filename="products.csv"'
@@ -191,7 +346,7 @@ def export_products_csv(request):
     writer = csv.writer(response)
     writer.writerow(['ID', 'Название', 'Категория', 'Цена', 'Количество', 'Поставщик'])
 
-    for p in products:
+    for p in delta.rows(products):
         writer.writerow([
             p.id,
             p.name,
@@ -201,18 +356,22 @@ def export_products_csv(request):
             p.supplier.company_name if p.supplier else '',
         ])
 
-    return response
+    return delta.set_headers(response)
 
 @login_required
-def export_orders_json(request):
+@export_condition(Order)
+@ratelimit('export')
+@delta_export
+def export_orders_json(request, delta):
     """Экспорт заказов в JSON (можно фильтровать по пользователю)."""
     orders = Order.objects.select_related('user').all()
     user_id = request.GET.get('user')
     if user_id:
         orders = orders.filter(user_id=user_id)
+    orders = delta.apply(orders)
 
     data = []
-    for o in orders:
+    for o in delta.rows(orders):
         data.append({
             'id': o.id,
             'user_email': o.user.email,
@@ -226,15 +385,19 @@ def export_orders_json(request):
         content_type='application/json; charset=utf-8'
     )
     response['Content-Disposition'] = 'attachment; filename="orders.json"'
-    return response
+    return delta.set_headers(response)
 
 
 @login_required
-def export_orders_csv(request):
+@export_condition(Order)
+@ratelimit('export')
+@delta_export
+def export_orders_csv(request, delta):
     orders = Order.objects.select_related('user').all()
     user_id = request.GET.get('user')
     if user_id:
         orders = orders.filter(user_id=user_id)
+    orders = delta.apply(orders)
 
     response = HttpResponse(content_type='text/csv; charset=utf-8')
     response['Content-Disposition'] = 'attachment; filename="orders.csv"'
@@ -244,7 +407,7 @@ def export_orders_csv(request):
     writer = csv.writer(response)
     writer.writerow(['ID', 'Email пользователя', 'Статус', 'Сумма', 'Дата создания'])
 
-    for o in orders:
+    for o in delta.rows(orders):
         writer.writerow([
             o.id,
             o.user.email,
@@ -252,16 +415,19 @@ def export_orders_csv(request):
             o.total_price,
             o.created_at.strftime('%Y-%m-%d %H:%M'),
         ])
-    return response
+    return delta.set_headers(response)
 
 
 @login_required
-def export_suppliers_json(request):
+@export_condition(Supplier)
+@ratelimit('export')
+@delta_export
+def export_suppliers_json(request, delta):
     """Экспорт поставщиков в JSON."""
-    suppliers = Supplier.objects.all()
+    suppliers = delta.apply(Supplier.objects.all())
 
     data = []
-    for s in suppliers:
+    for s in delta.rows(suppliers):
         data.append({
             'id': s.id,
             'company_name': s.company_name,
@@ -276,12 +442,15 @@ def export_suppliers_json(request):
         content_type='application/json; charset=utf-8'
     )
     response['Content-Disposition'] = 'attachment; filename="suppliers.json"'
-    return response
+    return delta.set_headers(response)
 
 
 @login_required
-def export_suppliers_csv(request):
-    suppliers = Supplier.objects.all()
+@export_condition(Supplier)
+@ratelimit('export')
+@delta_export
+def export_suppliers_csv(request, delta):
+    suppliers = delta.apply(Supplier.objects.all())
 
     response = HttpResponse(content_type='text/csv; charset=utf-8')
     response['Content-Disposition'] = 'attachment; filename="suppliers.csv"'
@@ -291,7 +460,7 @@ def export_suppliers_csv(request):
     writer = csv.writer(response)
     writer.writerow(['ID', 'Название компании', 'ИНН', 'Телефон', 'Email', 'Адрес'])
 
-    for s in suppliers:
+    for s in delta.rows(suppliers):
         writer.writerow([
             s.id,
             s.company_name,
@@ -300,38 +469,108 @@ def export_suppliers_csv(request):
             s.email,
             s.address,
         ])
-    return response
+    return delta.set_headers(response)
 
 @login_required
+@export_condition(Product, Category, Supplier)
+@ratelimit('export')
+@delta_export
+def export_products_columnar(request, delta, fmt):
+    """Экспорт товаров в Parquet / Arrow IPC."""
+    products = Product.objects.all()
+    category_id = request.GET.get('category')
+    if category_id not in (None, '', 'None'):
+        products = products.filter(category_id=category_id)
+    return columnar_export(products, PRODUCT_COLUMNS, delta, fmt, 'products')
+
+
+@login_required
+@export_condition(Order)
+@ratelimit('export')
+@delta_export
+def export_orders_columnar(request, delta, fmt):
+    """Экспорт заказов в Parquet / Arrow IPC."""
+    orders = Order.objects.all()
+    user_id = request.GET.get('user')
+    if user_id:
+        orders = orders.filter(user_id=user_id)
+    return columnar_export(orders, ORDER_COLUMNS, delta, fmt, 'orders')
+
+
+@login_required
+@export_condition(Supplier)
+@ratelimit('export')
+@delta_export
+def export_suppliers_columnar(request, delta, fmt):
+    """Экспорт поставщиков в Parquet / Arrow IPC."""
+    return columnar_export(Supplier.objects.all(), SUPPLIER_COLUMNS, delta, fmt, 'suppliers')
+
+
+class OutOfStock(Exception):
+    """Остатка не хватает — транзакция оформления откатывается."""
+
+    def __init__(self, products):
+        super().__init__(products)
+        self.products = products
+
+
+@login_required
+@ratelimit('checkout', methods=('POST',))
 def checkout(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
+    cart = get_user_cart(request)
     if not cart.items.exists():
+        if request.method == 'POST':
+            CHECKOUTS.labels('empty_cart').inc()
         messages.error(request, 'Корзина пуста.')
         return redirect('cart')
 
     if request.method == 'POST':
-        total_price = cart.get_total_price()
-
-        order = Order.objects.create(
-            user=request.user,
-            cart=cart,
-            status='оплачен',
-            total_price=total_price,
-        )
-
-        Payment.objects.create(
-            order=order,
-            method='Онлайн-оплата (тест)',
-            amount=total_price,
-            status='успешно',
-        )
-
-        Delivery.objects.create(
-            order=order,
-            tracking_number=f'TEST-{order.id}',
-            delivery_address=request.user.address or 'Не указан',
-            delivery_status='в обработке',
-        )
+        # Номер — до транзакции: резерв нового блока должен зафиксироваться
+        # независимо от заказа, иначе при откате номера блока выдадут повторно
+        carrier = get_carrier()
+        tracking_number = carrier.allocate()
+        try:
+            with transaction.atomic():
+                short = Product.take_stock(dict(cart.items.values_list('product_id', 'quantity')))
+                if short:
+                    raise OutOfStock(short)
+                total_price = cart.get_total_price()
+
+                order = Order.objects.create(
+                    user=request.user,
+                    cart=cart,
+                    status='оплачен',
+                    total_price=total_price,
+                )
+
+                Payment.objects.create(
+                    order=order,
+                    method='Онлайн-оплата (тест)',
+                    amount=total_price,
+                    status='успешно',
+                )
+
+                Delivery.objects.create(
+                    order=order,
+                    carrier=carrier.code,
+                    tracking_number=tracking_number,
+                    delivery_address=request.user.address or 'Не указан',
+                    delivery_status=STATUS_PROCESSING,
+                )
+
+                OrderItem.snapshot(order, cart)
+                SupplierStats.record_sale(order)
+                # Состав сохранён в заказе — корзина освобождается под следующий
+                cart.items.all().delete()
+        except OutOfStock as e:
+            CHECKOUTS.labels('out_of_stock').inc()
+            names = ', '.join(product.name for product in e.products)
+            messages.error(request, f'Недостаточно на складе: {names}.')
+            return redirect('cart')
+        except Exception:
+            CHECKOUTS.labels('error').inc()
+            raise
+        CHECKOUTS.labels('success').inc()
 
         messages.success(request, f'Заказ #{order.id} оформлен и оплачен.')
         return redirect('order_detail', pk=order.pk)
@@ -343,6 +582,32 @@ def checkout(request):
     })
 
 
+@csrf_exempt
+@require_POST
+def carrier_webhook(request, code):
+    """Пачка статусов от перевозчика: {"updates": [{"tracking_number", "status"}]}.
+
+    Подпись — HMAC-SHA256 тела ключом WEBHOOK_SECRET в X-Carrier-Signature.
+    """
+    if code not in settings.CARRIERS:
+        raise Http404('Неизвестный перевозчик.')
+    secret = get_carrier(code).webhook_secret
+    signature = hmac.new((secret or '').encode(), request.body, hashlib.sha256).hexdigest()
+    if not secret or not hmac.compare_digest(signature, request.headers.get('X-Carrier-Signature', '')):
+        return JsonResponse({'error': 'Неверная подпись.'}, status=403)
+    try:
+        updates = {
+            u['tracking_number']: u['status'] for u in json.loads(request.body)['updates']
+        }
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Ожидается {"updates": [{"tracking_number", "status"}]}.'}, status=400)
+    try:
+        changed, skipped = apply_status_updates(updates)
+    except StatusError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'changed': changed, 'skipped': skipped})
+
+
 @login_required
 def order_list(request):
     orders = Order.objects.filter(user=request.user).select_related('payment', 'delivery')
@@ -352,17 +617,81 @@ def order_list(request):
 @login_required
 def order_detail(request, pk):
     order = get_object_or_404(
-        Order.objects.select_related('payment', 'delivery', 'cart'),
+        Order.objects.select_related('payment', 'delivery'),
         pk=pk,
         user=request.user,
     )
-    return render(request, 'store/order_detail.html', {'order': order})
+    items = order.items.order_by('pk')
+    return render(request, 'store/order_detail.html', {'order': order, 'items': items})
+
+SUPPLIER_PAGE_SIZE = 50
+LOW_STOCK_ALERTS = 20
+
+
+def supplier_product_page(request, supplier):
+    """Страница товаров поставщика по индексу (supplier, id): ?after=<id>."""
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        after = 0
+    products = list(
+        Product.objects.filter(supplier=supplier, pk__gt=after)
+        .order_by('pk')[:SUPPLIER_PAGE_SIZE + 1]
+    )
+    next_after = None
+    if len(products) > SUPPLIER_PAGE_SIZE:
+        products = products[:SUPPLIER_PAGE_SIZE]
+        next_after = products[-1].pk
+    return products, next_after
+
 
 @login_required
 def supplier_products(request, pk):
     supplier = get_object_or_404(Supplier, pk=pk)
-    products = Product.objects.filter(supplier=supplier)
+    products, next_after = supplier_product_page(request, supplier)
     return render(request, 'store/supplier_products.html', {
         'supplier': supplier,
         'products': products,
+        'next_after': next_after,
+    })
+
+
+@login_required
+def supplier_dashboard(request):
+    supplier = get_object_or_404(Supplier, user=request.user)
+    stats, created = SupplierStats.objects.get_or_create(supplier=supplier)
+    if created:
+        SupplierStats.rebuild([supplier.pk])
+        stats.refresh_from_db()
+    products, next_after = supplier_product_page(request, supplier)
+    low_stock = (
+        Product.objects.filter(supplier=supplier, quantity__lte=settings.LOW_STOCK_THRESHOLD)
+        .order_by('quantity', 'pk')[:LOW_STOCK_ALERTS]
+    )
+    return render(request, 'store/supplier_dashboard.html', {
+        'supplier': supplier,
+        'stats': stats,
+        'products': products,
+        'next_after': next_after,
+        'low_stock': low_stock,
+        'low_stock_threshold': settings.LOW_STOCK_THRESHOLD,
+    })
+
+
+@staff_member_required
+def profile_list(request):
+    return render(request, 'store/profile_list.html', {'profiles': profiling.list_profiles()})
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    meta = profiling.load_profile(profile_id)
+    if meta is None:
+        raise Http404('Профиль не найден.')
+    if meta['engine'] == 'pyinstrument':
+        return HttpResponse(profiling.pyinstrument_html(profile_id))
+    return render(request, 'store/profile_detail.html', {
+        'meta': meta,
+        'flame': profiling.flame_rows(meta) if meta['engine'] == 'sampling' else None,
+        'top': profiling.top_functions(profile_id) if meta['engine'] == 'cprofile' else None,
     })